@@ -1,14 +1,19 @@
 # backend/app.py
 
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, Response, jsonify, request, send_file, g, has_app_context
 from flask_cors import CORS
 import psycopg2
 import os
 from datetime import datetime, timedelta
+from decimal import Decimal
 import pytz
 # Importamos una librería más robusta para parsear fechas
 from dateutil.parser import parse as parse_date
+import base64
+import csv
+import hashlib
 import json
+from functools import wraps
 from dotenv import load_dotenv
 import re
 import unicodedata
@@ -22,7 +27,7 @@ from src.engines.report_prompts import (
     get_methodology_prompt,
     get_correlation_anomalies_prompt,
 )
-from time import time
+from time import monotonic, sleep, time
 import io
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
@@ -39,7 +44,18 @@ import matplotlib
 matplotlib.use('Agg')  # Evita backends GUI (NSWindow) en macOS/entornos no interactivos
 import matplotlib.pyplot as plt
 from reportlab.lib.utils import ImageReader
-from src.reports.generator import generate_report as generate_report_v2
+from src.db.pool import get_connection as get_pooled_connection, pool_stats
+from src.brands.detection import BRAND_SYNONYMS, detect_brands
+from src.brands.store import brand_filter, count_mention_brands, stored_brands_sql, pending_text_sql
+from src.reports.mention_frame import explode_brands, explode_topics, histogram as _frame_histogram, load_mention_frame
+from src.reports.rollups import ALL_BRANDS, moving_query_rollups, query_rollup, rollup_sql, rollups_ready
+from src.reports.snapshot import get_report_snapshot
+from src.reports.jobs import (
+    ACTIVE_STATUSES, FINAL_STATUSES, REPORT_JOB_POLL_SECONDS, REPORT_KINDS, enqueue_report_job,
+    ensure_report_jobs_table, get_artifact_store, get_report_job, get_report_workers,
+)
+from src.utils.api_cache import bump_api_generation, get_api_cache
+from src.utils.cache import LRUCache
 
 load_dotenv()
 
@@ -85,29 +101,26 @@ def _log_ai_call(kind: str, prompt: str, raw: str, meta: dict) -> None:
     except Exception:
         pass
 
-# Caché simple en memoria para resultados de agrupación por IA (TTL configurable)
-_GROUPS_CACHE: dict[str, tuple[float, list[dict]]] = {}
+# Cachés en memoria de los resultados de IA (LRU + TTL, acotadas en entradas y bytes, seguras entre hilos)
 GROUPS_CACHE_TTL_SECONDS = int(os.getenv("TOPICS_GROUPS_TTL", "60"))
+_GROUPS_CACHE = LRUCache(
+    max_entries=int(os.getenv("TOPICS_GROUPS_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("TOPICS_GROUPS_MAX_BYTES", str(8 * 1024 * 1024))),
+    ttl_seconds=GROUPS_CACHE_TTL_SECONDS,
+)
+_CATEGORY_CACHE = LRUCache(
+    max_entries=int(os.getenv("AI_CATEGORY_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("AI_CATEGORY_CACHE_MAX_BYTES", str(2 * 1024 * 1024))),
+    ttl_seconds=int(os.getenv("AI_CATEGORY_CACHE_TTL", str(24 * 3600))),
+)
 
 def _groups_cache_get(key: str) -> list[dict] | None:
-    try:
-        ts, data = _GROUPS_CACHE.get(key, (0.0, None))  # type: ignore
-        if not data:
-            return None
-        if (time() - ts) <= GROUPS_CACHE_TTL_SECONDS:
-            return data
-        # Expirado
-        _GROUPS_CACHE.pop(key, None)
-        return None
-    except Exception:
-        return None
+    return _GROUPS_CACHE.get(key) or None
 
 def _groups_cache_set(key: str, data: list[dict]) -> None:
-    try:
-        _GROUPS_CACHE[key] = (time(), data)
-    except Exception:
-        # En caso de error, no bloquear el flujo
-        pass
+    # Las agrupaciones vacías (error de IA) no se cachean
+    if data:
+        _GROUPS_CACHE.set(key, data)
 
 # --- Nueva Función de Categorización con IA ---
 def _normalize_text_for_match(text: str) -> list[str]:
@@ -162,7 +175,12 @@ Responde solo con el nombre de la categoría o con la palabra "Inclasificable".
 """
     try:
         # Usamos el motor de OpenAI para obtener la respuesta
-        best_category = fetch_response(prompt, model="gpt-4o-mini", temperature=0.0)
+        cache_key = (query_text or "", tuple(topics))
+        best_category = _CATEGORY_CACHE.get(cache_key)
+        if best_category is None:
+            best_category = fetch_response(prompt, model="gpt-4o-mini", temperature=0.0)
+            if best_category:
+                _CATEGORY_CACHE.set(cache_key, best_category)
 
         # Limpiamos respuesta (a veces IA añade números o frases)
         cleaned_category = (best_category or "").strip()
@@ -215,15 +233,26 @@ DB_CONFIG = {
 }
 
 def get_db_connection():
+    """Conexión del pool compartido; ``conn.close()`` la devuelve al pool.
+
+    Dentro de una petición se registra en ``g`` y, si el endpoint no la cierra
+    (p.ej. por una excepción), se devuelve en el teardown del contexto.
+    """
     try:
-        # Debug: mostrar configuración (sin password)
-        dbg = {k: ("***" if k == "password" else v) for k, v in DB_CONFIG.items()}
-        print(f"DB_CONFIG: {dbg}")
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        conn = get_pooled_connection(DB_CONFIG)
     except psycopg2.OperationalError as e:
         print(f"ERROR: No se pudo conectar a la base de datos: {e}")
         raise e
+    if has_app_context():
+        g.setdefault("_db_connections", []).append(conn)
+    return conn
+
+
+@app.teardown_appcontext
+def _release_db_connections(exc=None):
+    for conn in g.pop("_db_connections", []):
+        if not conn.closed:
+            conn.close()
 
 
 # ───────────────────── Motor de informes (helpers) ─────────────────────
@@ -280,7 +309,19 @@ def _aggregate_data_for_report(filters):
 
 
 def _aggregate_data_for_report_db(filters):
-    """Agrega datos reales desde la base de datos (menciones, insights, KPIs)."""
+    """Agrega datos reales desde la base de datos (menciones, insights, KPIs).
+
+    Usa una sola conexión del pool y la devuelve al terminar: también se llama
+    desde los jobs de informes, fuera de una petición (sin teardown que la libere).
+    """
+    conn = get_db_connection()
+    try:
+        return _aggregate_report_data(conn, filters)
+    finally:
+        conn.close()
+
+
+def _aggregate_report_data(conn, filters):
     # Normaliza filtros
     brand = os.getenv('DEFAULT_BRAND', 'The Core School')
     start_s = (filters or {}).get('start_date')
@@ -307,7 +348,7 @@ def _aggregate_data_for_report_db(filters):
     start_dt = _to_dt(start_s, datetime.utcnow() - timedelta(days=30))
     end_dt = _to_dt(end_s, datetime.utcnow())
 
-    conn = get_db_connection(); cur = conn.cursor()
+    cur = conn.cursor()
 
     # WHERE base
     where = ["m.created_at >= %s AND m.created_at < %s"]
@@ -326,78 +367,40 @@ def _aggregate_data_for_report_db(filters):
         where.append("q.brand_id = %s"); params.append(brand_id)
     where_sql = " AND ".join(where)
 
-    # Traer filas necesarias para cómputos (detección de marcas + sentimiento)
-    cur.execute(f"""
-        SELECT m.id, m.key_topics, LOWER(COALESCE(m.response,'')) AS resp,
-               LOWER(COALESCE(m.source_title,'')) AS title,
-               i.payload, m.sentiment, m.created_at
-        FROM mentions m
-        JOIN queries q ON m.query_id = q.id
-        LEFT JOIN insights i ON i.id = m.generated_insight_id
-        WHERE {where_sql}
-    """, tuple(params))
-    rows = cur.fetchall()
-
-    total_responses = len(rows)
+    # Una sola consulta con las columnas necesarias → DataFrame; marcas resueltas una vez por mención
+    # (mention_brands, o detección en lote para las menciones aún sin indexar)
+    df = load_mention_frame(cur, where_sql, params, start_dt.date())
+    total_responses = len(df)
+    primary_brand = brand
+    df["has_primary"] = [primary_brand in b for b in df["brands"]]
 
-    # Conteos por marca (SOV y visibilidad)
     from collections import defaultdict, Counter
-    brand_counts = defaultdict(int)
-    brand_sentiments = defaultdict(list)
-    competitor_daily_counts = defaultdict(lambda: defaultdict(int))  # brand -> day -> count
-
-    by_day_sentiments = defaultdict(list)
-    topic_counts = defaultdict(int)
-    topic_sent_sum = defaultdict(float)
-    for _id, key_topics, resp, title, payload, senti, created_at in rows:
-        detected = _detect_brands(key_topics, resp, title, payload)
-        seen = set()
-        for bn in detected:
-            if bn in seen:
-                continue
-            seen.add(bn)
-            brand_counts[bn] += 1
-            if isinstance(senti, (int, float)):
-                brand_sentiments[bn].append(float(senti))
-            # Conteo diario por competidor
-            d_day = created_at.date() if created_at else start_dt.date()
-            if bn != brand:
-                competitor_daily_counts[bn][d_day] += 1
-        # Sentimiento promedio por día (global del periodo)
-        d_sent = created_at.date() if created_at else start_dt.date()
-        if isinstance(senti, (int, float)):
-            by_day_sentiments[d_sent].append(float(senti))
-        # Agregado de temas a partir de key_topics
-        try:
-            if isinstance(key_topics, (list, tuple)):
-                for t in key_topics:
-                    if not t:
-                        continue
-                    topic = str(t).strip().lower()
-                    topic_counts[topic] += 1
-                    if isinstance(senti, (int, float)):
-                        topic_sent_sum[topic] += float(senti)
-        except Exception:
-            pass
+    # Tablas largas: mención × marca y mención × tema (key_topics)
+    brand_long = explode_brands(df)
+    brand_counts = brand_long.groupby("brand", sort=False).size().to_dict()
+    brand_senti = brand_long[brand_long["sentiment"].notna()]
+
+    # Conteo diario por competidor: brand -> day -> count
+    comp_daily = brand_long[brand_long["brand"] != primary_brand].groupby(["brand", "day"], sort=False).size()
+    competitor_daily_counts = defaultdict(dict)
+    for (bn, d_day), cnt in comp_daily.items():
+        competitor_daily_counts[bn][d_day] = int(cnt)
+
+    # Agregado de temas a partir de key_topics
+    topic_long = explode_topics(df)
+    topic_counts = topic_long.groupby("topic", sort=False).size().to_dict()
+    topic_sent_sum = topic_long.groupby("topic", sort=False)["sentiment"].sum().to_dict()
 
-    def avg(xs):
-        return (sum(xs) / max(len(xs), 1)) if xs else 0.0
-
-    primary_brand = brand
     visibility_score = round((brand_counts.get(primary_brand, 0) / max(total_responses, 1)) * 100.0, 1)
-    sentiment_avg = round(avg(brand_sentiments.get(primary_brand, [])), 2)
+    own_senti = brand_senti.loc[brand_senti["brand"] == primary_brand, "sentiment"]
+    sentiment_avg = round(float(own_senti.mean()), 2) if len(own_senti) else 0.0
 
     # Serie por día para delta de visibilidad
-    by_day_total = defaultdict(int)
-    by_day_brand = defaultdict(int)
-    for _id, key_topics, resp, title, payload, senti, created_at in rows:
-        d = created_at.date() if created_at else start_dt.date()
-        by_day_total[d] += 1
-        if primary_brand in _detect_brands(key_topics, resp, title, payload):
-            by_day_brand[d] += 1
-    days_sorted = sorted(by_day_total.keys())
-    series_visibility = [ (by_day_brand[d] / max(by_day_total[d], 1)) * 100.0 for d in days_sorted ]
-    series_sentiment = [ (sum(by_day_sentiments.get(d, [])) / max(len(by_day_sentiments.get(d, [])), 1)) if by_day_sentiments.get(d) else 0.0 for d in days_sorted ]
+    by_day = df.groupby("day").agg(total=("id", "size"), own=("has_primary", "sum"), senti=("sentiment", "mean"))
+    days_sorted = list(by_day.index)
+    by_day_total = by_day["total"].to_dict()
+    series_visibility = (by_day["own"] / by_day["total"].clip(lower=1) * 100.0).tolist()
+    series_sentiment = by_day["senti"].fillna(0.0).tolist()
     if len(series_visibility) >= 2:
         mid = len(series_visibility) // 2
         delta = round((sum(series_visibility[mid:]) / max(len(series_visibility[mid:]), 1)) - (sum(series_visibility[:mid]) / max(len(series_visibility[:mid]), 1)), 1)
@@ -564,7 +567,8 @@ def _aggregate_data_for_report_db(filters):
         # Construye mapa de riesgos por día desde insights_rows
         risk_by_day = defaultdict(lambda: defaultdict(int))
         # Reutiliza la consulta previa de insights agregados pero con fechas
-        cur = get_db_connection().cursor()
+        conn.rollback()  # conexión compartida: un bloque anterior fallido no debe abortar este
+        cur = conn.cursor()
         cur.execute(
             f"""
             SELECT i.payload, i.created_at
@@ -607,56 +611,25 @@ def _aggregate_data_for_report_db(filters):
         aggregated_data["overlap_events"] = []
 
     # ── SOV por modelo de IA y por tema ─────────────────────────────────
+    # Marcas sin payload.brands (criterio histórico de este bloque), sobre el mismo DataFrame
+    total_by_engine = {}
+    total_by_topic = {}
     try:
-        cur = get_db_connection().cursor()
-        cur.execute(
-            f"""
-            SELECT m.engine, q.topic,
-                   m.key_topics,
-                   LOWER(COALESCE(m.response,'')) AS resp,
-                   LOWER(COALESCE(m.source_title,'')) AS title
-            FROM mentions m
-            JOIN queries q ON m.query_id = q.id
-            WHERE {where_sql}
-            """,
-            tuple(params),
-        )
-        rows_et = cur.fetchall()
-        cur.close()
-
-        counts_by_engine_brand = defaultdict(lambda: defaultdict(int))
-        counts_by_topic_brand = defaultdict(lambda: defaultdict(int))
-        total_by_engine = defaultdict(int)
-        total_by_topic = defaultdict(int)
-
-        for engine, topic, key_topics, resp, title in rows_et:
-            detected = _detect_brands(key_topics, resp, title, None)
-            if not detected:
-                continue
-            seen = set()
-            for bn in detected:
-                if bn in seen:
-                    continue
-                seen.add(bn)
-                counts_by_engine_brand[engine][bn] += 1
-                counts_by_topic_brand[topic][bn] += 1
-                total_by_engine[engine] += 1
-                total_by_topic[topic] += 1
-
-        sov_by_model = []
-        for engine, brand_map in counts_by_engine_brand.items():
-            tot = max(total_by_engine.get(engine, 0), 1)
-            items = sorted(brand_map.items(), key=lambda x: x[1], reverse=True)[:6]
-            for bn, cnt in items:
-                sov_by_model.append([str(engine or 'unknown'), bn, f"{(cnt/tot)*100:.1f}%"]) 
-
-        sov_by_topic = []
-        for topic, brand_map in counts_by_topic_brand.items():
-            tot = max(total_by_topic.get(topic, 0), 1)
-            items = sorted(brand_map.items(), key=lambda x: x[1], reverse=True)[:6]
-            for bn, cnt in items:
-                sov_by_topic.append([str(topic or 'unknown'), bn, f"{(cnt/tot)*100:.1f}%"]) 
+        text_long = explode_brands(df, column="text_brands")
 
+        def _sov_rows(dim):
+            keyed = text_long.assign(key=text_long[dim].fillna(""))
+            counts = keyed.groupby(["key", "brand"], sort=False).size()
+            totals = counts.groupby(level="key", sort=False).sum()
+            out = []
+            for key, tot in totals.items():
+                top = counts.loc[key].sort_values(ascending=False, kind="stable").head(6)
+                for bn, cnt in top.items():
+                    out.append([str(key or 'unknown'), bn, f"{(cnt/max(tot, 1))*100:.1f}%"])
+            return out, {k: int(v) for k, v in totals.items()}
+
+        sov_by_model, total_by_engine = _sov_rows("engine")
+        sov_by_topic, total_by_topic = _sov_rows("topic")
         aggregated_data["sov_by_model"] = sov_by_model[:30]
         aggregated_data["sov_by_topic"] = sov_by_topic[:30]
     except Exception:
@@ -666,7 +639,7 @@ def _aggregate_data_for_report_db(filters):
     # Distribuciones densas en datos para el Analista de Correlaciones y Anomalías
     try:
         aggregated_data["distributions"] = {
-            "sentiment_hist": _histogram([s for vals in brand_sentiments.values() for s in vals], bins=10, range_min=-1.0, range_max=1.0),
+            "sentiment_hist": _histogram(brand_senti["sentiment"].to_numpy(), bins=10, range_min=-1.0, range_max=1.0),
             "mentions_by_engine": _dict_counts(total_by_engine),
             "mentions_by_topic": _dict_counts(total_by_topic),
         }
@@ -676,8 +649,8 @@ def _aggregate_data_for_report_db(filters):
     # Comparativa de sentimiento por marca
     try:
         sentiment_comp = [
-            [bn, f"{(sum(vals)/max(len(vals),1)):.2f}"]
-            for bn, vals in brand_sentiments.items() if vals
+            [bn, f"{avg_s:.2f}"]
+            for bn, avg_s in brand_senti.groupby("brand", sort=False)["sentiment"].mean().items()
         ]
         sentiment_comp.sort(key=lambda x: float(x[1]), reverse=True)
         aggregated_data["sentiment_comparison"] = sentiment_comp[:10]
@@ -698,7 +671,9 @@ def _aggregate_data_for_report_db(filters):
             base_no_cat.append("q.brand_id = %s"); params_no_cat.append(brand_id)
         where_no_cat_sql = " AND ".join(base_no_cat)
 
-        cur = get_db_connection().cursor()
+        conn.rollback()
+
+        cur = conn.cursor()
         cur.execute(
             f"""
             SELECT COALESCE(q.category, q.topic) AS cat,
@@ -758,7 +733,8 @@ def _aggregate_data_for_report_db(filters):
 
     # ── Corpus textual por categoría para prosa del informe ─────────────
     try:
-        cur = get_db_connection().cursor()
+        conn.rollback()
+        cur = conn.cursor()
         cur.execute(
             f"""
             SELECT COALESCE(q.category, q.topic) AS cat,
@@ -817,7 +793,8 @@ def _aggregate_data_for_report_db(filters):
 
     # Intención del usuario (informacional, comparativa, transaccional)
     try:
-        cur = get_db_connection().cursor()
+        conn.rollback()
+        cur = conn.cursor()
         cur.execute(f"""
             SELECT COALESCE(m.query_text, q.query) AS qtext
             FROM mentions m
@@ -857,32 +834,13 @@ def _aggregate_data_for_report_db(filters):
         top_topics = [t for t, _ in sorted(topic_counts.items(), key=lambda x: x[1], reverse=True) if t][:5]
         # Limitar a 3 para legibilidad del gráfico
         top_topics = top_topics[:3]
-        from collections import defaultdict as _dd
-        topic_day_total = _dd(lambda: _dd(int))
-        topic_day_own = _dd(lambda: _dd(int))
-        # Reiterar filas ya cargadas para construir contadores por día y tema
-        for _id, key_topics, resp, title, payload, senti, created_at in rows:
-            d_day = created_at.date() if created_at else start_dt.date()
-            detected = _detect_brands(key_topics, resp, title, payload)
-            topics_iter = []
-            try:
-                if isinstance(key_topics, (list, tuple)):
-                    topics_iter = [str(t).strip().lower() for t in key_topics if t]
-            except Exception:
-                topics_iter = []
-            for t in topics_iter:
-                if t not in top_topics:
-                    continue
-                topic_day_total[t][d_day] += 1
-                if primary_brand in detected:
-                    topic_day_own[t][d_day] += 1
+        top_long = topic_long[topic_long["topic"].isin(top_topics)].merge(df[["id", "has_primary"]], on="id")
+        per_day = top_long.groupby(["topic", "day"]).agg(total=("id", "size"), own=("has_primary", "sum"))
         topic_sov_timeseries = []
         for t in top_topics:
-            sov_series = []
-            for d in days_sorted:
-                tot = max(topic_day_total[t].get(d, 0), 1)
-                own = topic_day_own[t].get(d, 0)
-                sov_series.append(round((own / tot) * 100.0, 1))
+            t_days = per_day.loc[t] if t in per_day.index.get_level_values(0) else per_day.iloc[0:0]
+            t_days = t_days.reindex(days_sorted, fill_value=0)
+            sov_series = (t_days["own"] / t_days["total"].clip(lower=1) * 100.0).round(1).tolist()
             topic_sov_timeseries.append({
                 "topic": t,
                 "dates": [d.strftime('%Y-%m-%d') for d in days_sorted],
@@ -914,20 +872,11 @@ def _aggregate_data_for_report_db(filters):
         try:
             prev_start = start_dt - (end_dt - start_dt)
             prev_end = start_dt
-            c2 = get_db_connection().cursor()
-            c2.execute("""
-                SELECT m.id, m.key_topics, LOWER(COALESCE(m.response,'')) AS resp,
-                       LOWER(COALESCE(m.source_title,'')) AS title, m.sentiment, m.created_at
-                FROM mentions m
-                JOIN queries q ON m.query_id = q.id
-                WHERE m.created_at >= %s AND m.created_at < %s
-            """, (prev_start, prev_end))
-            prev_rows = c2.fetchall(); c2.close()
-            from collections import defaultdict as __dd
-            prev_counts = __dd(int)
-            for _id, key_topics, resp, title, senti, created_at in prev_rows:
-                for bn in _detect_brands(key_topics, resp, title, None):
-                    prev_counts[bn] += 1
+            conn.rollback()
+            c2 = conn.cursor()
+            prev_df = load_mention_frame(c2, "m.created_at >= %s AND m.created_at < %s", (prev_start, prev_end), prev_start.date())
+            c2.close()
+            prev_counts = explode_brands(prev_df, column="text_brands").groupby("brand", sort=False).size().to_dict()
             prev_total = max(sum(prev_counts.values()), 1)
             prev_sov = sorted([
                 {"name": bn, "sov": (cnt/prev_total)*100.0} for bn, cnt in prev_counts.items()
@@ -965,27 +914,11 @@ def _aggregate_data_for_report_db(filters):
 
     # Benchmarking de contenido competitivo (debilidades de competidores y acciones)
     try:
-        weakness_map = {}
-        for _id, key_topics, resp, title, payload, senti, created_at in rows:
-            try:
-                s_val = float(senti) if isinstance(senti, (int, float)) else 0.0
-            except Exception:
-                s_val = 0.0
-            if s_val >= -0.2:
-                continue
-            detected = _detect_brands(key_topics, resp, title, payload)
-            topics_iter = []
-            try:
-                if isinstance(key_topics, (list, tuple)):
-                    topics_iter = [str(t).strip() for t in key_topics if t]
-            except Exception:
-                topics_iter = []
-            for bn in detected:
-                if bn == primary_brand:
-                    continue
-                for t in topics_iter:
-                    key = (bn, t)
-                    weakness_map[key] = weakness_map.get(key, 0) + 1
+        # Menciones negativas: competidor × key_topic (sin minúsculas)
+        neg = df[df["sentiment"].fillna(0.0) < -0.2]
+        neg_pairs = explode_brands(neg)[["id", "brand"]]
+        neg_pairs = neg_pairs[neg_pairs["brand"] != primary_brand].merge(explode_topics(neg, lower=False)[["id", "topic"]], on="id")
+        weakness_map = neg_pairs.groupby(["brand", "topic"], sort=False).size().to_dict()
         # Ordenar por conteo desc y limitar
         ordered = sorted(weakness_map.items(), key=lambda x: x[1], reverse=True)[:8]
         suggestions = []
@@ -2067,82 +2000,20 @@ def _create_pdf_report(content, data):
 
 
 # --- Detección de marcas reutilizable ---
-BRAND_SYNONYMS = {
-    "The Core School": ["the core", "the core school", "thecore"],
-    "U-TAD": ["u-tad", "utad"],
-    "ECAM": ["ecam"],
-    "TAI": ["tai"],
-    "CES": ["ces"],
-    "CEV": ["cev"],
-    "FX Barcelona Film School": ["fx barcelona", "fx barcelona film school", "fx animation"],
-    "Septima Ars": ["septima ars", "séptima ars"],
-}
+# Diccionario y reglas en src/brands; las marcas se precalculan al ingerir en mention_brands.
+_detect_brands = detect_brands
 
-def _normalize_list(xs):
-    out = []
-    if not xs:
-        return out
-    try:
-        for t in xs:
-            s = str(t or '').lower().strip()
-            if s:
-                out.append(s)
-    except Exception:
-        pass
-    return out
 
-def _detect_brands(topics_list, resp_text, title_text, payload):
-    found = []
-    tlist = _normalize_list(topics_list)
-    # key_topics: igualdad o substring
-    for canon, alts in BRAND_SYNONYMS.items():
-        for a in alts:
-            if any(a == t or a in t for t in tlist):
-                found.append(canon)
-                break
-    # payload.brands: igualdad o substring
-    try:
-        brands_payload = []
-        if isinstance(payload, dict):
-            brands_payload = _normalize_list((payload.get('brands') or []))
-        for canon, alts in BRAND_SYNONYMS.items():
-            for a in alts:
-                if any(a == b or a in b for b in brands_payload):
-                    if canon not in found:
-                        found.append(canon)
-                    break
-    except Exception:
-        pass
-    # substrings en texto/título
-    txt = f"{resp_text or ''} {title_text or ''}"
-    for canon, alts in BRAND_SYNONYMS.items():
-        if any(a in txt for a in alts):
-            if canon not in found:
-                found.append(canon)
-    return found
+def _row_brands(stored, key_topics, resp, title, payload):
+    """Marcas de una fila: las de ``mention_brands`` o, si la mención aún no está indexada, detección en caliente."""
+    if stored is not None:
+        return list(stored)
+    return _detect_brands(key_topics, resp, title, payload)
 
 # ───────────── Helpers estadísticos para el analista ─────────────
 def _histogram(values, bins=10, range_min=-1.0, range_max=1.0):
     try:
-        if not values:
-            return []
-        step = (range_max - range_min) / max(bins, 1)
-        hist = [0 for _ in range(bins)]
-        for v in values:
-            if v is None:
-                continue
-            try:
-                x = float(v)
-            except Exception:
-                continue
-            idx = int((x - range_min) / step)
-            if idx < 0:
-                idx = 0
-            if idx >= bins:
-                idx = bins - 1
-            hist[idx] += 1
-        edges = [range_min + i * step for i in range(bins + 1)]
-        return [{"bin": f"{edges[i]:.2f}..{edges[i+1]:.2f}", "count": hist[i]} for i in range(bins)]
+        return _frame_histogram(values, bins=bins, range_min=range_min, range_max=range_max)
     except Exception:
         return []
 
@@ -2270,6 +2141,59 @@ def parse_filters(request):
     }
 
 
+
+def _filters_cache_key(req) -> dict:
+    """``parse_filters`` normalizado para la clave de caché.
+
+    Con rango relativo (``range=30d``) el fin es ``now()``: se usa el token del
+    rango en lugar de las fechas, que cambiarían en cada petición.
+    """
+    filters = parse_filters(req)
+    if not (req.args.get('start_date') and req.args.get('end_date')):
+        filters['start_date'] = filters['end_date'] = None
+        filters['range'] = req.args.get('range', '30d')
+    return filters
+
+
+def cached_response(*param_names: str):
+    """Cachea la respuesta JSON de un endpoint GET de solo lectura.
+
+    Clave: ruta + filtros normalizados + ``param_names`` de la query string; la
+    caché se invalida sola cuando el polling confirma un poll nuevo
+    (src/utils/api_cache.py). ``nocache=1`` fuerza la consulta a Postgres.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_api_cache()
+            if cache is None or request.args.get('nocache') == '1':
+                return fn(*args, **kwargs)
+            parts = {
+                "filters": _filters_cache_key(request),
+                "params": {name: request.args.get(name) for name in param_names},
+            }
+            body = cache.get(request.path, parts)
+            if body is not None:
+                resp = app.response_class(body, mimetype='application/json')
+                resp.headers['X-Cache'] = 'HIT'
+                return resp
+            resp = app.make_response(fn(*args, **kwargs))
+            # Solo respuestas correctas; los errores (500, 4xx) se vuelven a calcular
+            if resp.status_code == 200 and resp.is_json:
+                cache.set(request.path, parts, resp.get_data(as_text=True))
+                resp.headers['X-Cache'] = 'MISS'
+            return resp
+        return wrapper
+    return decorator
+
+
+def _invalidate_api_cache(reason: str) -> None:
+    """Las ediciones de prompts/categorías cambian los agregados: nueva generación de caché."""
+    try:
+        bump_api_generation(reason)
+    except Exception:
+        pass
+
 # --- Normalización y agrupación de Topics ---
 
 def _strip_accents(text: str) -> str:
@@ -2712,96 +2636,350 @@ def health_check():
         conn = get_db_connection()
         conn.close()
         safe_cfg = {k: ("***" if k == "password" else v) for k, v in DB_CONFIG.items()}
-        return jsonify({"status": "healthy", "db": safe_cfg})
+        return jsonify({"status": "healthy", "db": safe_cfg, "pool": pool_stats()})
     except Exception as e:
         safe_cfg = {k: ("***" if k == "password" else v) for k, v in DB_CONFIG.items()}
-        return jsonify({"status": "unhealthy", "error": str(e), "db": safe_cfg}), 500
+        return jsonify({"status": "unhealthy", "error": str(e), "db": safe_cfg, "pool": pool_stats()}), 500
+
+@app.route('/api/db-pool', methods=['GET'])
+def db_pool_metrics():
+    """Uso del pool de conexiones (checkouts, en uso, esperas, timeouts)."""
+    return jsonify(pool_stats())
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_metrics():
+    """Aciertos, fallos y expulsiones de las cachés en memoria de la API."""
+    api_cache = get_api_cache()
+    return jsonify({
+        "topic_groups": _GROUPS_CACHE.stats(),
+        "ai_categories": _CATEGORY_CACHE.stats(),
+        "responses": api_cache.stats() if api_cache else None,
+    })
+
+# Campos seleccionables de /api/mentions → expresión SQL (``response`` se trunca a ``snippet``)
+MENTION_FIELDS = {
+    "id": "m.id",
+    "engine": "m.engine",
+    "source": "m.source",
+    "response": "m.response",
+    "sentiment": "m.sentiment",
+    "emotion": "m.emotion",
+    "created_at": "m.created_at",
+    "key_topics": "m.key_topics",
+    "title": "m.source_title",
+    "source_url": "m.source_url",
+    "language": "m.language",
+    "summary": "m.summary",
+    "query": "q.query",
+    "generated_insight_id": "m.generated_insight_id",
+}
+MENTION_DEFAULT_FIELDS = ("id", "engine", "source", "response", "sentiment", "created_at", "key_topics",
+                          "title", "source_url", "language")
+MENTIONS_SNIPPET_CHARS = int(os.getenv("MENTIONS_SNIPPET_CHARS", "280"))
+MENTIONS_MAX_LIMIT = int(os.getenv("MENTIONS_MAX_LIMIT", "500"))
+
+
+def _encode_mentions_cursor(created_at: datetime, mention_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{int(mention_id)}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_mentions_cursor(cursor: str) -> tuple[datetime, int]:
+    raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    ts, mention_id = raw.rsplit("|", 1)
+    return datetime.fromisoformat(ts), int(mention_id)
+
+
+def _parse_mention_fields(fields_arg: str | None, default: tuple) -> tuple[list[str], list[str]]:
+    """(campos pedidos, campos desconocidos) del parámetro ``fields``."""
+    fields = [f.strip() for f in fields_arg.split(',') if f.strip()] if fields_arg else list(default)
+    return fields, [f for f in fields if f not in MENTION_FIELDS]
+
+
+def _mention_columns(fields: list[str], snippet: int) -> list[str]:
+    # ``response`` truncada en SQL: el texto completo no sale de Postgres
+    return ["LEFT(m.response, %(snippet)s)" if f == "response" and snippet > 0 else MENTION_FIELDS[f] for f in fields]
+
+
+def _mentions_where(filters: dict) -> tuple[str, dict]:
+    """WHERE (sobre ``mentions m JOIN queries q``) y parámetros con nombre de ``parse_filters``."""
+    # Usamos '<' en la fecha final para ser precisos
+    # Construcción dinámica de filtros
+    where_clauses = ["m.created_at >= %(start)s AND m.created_at < %(end)s"]
+    params = {"start": filters['start_date'], "end": filters['end_date']}
+    if filters.get('model') and filters['model'] != 'all':
+        where_clauses.append("m.engine = %(model)s")
+        params["model"] = filters['model']
+    if filters.get('source') and filters['source'] != 'all':
+        where_clauses.append("m.source = %(source)s")
+        params["source"] = filters['source']
+    if filters.get('topic') and filters['topic'] != 'all':
+        where_clauses.append("COALESCE(q.category, q.topic) = %(topic)s")
+        params["topic"] = filters['topic']
+    # status filter (default active)
+    if filters.get('status') and filters['status'] != 'all':
+        where_clauses.append("COALESCE(m.status, 'active') = %(status)s")
+        params["status"] = filters['status']
+    # hide bots
+    if filters.get('hide_bots'):
+        where_clauses.append("COALESCE(m.is_bot, FALSE) = FALSE")
+
+    # Multi-tenant filters
+    if filters.get('client_id'):
+        where_clauses.append("q.client_id = %(client_id)s")
+        params["client_id"] = filters['client_id']
+    if filters.get('brand_id'):
+        where_clauses.append("q.brand_id = %(brand_id)s")
+        params["brand_id"] = filters['brand_id']
+
+    return " AND ".join(where_clauses), params
+
 
 @app.route('/api/mentions', methods=['GET'])
 def get_mentions():
-    """Obtener menciones con todos los campos enriquecidos."""
+    """Menciones paginadas por cursor (created_at, id), de la más reciente a la más antigua.
+
+    Parámetros propios:
+      - ``cursor``: ``next_cursor`` de la página anterior (sin él, primera página).
+      - ``fields``: campos separados por comas (ver MENTION_FIELDS); por defecto
+        MENTION_DEFAULT_FIELDS.
+      - ``snippet``: caracteres de ``response`` (por defecto MENTIONS_SNIPPET_CHARS;
+        ``0`` = texto completo).
+      - ``count``: ``none`` (por defecto), ``estimate`` (plan del optimizador) o ``exact``.
+      - ``offset``: compatibilidad con la paginación antigua, solo si no hay cursor.
+    El coste de una página no depende de su profundidad (índice en created_at DESC, id DESC,
+    ver migrations/v3_mentions_keyset.py).
+    """
     try:
         filters = parse_filters(request)
-        limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
-        
+        limit = max(1, min(int(request.args.get('limit', 100)), MENTIONS_MAX_LIMIT))
+        offset = int(request.args.get('offset', 0) or 0)
+        cursor = request.args.get('cursor')
+        count_mode = (request.args.get('count') or 'none').lower()
+        snippet = int(request.args.get('snippet', MENTIONS_SNIPPET_CHARS))
+
+        fields, unknown = _parse_mention_fields(request.args.get('fields'), MENTION_DEFAULT_FIELDS)
+        if unknown:
+            return jsonify({"error": f"Campos desconocidos: {', '.join(unknown)}", "allowed": sorted(MENTION_FIELDS)}), 400
+        if cursor:
+            try:
+                cursor_ts, cursor_id = _decode_mentions_cursor(cursor)
+            except Exception:
+                return jsonify({"error": "cursor inválido"}), 400
+
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        # Usamos '<' en la fecha final para ser precisos
-        # Construcción dinámica de filtros
-        where_clauses = ["m.created_at >= %s AND m.created_at < %s"]
-        params = [filters['start_date'], filters['end_date']]
-        if filters.get('model') and filters['model'] != 'all':
-            where_clauses.append("m.engine = %s")
-            params.append(filters['model'])
-        if filters.get('source') and filters['source'] != 'all':
-            where_clauses.append("m.source = %s")
-            params.append(filters['source'])
-        if filters.get('topic') and filters['topic'] != 'all':
-            where_clauses.append("COALESCE(q.category, q.topic) = %s")
-            params.append(filters['topic'])
-        # status filter (default active)
-        if filters.get('status') and filters['status'] != 'all':
-            where_clauses.append("COALESCE(m.status, 'active') = %s")
-            params.append(filters['status'])
-        # hide bots
-        if filters.get('hide_bots'):
-            where_clauses.append("COALESCE(m.is_bot, FALSE) = FALSE")
-
-        # Multi-tenant filters
-        if filters.get('client_id'):
-            where_clauses.append("q.client_id = %s")
-            params.append(filters['client_id'])
-        if filters.get('brand_id'):
-            where_clauses.append("q.brand_id = %s")
-            params.append(filters['brand_id'])
-
-        where_sql = " AND ".join(where_clauses)
-
-        base_query = f"""
-        SELECT 
-            m.id, m.engine, m.source, m.response, m.sentiment, m.created_at,
-            m.key_topics, LOWER(COALESCE(m.source_title,'')) AS title,
-            i.payload
-        FROM mentions m
-        JOIN queries q ON m.query_id = q.id
-        LEFT JOIN insights i ON i.id = m.generated_insight_id
-        WHERE {where_sql}
-        ORDER BY m.created_at DESC LIMIT %s OFFSET %s
-        """
-        cur.execute(base_query, params + [limit, offset])
+        where_sql, params = _mentions_where(filters)
+
+        page_where = where_sql
+        if cursor:
+            page_where += " AND (m.created_at, m.id) < (%(cursor_ts)s, %(cursor_id)s)"
+            params.update(cursor_ts=cursor_ts, cursor_id=cursor_id)
+            offset = 0
+        # created_at e id siempre se leen: forman el cursor de la página siguiente
+        select_sql = ", ".join(["m.created_at", "m.id"] + _mention_columns(fields, snippet))
+        params.update(snippet=snippet, limit=limit + 1, offset=offset)
+        cur.execute(f"""
+            SELECT {select_sql}
+            FROM mentions m
+            JOIN queries q ON m.query_id = q.id
+            WHERE {page_where}
+            ORDER BY m.created_at DESC, m.id DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        """, params)
         rows = cur.fetchall()
-        
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
         mentions = []
         for row in rows:
-            mentions.append({
-                "id": row[0], "engine": row[1], "source": row[2],
-                "response": row[3], "sentiment": float(row[4] or 0.0),
-                "created_at": row[5].isoformat() if row[5] else None,
-                "key_topics": row[6] or [],
-                "title": row[7], "source_url": row[8],
-                "language": row[9] or "unknown"
-            })
+            item = dict(zip(fields, row[2:]))
+            if "sentiment" in item:
+                item["sentiment"] = float(item["sentiment"] or 0.0)
+            if "created_at" in item:
+                item["created_at"] = item["created_at"].isoformat() if item["created_at"] else None
+            if "key_topics" in item:
+                item["key_topics"] = item["key_topics"] or []
+            if "language" in item:
+                item["language"] = item["language"] or "unknown"
+            mentions.append(item)
+
+        total = None
+        if count_mode == 'exact':
+            cur.execute(f"""
+                SELECT COUNT(*)
+                FROM mentions m
+                JOIN queries q ON m.query_id = q.id
+                WHERE {where_sql}
+            """, params)
+            total = cur.fetchone()[0] or 0
+        elif count_mode == 'estimate':
+            # Filas estimadas por el planificador: no recorre la tabla
+            cur.execute(f"""
+                EXPLAIN (FORMAT JSON)
+                SELECT 1
+                FROM mentions m
+                JOIN queries q ON m.query_id = q.id
+                WHERE {where_sql}
+            """, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            total = int(plan[0]["Plan"]["Plan Rows"])
 
-        count_query = f"""
-        SELECT COUNT(*)
-        FROM mentions m
-        JOIN queries q ON m.query_id = q.id
-        WHERE {where_sql}
-        """
-        cur.execute(count_query, params)
-        total = cur.fetchone()[0] or 0
-        
         cur.close()
         conn.close()
-        
-        return jsonify({ "mentions": mentions, "pagination": { "total": total, "limit": limit, "offset": offset, "has_next": offset + limit < total } })
+
+        next_cursor = _encode_mentions_cursor(rows[-1][0], rows[-1][1]) if has_next and rows else None
+        return jsonify({
+            "mentions": mentions,
+            "pagination": {
+                "limit": limit, "offset": offset, "has_next": has_next, "next_cursor": next_cursor,
+                "total": total, "total_is_estimate": count_mode == 'estimate',
+            },
+        })
     except Exception as e:
         print(f"Error en get_mentions: {e}")
         return jsonify({"error": str(e)}), 500
 
+
+MENTIONS_EXPORT_BATCH = int(os.getenv("MENTIONS_EXPORT_BATCH", "2000"))
+
+
+def _export_value(value, for_csv: bool = False):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if for_csv and isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+@app.route('/api/mentions/export', methods=['GET'])
+def export_mentions():
+    """Exporta menciones en streaming (``format=ndjson`` por defecto, o ``csv``).
+
+    Mismos filtros que /api/mentions y mismo ``fields`` (por defecto todos los campos,
+    ``response`` completa salvo ``snippet``). Las filas salen de un cursor con nombre
+    (server-side) por lotes de MENTIONS_EXPORT_BATCH, así que la memoria del worker no
+    depende del tamaño del rango exportado.
+    """
+    filters = parse_filters(request)
+    fmt = (request.args.get('format') or 'ndjson').lower()
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format debe ser 'ndjson' o 'csv'"}), 400
+    fields, unknown = _parse_mention_fields(request.args.get('fields'), tuple(MENTION_FIELDS))
+    if unknown:
+        return jsonify({"error": f"Campos desconocidos: {', '.join(unknown)}", "allowed": sorted(MENTION_FIELDS)}), 400
+    try:
+        snippet = int(request.args.get('snippet', 0))
+    except ValueError:
+        return jsonify({"error": "snippet debe ser un entero"}), 400
+
+    where_sql, params = _mentions_where(filters)
+    params["snippet"] = snippet
+    sql = f"""
+        SELECT {", ".join(_mention_columns(fields, snippet))}
+        FROM mentions m
+        JOIN queries q ON m.query_id = q.id
+        WHERE {where_sql}
+        ORDER BY m.created_at DESC, m.id DESC
+    """
+
+    def generate():
+        # Conexión propia (no la de ``g``): el generador sigue vivo cuando termina la vista
+        conn = get_pooled_connection(DB_CONFIG)
+        cur = None
+        exported = 0
+        try:
+            cur = conn.cursor(name=f"mentions_export_{os.getpid()}_{int(time() * 1000)}")
+            cur.itersize = MENTIONS_EXPORT_BATCH
+            cur.execute(sql, params)
+            if fmt == 'csv':
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                writer.writerow(fields)
+                yield buf.getvalue()
+            while True:
+                rows = cur.fetchmany(MENTIONS_EXPORT_BATCH)
+                if not rows:
+                    break
+                exported += len(rows)
+                if fmt == 'csv':
+                    buf = io.StringIO()
+                    writer = csv.writer(buf)
+                    writer.writerows([_export_value(v, for_csv=True) for v in row] for row in rows)
+                    yield buf.getvalue()
+                else:
+                    yield "".join(
+                        json.dumps({f: _export_value(v) for f, v in zip(fields, row)}, ensure_ascii=False) + "\n"
+                        for row in rows
+                    )
+        except Exception as e:
+            # Las cabeceras ya se enviaron: solo queda registrar y cortar el stream
+            print(f"Error en export_mentions tras {exported} filas: {e}")
+        finally:
+            try:
+                if cur is not None:
+                    cur.close()
+                conn.rollback()
+            except Exception:
+                pass
+            conn.close()
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        generate(),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={"Content-Disposition": f"attachment; filename=mentions_{stamp}.{fmt}"},
+    )
+
+VISIBILITY_TZ = os.getenv("VISIBILITY_TZ", "Europe/Madrid")
+pytz.timezone(VISIBILITY_TZ)  # falla al arrancar si la zona no existe (se interpola en el SQL)
+
+
+def _local_iso_sql(ts: str) -> str:
+    """Expresión SQL con el isoformat en VISIBILITY_TZ (``YYYY-MM-DDTHH:MM:SS±HH:MM``) de un timestamptz."""
+    local = f"({ts} AT TIME ZONE '{VISIBILITY_TZ}')"
+    offset = f"({local} - ({ts} AT TIME ZONE 'UTC'))"
+    return (
+        f"to_char({local}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+        f"CASE WHEN {offset} < interval '0' THEN '-' || to_char(-{offset}, 'HH24:MI') "
+        f"ELSE '+' || to_char({offset}, 'HH24:MI') END"
+    )
+
+
+def _visibility_series_sql(agg_sql: str, granularity: str) -> str:
+    """Serie de visibilidad sobre ``agg_sql`` (columnas ``bucket, [bucket_ts,] total, brand``).
+
+    Con ``day`` los días sin menciones salen de ``generate_series`` entre los dos últimos
+    parámetros (fechas inclusive); con ``hour`` hay un punto por bucket. Devuelve filas
+    ``(etiqueta local, epoch ms, total, marca, porcentaje)``.
+    """
+    if granularity == 'hour':
+        buckets = "SELECT bucket, bucket_ts, total, brand FROM agg"
+    else:
+        buckets = """
+            SELECT d::date AS bucket, d::timestamp AT TIME ZONE 'UTC' AS bucket_ts,
+                   COALESCE(a.total, 0) AS total, COALESCE(a.brand, 0) AS brand
+            FROM generate_series(%s::date, %s::date, interval '1 day') d
+            LEFT JOIN agg a ON a.bucket = d::date
+        """
+    return f"""
+        WITH agg AS ({agg_sql}),
+        b AS ({buckets})
+        SELECT {_local_iso_sql("b.bucket_ts")} AS label,
+               (EXTRACT(EPOCH FROM b.bucket_ts) * 1000)::bigint AS ts,
+               b.total, b.brand,
+               ROUND(b.brand * 100.0 / GREATEST(b.total, 1), 1)::float AS pct
+        FROM b
+        ORDER BY b.bucket_ts
+    """
+
+
 @app.route('/api/visibility', methods=['GET'])
+@cached_response('granularity')
 def get_visibility():
     """Visibilidad = menciones de la marca / total de menciones (con filtros aplicados).
     Devuelve score del periodo, delta y serie temporal en porcentaje (0–100%).
@@ -2828,109 +3006,52 @@ def get_visibility():
             where.append("q.brand_id = %s"); params.append(filters['brand_id'])
         where_sql = " AND ".join(where)
 
-        synonyms = [s.lower() for s in BRAND_SYNONYMS.get(brand, [brand.lower()])]
-        like_patterns = [f"%{s}%" for s in synonyms]
-
-        series = []
-        num_sum = 0
-        den_sum = 0
+        # Marcas del diccionario → mention_brands (precalculado); el resto, predicado LIKE legacy
+        brand_sql, brand_params = brand_filter(brand)
 
+        # Una sola pasada: total y menciones de la marca con COUNT(*) FILTER; el relleno de
+        # días vacíos (generate_series) y la zona horaria de las etiquetas van en SQL
+        joins = "JOIN queries q ON m.query_id = q.id LEFT JOIN insights i ON i.id = m.generated_insight_id"
         if granularity == 'hour':
-            query = f"""
-                WITH poll_stats AS (
-                    SELECT
-                        poll_id,
-                        MIN(m.created_at) as poll_start_time,
-                        COUNT(*) as total_mentions,
-                        COUNT(CASE WHEN
-                            EXISTS (
-                                SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                                WHERE LOWER(TRIM(kt)) = ANY(%s)
-                            ) OR LOWER(COALESCE(m.response,'')) LIKE ANY(%s)
-                              OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(%s)
-                              OR EXISTS (
-                                SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                                WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(%s)
-                              )
-                        THEN 1 END) as brand_mentions
-                    FROM mentions m
-                    JOIN queries q ON m.query_id = q.id
-                    LEFT JOIN insights i ON i.id = m.generated_insight_id
-                    WHERE {where_sql} AND m.poll_id IS NOT NULL
-                    GROUP BY poll_id
-                )
-                SELECT
-                    poll_start_time,
-                    total_mentions,
-                    brand_mentions,
-                    (brand_mentions::float / GREATEST(total_mentions, 1)) * 100.0 as visibility_pct
-                FROM poll_stats
-                ORDER BY poll_start_time;
+            # Un punto por poll_id, fechado con su primera mención
+            agg_sql = f"""
+                SELECT m.poll_id AS bucket, MIN(m.created_at)::timestamptz AS bucket_ts,
+                       COUNT(*) AS total, COUNT(*) FILTER (WHERE {brand_sql}) AS brand
+                FROM mentions m {joins}
+                WHERE {where_sql} AND m.poll_id IS NOT NULL
+                GROUP BY m.poll_id
             """
-            cur.execute(query, tuple([synonyms, like_patterns, like_patterns, synonyms] + params))
-            rows = cur.fetchall()
-
-            # Serie por hora convertida a zona Europe/Madrid
-            tz_madrid = pytz.timezone('Europe/Madrid')
-            series = []
-            for row in rows:
-                dt_utc = row[0]
-                try:
-                    dt_madrid = (dt_utc.replace(tzinfo=pytz.UTC) if dt_utc.tzinfo is None else dt_utc.astimezone(pytz.UTC)).astimezone(tz_madrid)
-                except Exception:
-                    dt_madrid = dt_utc
-                series.append({"date": dt_madrid.isoformat(), "value": round(row[3], 1)})
-
-            # Score del periodo (ponderado por volumen)
-            pooled_total = sum(int(r[1] or 0) for r in rows)
-            pooled_brand = sum(int(r[2] or 0) for r in rows)
-            num_sum = pooled_brand
-            den_sum = pooled_total
-
-        else: # granularidad 'day'
-            cur.execute(f"SELECT DATE(m.created_at) AS d, COUNT(*) FROM mentions m JOIN queries q ON m.query_id = q.id WHERE {where_sql} GROUP BY DATE(m.created_at) ORDER BY DATE(m.created_at)", tuple(params))
-            total_rows = cur.fetchall()
-
-            cur.execute(f"""
-                SELECT DATE(m.created_at) AS d, COUNT(*)
-                FROM mentions m
-                JOIN queries q ON m.query_id = q.id
-                LEFT JOIN insights i ON i.id = m.generated_insight_id
+            agg_params = brand_params + params
+        elif brand in BRAND_SYNONYMS and rollups_ready(cur):
+            # Días completos desde mention_daily_rollup; solo los extremos parciales van a mentions
+            rsql, rparams = rollup_sql(filters['start_date'], filters['end_date'], filters,
+                                       ["day", "brand"], brands=[ALL_BRANDS, brand])
+            agg_sql = f"""
+                SELECT r.day AS bucket,
+                       SUM(r.mentions) FILTER (WHERE r.brand = %s) AS total,
+                       SUM(r.mentions) FILTER (WHERE r.brand = %s) AS brand
+                FROM ({rsql}) r
+                GROUP BY r.day
+            """
+            agg_params = [ALL_BRANDS, brand] + rparams
+        else:
+            agg_sql = f"""
+                SELECT DATE(m.created_at) AS bucket,
+                       COUNT(*) AS total, COUNT(*) FILTER (WHERE {brand_sql}) AS brand
+                FROM mentions m {joins}
                 WHERE {where_sql}
-                  AND (
-                    EXISTS (
-                      SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                      WHERE LOWER(TRIM(kt)) = ANY(%s)
-                    )
-                    OR LOWER(COALESCE(m.response,'')) LIKE ANY(%s)
-                    OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(%s)
-                    OR EXISTS (
-                      SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                      WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(%s)
-                    )
-                  )
                 GROUP BY DATE(m.created_at)
-                ORDER BY DATE(m.created_at)
-            """, tuple(params + [synonyms, like_patterns, like_patterns, synonyms]))
-            core_rows = cur.fetchall()
+            """
+            agg_params = brand_params + params
+        if granularity != 'hour':
+            agg_params = agg_params + [filters['start_date'].date(), filters['end_date'].date()]
 
-            from datetime import timedelta
-            core_by_day = {d: int(c or 0) for d, c in core_rows}
-            total_by_day = {d: int(c or 0) for d, c in total_rows}
-            start_day = filters['start_date'].date()
-            end_day = filters['end_date'].date()
-            day = start_day
-            from datetime import datetime as _dt
-            while day <= end_day:
-                num = int(core_by_day.get(day, 0))
-                den = int(total_by_day.get(day, 0))
-                num_sum += num
-                den_sum += den
-                pct = round((num / max(den, 1)) * 100.0, 1)
-                tz_madrid = pytz.timezone('Europe/Madrid')
-                ts_dt = _dt.combine(day, _dt.min.time()).replace(tzinfo=pytz.UTC).astimezone(tz_madrid)
-                series.append({"date": ts_dt.isoformat(), "ts": int(ts_dt.timestamp() * 1000), "value": pct})
-                day += timedelta(days=1)
+        cur.execute(_visibility_series_sql(agg_sql, granularity), tuple(agg_params))
+        rows = cur.fetchall()
+        series = [{"date": label, "ts": ts, "value": pct} for label, ts, _total, _brand, pct in rows]
+        # Score del periodo (ponderado por volumen)
+        den_sum = sum(int(r[2] or 0) for r in rows)
+        num_sum = sum(int(r[3] or 0) for r in rows)
 
         visibility_score = round((num_sum / max(den_sum, 1)) * 100.0, 1)
 
@@ -2978,8 +3099,9 @@ def get_visibility_ranking():
         # Helper: trae payloads de insights para el rango indicado
         def fetch_rows(p):
             cur.execute(f"""
-                SELECT m.id, m.key_topics, LOWER(COALESCE(m.response,'')) AS resp,
-                       LOWER(COALESCE(m.source_title,'')) AS title, i.payload
+                SELECT m.id, m.key_topics, {pending_text_sql('response')} AS resp,
+                       {pending_text_sql('source_title')} AS title, i.payload,
+                       {stored_brands_sql()} AS brands
                 FROM mentions m
                 JOIN queries q ON m.query_id = q.id
                 LEFT JOIN insights i ON i.id = m.generated_insight_id
@@ -2987,15 +3109,11 @@ def get_visibility_ranking():
             """, tuple(p))
             return cur.fetchall()
 
-        # Traer filas del período actual
-        rows = fetch_rows(params)
-        total_responses = len(rows)
-
         def compute_counts(rows_in):
             from collections import defaultdict
             counts_local = defaultdict(int)
-            for _id, key_topics, resp, title, payload in rows_in:
-                detected = _detect_brands(key_topics, resp, title, payload)
+            for _id, key_topics, resp, title, payload, stored in rows_in:
+                detected = _row_brands(stored, key_topics, resp, title, payload)
                 seen = set()
                 for brand_name in detected:
                     if brand_name in seen:
@@ -3004,7 +3122,20 @@ def get_visibility_ranking():
                     counts_local[brand_name] += 1
             return counts_local
 
-        counts = compute_counts(rows)
+        use_rollups = rollups_ready(cur)
+
+        def period_counts(p):
+            """(total de respuestas, menciones por marca) del rango de ``p``."""
+            if use_rollups:
+                rolled = query_rollup(cur, p[0], p[1], filters, ["brand"], brands=list(BRAND_SYNONYMS) + [ALL_BRANDS])
+                by_brand = {b: int(n or 0) for b, n, *_ in rolled}
+                total = by_brand.pop(ALL_BRANDS, 0)
+                return total, {b: n for b, n in by_brand.items() if n}
+            rows_in = fetch_rows(p)
+            return len(rows_in), compute_counts(rows_in)
+
+        # Período actual
+        total_responses, counts = period_counts(params)
 
         colors = ["bg-blue-500", "bg-red-500", "bg-blue-600", "bg-yellow-500", "bg-gray-800"]
         # Calcular comparativa con el periodo anterior
@@ -3023,9 +3154,7 @@ def get_visibility_ranking():
         prev_params[0] = prev_start
         prev_params[1] = prev_end
 
-        rows_prev = fetch_rows(prev_params)
-        total_prev = len(rows_prev)
-        counts_prev = compute_counts(rows_prev)
+        total_prev, counts_prev = period_counts(prev_params)
 
         ranking = []
         denom = max(total_responses, 1)
@@ -3077,34 +3206,23 @@ def get_industry_ranking():
             where.append("q.brand_id = %s"); params.append(filters['brand_id'])
         where_sql = " AND ".join(where)
 
-        # Obtener menciones con su topic y los campos necesarios para detección por sinónimos
-        cur.execute(f"""
-            SELECT q.topic, m.key_topics,
-                   LOWER(COALESCE(m.response,'')) AS resp,
-                   LOWER(COALESCE(m.source_title,'')) AS title,
-                   i.payload
-            FROM mentions m
-            JOIN queries q ON m.query_id = q.id
-            LEFT JOIN insights i ON i.id = m.generated_insight_id
-            WHERE {where_sql}
-        """, tuple(params))
-        rows = cur.fetchall()
-
-        # Detectar marcas por sinónimos + payload.brands. Contamos presencia por mención
         from collections import defaultdict
         overall_counts = defaultdict(int)
         topic_counts = defaultdict(lambda: defaultdict(int))
-        for topic, key_topics, resp, title, payload in rows:
-            detected = _detect_brands(key_topics, resp, title, payload)
-            if not detected:
-                continue
-            seen = set()
-            for canon in detected:
-                if canon in seen:
+        if rollups_ready(cur):
+            # Días completos desde mention_daily_rollup; solo los extremos parciales se leen de mentions
+            rolled = query_rollup(cur, filters['start_date'], filters['end_date'], filters, ["topic", "brand"],
+                                  brands=list(BRAND_SYNONYMS), topic_column="topic")
+            for topic, canon, mentions_n, *_ in rolled:
+                if not mentions_n:
                     continue
-                seen.add(canon)
-                overall_counts[canon] += 1
-                topic_counts[topic or 'Uncategorized'][canon] += 1
+                overall_counts[canon] += int(mentions_n)
+                topic_counts[topic or 'Uncategorized'][canon] += int(mentions_n)
+        else:
+            # Conteo agregado en SQL sobre mention_brands (solo las pendientes se detectan en caliente)
+            for (topic, canon), n in count_mention_brands(cur, where_sql, params, group_sql="q.topic").items():
+                overall_counts[canon] += n
+                topic_counts[topic or 'Uncategorized'][canon] += n
 
         colors = ["bg-blue-500", "bg-red-500", "bg-blue-600", "bg-yellow-500", "bg-gray-800"]
         # overall ranking
@@ -3188,18 +3306,13 @@ def get_insights():
         else:
             project_id = int(project_id)
 
-        from src.reports import aggregator as agg
-        session = agg.get_session()
-        try:
-            clusters = agg.aggregate_clusters_for_report(
-                session,
-                project_id,
-                start_date=filters.get('start_date').strftime('%Y-%m-%d') if filters.get('start_date') else None,
-                end_date=(filters.get('end_date') - timedelta(days=1)).strftime('%Y-%m-%d') if filters.get('end_date') else None,
-                max_rows=max(100, min(5000, limit)),
-            )
-        finally:
-            session.close()
+        # Instantánea compartida con los informes: mismos clusters KMeans y resumen de insights
+        snapshot = get_report_snapshot(
+            project_id,
+            filters.get('start_date').strftime('%Y-%m-%d') if filters.get('start_date') else None,
+            (filters.get('end_date') - timedelta(days=1)).strftime('%Y-%m-%d') if filters.get('end_date') else None,
+        )
+        clusters = snapshot.clusters(max_rows=max(100, min(5000, limit)))
 
         # Enriquecer con un nombre de tema simple (heurística: primeras palabras del primer ejemplo)
         def _label_topic(cluster_obj: dict) -> str:
@@ -3229,13 +3342,8 @@ def get_insights():
         # Mezcla SIEMPRE insights clásicos para garantizar volumen suficiente en UI
         classic_insights: list[dict] = []
         try:
-            from src.reports import aggregator as agg2
-            sess2 = agg2.get_session()
-            try:
-                # Si hay muy pocos clusters, intenta sin project_id para traer catálogo general
-                summary = agg2.get_agent_insights_data(sess2, project_id if len(clusters_out) >= 10 else None, limit=800)
-            finally:
-                sess2.close()
+            # Si hay muy pocos clusters, intenta sin project_id para traer catálogo general
+            summary = snapshot.agent_insights(limit=800, scoped=len(clusters_out) >= 10)
 
             buckets = (summary or {}).get("buckets", {})
             # Convertir buckets en filas compatibles
@@ -3309,6 +3417,7 @@ def get_insights():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/sentiment', methods=['GET'])
+@cached_response('granularity')
 def get_sentiment():
     try:
         filters = parse_filters(request)
@@ -3333,10 +3442,9 @@ def get_sentiment():
         where_sql = " AND ".join(where_clauses)
         join_sql = "JOIN queries q ON m.query_id = q.id"
 
-        # Detección robusta de marca (sinónimos + texto + título + payload.brands)
         brand = request.args.get('brand') or os.getenv('DEFAULT_BRAND', 'The Core School')
-        synonyms = [s.lower() for s in BRAND_SYNONYMS.get(brand, [brand.lower()])]
-        like_patterns = [f"%{s}%" for s in synonyms]
+        # Detección de marca: marcas del diccionario → mention_brands (precalculado); el resto, predicado LIKE legacy
+        brand_sql, brand_params = brand_filter(brand)
 
         timeseries = []
         total_neg = 0
@@ -3351,18 +3459,7 @@ def get_sentiment():
                         m.poll_id,
                         m.created_at,
                         COALESCE(m.sentiment, 0) AS sent,
-                        (
-                            EXISTS (
-                                SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                                WHERE LOWER(TRIM(kt)) = ANY(%s)
-                            )
-                            OR LOWER(COALESCE(m.response,'')) LIKE ANY(%s)
-                            OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(%s)
-                            OR EXISTS (
-                                SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                                WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(%s)
-                            )
-                        ) AS is_brand
+                        {brand_sql} AS is_brand
                     FROM mentions m
                     {join_sql}
                     LEFT JOIN insights i ON i.id = m.generated_insight_id
@@ -3378,7 +3475,7 @@ def get_sentiment():
                 GROUP BY poll_id
                 ORDER BY MIN(created_at)
             """
-            cur.execute(query, tuple([synonyms, like_patterns, like_patterns, synonyms] + params))
+            cur.execute(query, tuple(brand_params + params))
             rows = cur.fetchall()
             tz_madrid = pytz.timezone('Europe/Madrid')
             for poll_start_time, total_b, pos_b, neu_b, neg_b in rows:
@@ -3402,18 +3499,7 @@ def get_sentiment():
                     SELECT 
                         m.created_at,
                         COALESCE(m.sentiment, 0) AS sent,
-                        (
-                            EXISTS (
-                                SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                                WHERE LOWER(TRIM(kt)) = ANY(%s)
-                            )
-                            OR LOWER(COALESCE(m.response,'')) LIKE ANY(%s)
-                            OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(%s)
-                            OR EXISTS (
-                                SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                                WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(%s)
-                            )
-                        ) AS is_brand
+                        {brand_sql} AS is_brand
                     FROM mentions m
                     {join_sql}
                     LEFT JOIN insights i ON i.id = m.generated_insight_id
@@ -3428,8 +3514,16 @@ def get_sentiment():
                 GROUP BY DATE(created_at)
                 ORDER BY DATE(created_at)
             """
-            cur.execute(query, tuple([synonyms, like_patterns, like_patterns, synonyms] + params))
-            rows = cur.fetchall()
+            if brand in BRAND_SYNONYMS and rollups_ready(cur):
+                # Mismo resultado desde mention_daily_rollup (días sin menciones de la marca incluidos a 0)
+                rolled = query_rollup(cur, filters['start_date'], filters['end_date'], filters, ["day", "brand"],
+                                      brands=[ALL_BRANDS, brand], topic_column="topic",
+                                      query_brand=filters.get('brand') or None)
+                by_day = {d: (pos, neu, neg) for d, b, _n, _s, pos, neu, neg in rolled if b == brand}
+                rows = [(d, *by_day.get(d, (0, 0, 0))) for d, b, *_ in rolled if b == ALL_BRANDS]
+            else:
+                cur.execute(query, tuple(brand_params + params))
+                rows = cur.fetchall()
             from datetime import datetime as _dt
             tz_madrid = pytz.timezone('Europe/Madrid')
             for d_bucket, pos, neu, neg in rows:
@@ -3443,20 +3537,7 @@ def get_sentiment():
         distribution = {"negative": int(total_neg), "neutral": int(total_neu), "positive": int(total_pos)}
 
         # Top negativas/positivas de la marca
-        brand_filter_sql = f"""
-            (
-                EXISTS (
-                    SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                    WHERE LOWER(TRIM(kt)) = ANY(%s)
-                )
-                OR LOWER(COALESCE(m.response,'')) LIKE ANY(%s)
-                OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(%s)
-                OR EXISTS (
-                    SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                    WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(%s)
-                )
-            )
-        """
+        brand_filter_sql = brand_sql
 
         neg_sql = f"""
             SELECT m.id, m.summary, m.key_topics, m.source_title, m.source_url, m.sentiment, m.created_at
@@ -3467,7 +3548,7 @@ def get_sentiment():
             ORDER BY m.sentiment ASC NULLS FIRST, m.created_at DESC
             LIMIT 20
         """
-        cur.execute(neg_sql, tuple(params + [synonyms, like_patterns, like_patterns, synonyms]))
+        cur.execute(neg_sql, tuple(params + brand_params))
         neg_rows = cur.fetchall()
         negatives = [
             {
@@ -3491,7 +3572,7 @@ def get_sentiment():
             ORDER BY m.sentiment DESC NULLS LAST, m.created_at DESC
             LIMIT 20
         """
-        cur.execute(pos_sql, tuple(params + [synonyms, like_patterns, like_patterns, synonyms]))
+        cur.execute(pos_sql, tuple(params + brand_params))
         pos_rows = cur.fetchall()
         positives = [
             {
@@ -3519,6 +3600,7 @@ def get_sentiment():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/topics-cloud', methods=['GET'])
+@cached_response('groups')
 def get_topics_cloud():
     try:
         filters = parse_filters(request)
@@ -3561,16 +3643,10 @@ def get_topics_cloud():
         groups = []
         groups_flag = (request.args.get('groups', '1') or '1').lower()
         if groups_flag in ('1', 'true', 'yes', 'y'):
-            # Clave de caché por ventana temporal + filtros principales
+            # Clave de caché: los topics que recibe la IA (con rango relativo las fechas cambian
+            # en cada petición, pero la lista de topics no)
             try:
-                cache_key = "|".join([
-                    str(filters.get('brand') or ''),
-                    str(filters.get('model') or ''),
-                    str(filters.get('source') or ''),
-                    str(filters.get('topic') or ''),
-                    (filters.get('start_date') or datetime.min).isoformat(),
-                    (filters.get('end_date') or datetime.max).isoformat(),
-                ])
+                cache_key = hashlib.sha256(json.dumps(topics, sort_keys=True).encode("utf-8")).hexdigest()
             except Exception:
                 cache_key = None
 
@@ -3596,6 +3672,7 @@ def get_topics_cloud():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/dashboard-kpis', methods=['GET'])
+@cached_response()
 def get_dashboard_kpis():
     try:
         conn = get_db_connection()
@@ -3711,6 +3788,7 @@ def get_sources():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/prompts', methods=['GET'])
+@cached_response()
 def get_prompts_grouped():
     """Devuelve prompts agrupados por topic, con métricas básicas."""
     try:
@@ -3757,10 +3835,7 @@ def get_prompts_grouped():
             params_mentions.append(filters['topic'])
         cur.execute(
             f"""
-            SELECT m.query_id, m.key_topics,
-                   LOWER(COALESCE(m.response,'')) AS resp,
-                   LOWER(COALESCE(m.source_title,'')) AS title,
-                   i.payload
+            SELECT m.query_id, i.payload
             FROM mentions m
             JOIN queries q ON m.query_id = q.id
             LEFT JOIN insights i ON i.id = m.generated_insight_id
@@ -3777,31 +3852,6 @@ def get_prompts_grouped():
         # Agrupar menciones por query_id
         mentions_by_qid = defaultdict(list)
 
-        # Diccionario de marcas y sinónimos (alineado con otros endpoints)
-        BRAND_SYNONYMS = {
-            "The Core School": ["the core", "the core school", "thecore"],
-            "U-TAD": ["u-tad", "utad"],
-            "ECAM": ["ecam"],
-            "TAI": ["tai"],
-            "CES": ["ces"],
-            "CEV": ["cev"],
-            "FX Barcelona Film School": ["fx barcelona", "fx barcelona film school", "fx animation"],
-            "Septima Ars": ["septima ars", "séptima ars"],
-        }
-
-        def _normalize_list(xs):
-            out = []
-            if not xs:
-                return out
-            try:
-                for t in xs:
-                    s = str(t or '').lower().strip()
-                    if s:
-                        out.append(s)
-            except Exception:
-                pass
-            return out
-
         def _extract_brands_from_payload(payload):
             names = []
             try:
@@ -3821,11 +3871,8 @@ def get_prompts_grouped():
                 return []
             return names
 
-        for qid, key_topics, resp, title, payload in mention_rows:
+        for qid, payload in mention_rows:
             mentions_by_qid[qid].append({
-                "topics": key_topics,
-                "resp": resp,
-                "title": title,
                 "payload": payload if isinstance(payload, dict) else {},
             })
         topics_map = defaultdict(list)
@@ -3956,6 +4003,7 @@ def create_prompt():
         new_row = cur.fetchone()
         conn.commit()
         cur.close(); conn.close()
+        _invalidate_api_cache("prompts")
 
         return jsonify({
             "id": new_row[0], "query": new_row[1], "brand": new_row[2], "topic": new_row[3],
@@ -4017,10 +4065,14 @@ def update_prompt(query_id: int):
             return jsonify({"error": "No fields to update"}), 400
 
         sql = f"UPDATE queries SET {', '.join(fields)} WHERE id = %s RETURNING id, query, brand, topic, language, enabled, created_at"
+        # topic/brand son dimensiones del rollup diario: se mueven en la misma transacción
+        moved = [query_id] if any(f.startswith(('topic ', 'brand ')) for f in fields) else []
         conn = get_db_connection(); cur = conn.cursor()
-        cur.execute(sql, tuple(values + [query_id]))
-        row = cur.fetchone()
+        with moving_query_rollups(cur, moved):
+            cur.execute(sql, tuple(values + [query_id]))
+            row = cur.fetchone()
         conn.commit(); cur.close(); conn.close()
+        _invalidate_api_cache("prompts")
         if not row:
             return jsonify({"error": "Prompt not found"}), 404
 
@@ -4041,6 +4093,7 @@ def delete_prompt(query_id: int):
         cur.execute("DELETE FROM queries WHERE id = %s", (query_id,))
         deleted = cur.rowcount
         conn.commit(); cur.close(); conn.close()
+        _invalidate_api_cache("prompts")
         if deleted == 0:
             return jsonify({"error": "Prompt not found"}), 404
         return jsonify({"message": f"Prompt {query_id} deleted"})
@@ -4398,12 +4451,15 @@ def recategorize_prompts():
                     inclasificables += 1
                 if not dry_run:
                     cur2 = conn.cursor()
-                    cur2.execute("UPDATE queries SET topic = %s WHERE id = %s", (final_cat, qid))
+                    with moving_query_rollups(cur2, [qid]):
+                        cur2.execute("UPDATE queries SET topic = %s WHERE id = %s", (final_cat, qid))
                     conn.commit(); cur2.close()
                 updated += 1
                 changes.append({"id": qid, "old": old_topic, "new": final_cat})
 
         cur.close(); conn.close()
+        if updated and not dry_run:
+            _invalidate_api_cache("recategorize")
 
         return jsonify({
             "brand": brand,
@@ -4440,59 +4496,158 @@ def archive_mention(mention_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reports/generate', methods=['POST'])
-def generate_report_endpoint():
-    try:
-        payload = request.get_json() or {}
-        # Soporte multi-cliente/categorías
-        filters = {
-            'start_date': parse_date(payload.get('start_date')) if payload.get('start_date') else (datetime.utcnow() - timedelta(days=30)),
-            'end_date': parse_date(payload.get('end_date')) if payload.get('end_date') else datetime.utcnow(),
-            'model': payload.get('model') or 'all',
-            'source': payload.get('source') or 'all',
-            'topic': payload.get('topic') or 'all',
-            'client_id': payload.get('client_id'),
-            'brand_id': payload.get('brand_id'),
-            'category': payload.get('category') or payload.get('prompt_category'),
-        }
-        test_mode = bool(payload.get('test_mode', False))
-        if not filters:
-            return jsonify({"error": "Filtros no proporcionados"}), 400
+# ───────────── Cola de informes (src/reports/jobs.py) ─────────────
+REPORT_JOB_LONGPOLL_MAX_SECONDS = float(os.getenv("REPORT_JOB_LONGPOLL_MAX_SECONDS", "30"))
+_REPORT_JOBS_READY = False
+
+
+def _report_workers():
+    """Workers de informes del proceso (se arrancan con la primera petición que los necesita)."""
+    return get_report_workers(lambda: get_pooled_connection(DB_CONFIG))
+
+
+def _ensure_report_jobs(cur):
+    global _REPORT_JOBS_READY
+    if not _REPORT_JOBS_READY:
+        ensure_report_jobs_table(cur)
+        _REPORT_JOBS_READY = True
 
-        # 1) Obtener todos los datos en una sola llamada
-        from src.reports import aggregator as agg
+
+def _report_job_params(payload, kind):
+    """Parámetros normalizados del informe: con ellos se calcula el hash que funde peticiones idénticas."""
+    if kind == "v2":
+        return {"project_id": int(payload.get('project_id') or 1), "start_date": None, "end_date": None}
+    start = parse_date(payload.get('start_date')) if payload.get('start_date') else (datetime.utcnow() - timedelta(days=30))
+    end = parse_date(payload.get('end_date')) if payload.get('end_date') else datetime.utcnow()
+    project_id = payload.get('project_id')
+    if not project_id:
         brand_name = payload.get('brand') or os.getenv('DEFAULT_BRAND', 'The Core School')
         conn = get_db_connection(); cur = conn.cursor()
         cur.execute("SELECT id FROM queries WHERE COALESCE(brand, topic) = %s ORDER BY id ASC LIMIT 1", (brand_name,))
         row = cur.fetchone(); cur.close(); conn.close()
-        project_id = int(row[0]) if row else 1
+        project_id = row[0] if row else 1
+    return {"project_id": int(project_id), "start_date": start.strftime('%Y-%m-%d'), "end_date": end.strftime('%Y-%m-%d')}
 
-        full_data = agg.get_full_report_data(
-            project_id,
-            start_date=filters.get('start_date').strftime('%Y-%m-%d'),
-            end_date=filters.get('end_date').strftime('%Y-%m-%d'),
-            max_rows=5000,
-        )
 
-        # 2) Generar PDF con cadena de agentes (incluye Parte 2: Plan de Acción)
-        from src.reports.generator import generate_report
-        pdf_bytes = generate_report(
-            project_id,
-            start_date=filters.get('start_date').strftime('%Y-%m-%d'),
-            end_date=filters.get('end_date').strftime('%Y-%m-%d'),
-        )
+def _report_job_json(job):
+    out = {k: v for k, v in job.items() if k != "params"}
+    out["params"] = job.get("params") or {}
+    out["status_url"] = f"/api/reports/jobs/{job['id']}"
+    if job.get("status") == "done":
+        out["download_url"] = f"/api/reports/jobs/{job['id']}/pdf"
+    return out
 
-        return send_file(
+
+def _enqueue_report(kind):
+    payload = request.get_json(silent=True) or {}
+    params = _report_job_params(payload, kind)
+    conn = get_db_connection(); cur = conn.cursor()
+    _ensure_report_jobs(cur)
+    job_id, merged = enqueue_report_job(cur, kind, params)
+    conn.commit()
+    job = get_report_job(cur, job_id)
+    cur.close(); conn.close()
+    _report_workers().notify()
+    body = _report_job_json(job)
+    body["merged"] = merged
+    resp = jsonify(body)
+    resp.status_code = 202
+    resp.headers["Location"] = body["status_url"]
+    return resp
+
+
+@app.route('/api/reports/jobs', methods=['POST'])
+def create_report_job():
+    """Encola un informe (``kind``: executive | v2) y responde 202 con el id del trabajo."""
+    try:
+        kind = ((request.get_json(silent=True) or {}).get('kind') or 'executive').lower()
+        if kind not in REPORT_KINDS:
+            return jsonify({"error": f"kind no válido: {kind}", "kinds": list(REPORT_KINDS)}), 400
+        return _enqueue_report(kind)
+    except Exception as e:
+        print(f"Error encolando el informe: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/reports/generate', methods=['POST'])
+def generate_report_endpoint():
+    """Informe ejecutivo con cadena de agentes: encola el trabajo (202) y se consulta en /api/reports/jobs/<id>."""
+    try:
+        return _enqueue_report("executive")
+    except Exception as e:
+        print(f"Error encolando el informe: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": "No se pudo encolar el informe. Revisa los logs del backend."}), 500
+
+
+def _read_report_job(job_id):
+    """Lee el trabajo con una conexión del pool que se devuelve enseguida."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        _ensure_report_jobs(cur)
+        job = get_report_job(cur, job_id)
+        conn.commit()
+        cur.close()
+        return job
+    finally:
+        conn.close()
+
+
+@app.route('/api/reports/jobs/<int:job_id>', methods=['GET'])
+def get_report_job_status(job_id):
+    """Estado, etapa y progreso del trabajo.
+
+    Long-poll: ``?wait=<s>`` espera (hasta REPORT_JOB_LONGPOLL_MAX_SECONDS) a que
+    cambie la etapa indicada en ``?stage=`` (por defecto la actual) o el trabajo termine.
+    """
+    try:
+        wait_s = min(max(float(request.args.get('wait', 0) or 0), 0.0), REPORT_JOB_LONGPOLL_MAX_SECONDS)
+        job = _read_report_job(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        if job["status"] in ACTIVE_STATUSES:
+            # Otro proceso pudo encolarlo o caerse: este también reclama trabajos
+            _report_workers()
+        seen_stage = request.args.get('stage') or job["stage"]
+        deadline = monotonic() + wait_s
+        while job["status"] not in FINAL_STATUSES and job["stage"] == seen_stage and monotonic() < deadline:
+            # La espera no retiene conexión: cada lectura saca una del pool y la devuelve
+            sleep(min(REPORT_JOB_POLL_SECONDS, max(deadline - monotonic(), 0)))
+            job = _read_report_job(job_id) or job
+        return jsonify(_report_job_json(job))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/reports/jobs/<int:job_id>/pdf', methods=['GET'])
+def download_report_job(job_id):
+    try:
+        conn = get_db_connection(); cur = conn.cursor()
+        _ensure_report_jobs(cur)
+        job = get_report_job(cur, job_id)
+        if not job:
+            cur.close(); conn.close()
+            return jsonify({"error": "Job not found"}), 404
+        if job["status"] != "done":
+            cur.close(); conn.close()
+            return jsonify({"error": "El informe aún no está listo", "status": job["status"], "stage": job["stage"]}), 409
+        pdf_bytes = get_artifact_store().get(cur, job["artifact_hash"])
+        cur.close(); conn.close()
+        if pdf_bytes is None:
+            return jsonify({"error": "Artefacto no encontrado"}), 410
+        created = (job.get("finished_at") or datetime.now().isoformat())[:10]
+        resp = send_file(
             io.BytesIO(pdf_bytes),
             as_attachment=True,
-            download_name=f"Informe_Ejecutivo_{datetime.now().strftime('%Y-%m-%d')}.pdf",
+            download_name=f"{REPORT_KINDS.get(job['kind'], 'Informe')}_{created}.pdf",
             mimetype='application/pdf'
         )
+        resp.headers["ETag"] = job["artifact_hash"]
+        return resp
     except Exception as e:
-        print(f"Error generando el informe: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": "No se pudo generar el informe. Revisa los logs del backend."}), 500
+        return jsonify({"error": str(e)}), 500
 
 
 @app.route('/api/reports/generate/skeleton', methods=['POST'])
@@ -4514,15 +4669,7 @@ def generate_report_skeleton_endpoint():
 @app.route('/api/reports/generate/v2', methods=['POST'])
 def generate_report_endpoint_v2():
     try:
-        payload = request.get_json() or {}
-        project_id = int(payload.get('project_id') or 1)
-        pdf_bytes = generate_report_v2(project_id)
-        return send_file(
-            io.BytesIO(pdf_bytes),
-            as_attachment=True,
-            download_name=f"Informe_Geocore_{datetime.now().strftime('%Y-%m-%d')}.pdf",
-            mimetype='application/pdf'
-        )
+        return _enqueue_report("v2")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,31 @@
+import os
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+DB_CFG = dict(
+    host=os.getenv("POSTGRES_HOST", os.getenv("DB_HOST", "localhost")),
+    port=int(os.getenv("POSTGRES_PORT", os.getenv("DB_PORT", 5433))),
+    database=os.getenv("POSTGRES_DB", os.getenv("DB_NAME", "ai_visibility")),
+    user=os.getenv("POSTGRES_USER", os.getenv("DB_USER", "postgres")),
+    password=os.getenv("POSTGRES_PASSWORD", os.getenv("DB_PASSWORD", "postgres")),
+)
+
+def run():
+    conn = psycopg2.connect(**DB_CFG)
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = conn.cursor()
+    print("🧩 Índice para la paginación por cursor de /api/mentions...")
+
+    # Orden de /api/mentions: (created_at DESC, id DESC); el cursor es la última pareja servida
+    cur.execute("""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mentions_created_at_id
+        ON mentions (created_at DESC, id DESC);
+    """)
+
+    cur.close()
+    conn.close()
+    print("✅ Índice idx_mentions_created_at_id creado.")
+
+if __name__ == "__main__":
+    run()
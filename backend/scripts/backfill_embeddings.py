@@ -1,7 +1,6 @@
 import os
 import sys
 import math
-import time
 import logging
 from typing import List, Tuple
 
@@ -11,6 +10,13 @@ from dotenv import load_dotenv
 
 # Reutilizamos el cliente OpenAI ya configurado en src/engines/openai_engine.py
 from src.engines.openai_engine import client as openai_client
+from src.engines.rate_limit import call_with_retry, estimate_tokens
+from src.engines.embedding_store import (
+    embed_with_cache,
+    embedding_cache_stats,
+    ensure_embedding_cache_table,
+    to_vector_literal,
+)
 
 
 load_dotenv()
@@ -51,27 +57,19 @@ def fetch_missing_mentions(cur, limit: int) -> List[Tuple[int, str]]:
 
 
 def get_embeddings(texts: List[str]) -> List[List[float]]:
-    # OpenAI embeddings API requiere inputs como lista de strings
-    attempt = 0
-    while True:
-        try:
-            res = openai_client.embeddings.create(model=EMBEDDING_MODEL, input=texts, timeout=REQUEST_TIMEOUT)
-            vectors = [item.embedding for item in res.data]
-            return vectors
-        except Exception as exc:
-            attempt += 1
-            if attempt > MAX_RETRIES:
-                raise
-            sleep_s = min(2 ** attempt, 10)
-            logging.warning("⚠️ Error en embeddings (%s). Reintentando en %ss (intento %s/%s)", exc, sleep_s, attempt, MAX_RETRIES)
-            time.sleep(sleep_s)
-
-
-def update_batch_embeddings(cur, ids: List[int], vectors: List[List[float]]):
-    # Convertimos a literal de vector de pgvector: "[v1,v2,...]"
-    def to_vector_literal(vec: List[float]) -> str:
-        return "[" + ",".join(f"{float(x):.8f}" for x in vec) + "]"
+    # OpenAI embeddings API requiere inputs como lista de strings.
+    # Reintentos (429/5xx/timeouts) y presupuesto RPM/TPM compartidos con el resto de motores.
+    res = call_with_retry(
+        "openai",
+        lambda: openai_client.embeddings.create(model=EMBEDDING_MODEL, input=texts, timeout=REQUEST_TIMEOUT),
+        est_tokens=estimate_tokens(*texts),
+        max_retries=MAX_RETRIES,
+    )
+    return [item.embedding for item in res.data]
 
+
+def update_batch_embeddings(cur, ids: List[int], vectors: List):
+    # Literal de vector de pgvector: "[v1,v2,...]" (los que vienen de embedding_cache ya lo son)
     rows = [(idx, to_vector_literal(vec)) for idx, vec in zip(ids, vectors)]
 
     execute_values(
@@ -100,6 +98,8 @@ def main():
     with psycopg2.connect(**DB_CFG) as conn:
         with conn.cursor() as cur:
             # No se requiere función auxiliar; usamos literales ::vector
+            ensure_embedding_cache_table(cur)
+            conn.commit()
 
             total_processed = 0
             batch_index = 0
@@ -113,8 +113,9 @@ def main():
                 # Evitar None o strings vacíos: si vacío, usamos un placeholder mínimo
                 texts = [t if isinstance(t, str) and t.strip() != "" else "(sin resumen)" for t in texts]
 
-                vectors = get_embeddings(texts)
-                if not vectors or len(vectors) != len(ids):
+                # Solo los resúmenes que no estén ya en embedding_cache van a la API
+                vectors = embed_with_cache(cur, texts, get_embeddings, EMBEDDING_MODEL)
+                if not vectors or len(vectors) != len(ids) or any(v is None for v in vectors):
                     raise RuntimeError("La longitud de embeddings no coincide con ids")
 
                 update_batch_embeddings(cur, ids, vectors)
@@ -123,7 +124,12 @@ def main():
                 total_processed += len(ids)
                 logging.info("Procesado lote %s | filas=%s | total=%s", batch_index, len(ids), total_processed)
 
+    stats = embedding_cache_stats()
     logging.info("✅ Backfill completado. Total de menciones actualizadas: %s", total_processed)
+    logging.info(
+        "🧮 Caché de embeddings: %s aciertos en BD + %s duplicados de %s textos (hit rate %.1f%%), %s enviados a la API",
+        stats["hits"], stats["deduplicated"], stats["lookups"], stats["hit_rate"] * 100, stats["embedded"],
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+import os
+import sys
+import logging
+import argparse
+from typing import List
+
+import psycopg2
+from dotenv import load_dotenv
+
+from src.brands.store import ensure_mention_brands_table, index_mentions, mention_brand_stats
+from src.reports.rollups import ensure_rollup_tables, refresh_rollup_days, rollups_ready
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+
+
+DB_CFG = {
+    "host": os.getenv("POSTGRES_HOST", "localhost"),
+    "port": int(os.getenv("POSTGRES_PORT", 5433)),
+    "database": os.getenv("POSTGRES_DB", "ai_visibility"),
+    "user": os.getenv("POSTGRES_USER", "postgres"),
+    "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+}
+
+BATCH_SIZE = int(os.getenv("BRAND_BACKFILL_BATCH_SIZE", 1000))
+
+
+def fetch_batch(cur, after_id: int, limit: int, reindex: bool) -> List[tuple]:
+    # Con --all se recorren todas las menciones (p.ej. tras cambiar BRAND_SYNONYMS)
+    pending = "" if reindex else "AND m.brands_detected_at IS NULL"
+    cur.execute(
+        f"""
+        SELECT m.id, m.key_topics, m.response, m.source_title, i.payload, DATE(m.created_at)
+        FROM mentions m
+        LEFT JOIN insights i ON i.id = m.generated_insight_id
+        WHERE m.id > %s {pending}
+        ORDER BY m.id ASC
+        LIMIT %s
+        """,
+        (after_id, limit),
+    )
+    return cur.fetchall()
+
+
+def main(reindex: bool = False, batch_size: int = BATCH_SIZE):
+    logging.info("🚀 Iniciando backfill de mention_brands (batch=%s, reindex=%s)", batch_size, reindex)
+    total_mentions = 0
+    total_rows = 0
+    with psycopg2.connect(**DB_CFG) as conn:
+        with conn.cursor() as cur:
+            ensure_mention_brands_table(cur)
+            ensure_rollup_tables(cur)
+            conn.commit()
+            # Si el rollup ya está construido, los días tocados se recalculan al final
+            refresh_rollups = rollups_ready(cur)
+            touched_days = set()
+
+            last_id = 0
+            while True:
+                records = fetch_batch(cur, last_id, batch_size, reindex)
+                if not records:
+                    break
+                total_rows += index_mentions(cur, [r[:5] for r in records])
+                touched_days.update(r[5] for r in records if r[5] is not None)
+                conn.commit()
+                last_id = records[-1][0]
+                total_mentions += len(records)
+                logging.info("Procesado hasta id=%s | menciones=%s | marcas=%s", last_id, total_mentions, total_rows)
+
+            if refresh_rollups and touched_days:
+                days = refresh_rollup_days(cur, touched_days)
+                conn.commit()
+                logging.info("📊 Rollup diario recalculado para %s días", days)
+
+            stats = mention_brand_stats(cur)
+
+    logging.info("✅ Backfill completado: %s menciones, %s filas en mention_brands", total_mentions, total_rows)
+    logging.info("🧮 Menciones indexadas=%s, pendientes=%s", stats["indexed"], stats["pending"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rellena mention_brands para menciones existentes")
+    parser.add_argument("--all", action="store_true", help="Reindexar todas las menciones, no solo las pendientes")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="Menciones por lote")
+    args = parser.parse_args()
+    try:
+        main(reindex=args.all, batch_size=args.batch)
+    except KeyboardInterrupt:
+        logging.info("Interrumpido por el usuario")
+        sys.exit(130)
+    except Exception as exc:
+        logging.exception("❌ Error en backfill: %s", exc)
+        sys.exit(1)
@@ -0,0 +1,81 @@
+import os
+import sys
+import logging
+import argparse
+from datetime import date, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+
+from scripts.backfill_mention_brands import main as backfill_mention_brands
+from src.reports.rollups import ensure_rollup_tables, mark_rollups_built, refresh_rollup_days
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+
+
+DB_CFG = {
+    "host": os.getenv("POSTGRES_HOST", "localhost"),
+    "port": int(os.getenv("POSTGRES_PORT", 5433)),
+    "database": os.getenv("POSTGRES_DB", "ai_visibility"),
+    "user": os.getenv("POSTGRES_USER", "postgres"),
+    "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+}
+
+
+def _day_range(cur, start: str | None, end: str | None):
+    cur.execute("SELECT MIN(created_at)::date, MAX(created_at)::date FROM mentions")
+    first, last = cur.fetchone()
+    first = date.fromisoformat(start) if start else first
+    last = date.fromisoformat(end) if end else last
+    if not first or not last:
+        return []
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def main(start: str | None = None, end: str | None = None, skip_brands: bool = False):
+    # El rollup se alimenta de mention_brands: primero indexar las menciones pendientes
+    if not skip_brands:
+        backfill_mention_brands()
+
+    with psycopg2.connect(**DB_CFG) as conn:
+        with conn.cursor() as cur:
+            ensure_rollup_tables(cur)
+            conn.commit()
+            days = _day_range(cur, start, end)
+            if not start and not end:
+                # Reconstrucción completa: fuera del rango de menciones no debe quedar nada
+                cur.execute("DELETE FROM mention_daily_rollup WHERE NOT (day = ANY(%s))", (days,))
+            logging.info("🚀 Reconstruyendo mention_daily_rollup para %s días", len(days))
+            for i, day in enumerate(days, start=1):
+                refresh_rollup_days(cur, [day])
+                conn.commit()
+                if i % 30 == 0 or i == len(days):
+                    logging.info("Procesado %s (%s/%s)", day, i, len(days))
+            # Solo una reconstrucción completa habilita el rollup en los endpoints
+            if not start and not end:
+                mark_rollups_built(cur)
+                conn.commit()
+
+    logging.info("✅ Rollup diario reconstruido")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye los rollups diarios de menciones")
+    parser.add_argument("--start", help="Primer día (YYYY-MM-DD); por defecto, la primera mención")
+    parser.add_argument("--end", help="Último día (YYYY-MM-DD); por defecto, la última mención")
+    parser.add_argument("--skip-brands", action="store_true", help="No indexar antes las menciones sin marcas")
+    args = parser.parse_args()
+    try:
+        main(start=args.start, end=args.end, skip_brands=args.skip_brands)
+    except KeyboardInterrupt:
+        logging.info("Interrumpido por el usuario")
+        sys.exit(130)
+    except Exception as exc:
+        logging.exception("❌ Error reconstruyendo rollups: %s", exc)
+        sys.exit(1)
@@ -0,0 +1,69 @@
+import os
+import sys
+import logging
+import argparse
+
+import psycopg2
+from dotenv import load_dotenv
+
+from src.reports.clustering import (
+    assign_pending_mentions, ensure_cluster_tables, fit_project_clusters, projects_needing_refit,
+)
+
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(message)s",
+)
+
+
+DB_CFG = {
+    "host": os.getenv("POSTGRES_HOST", "localhost"),
+    "port": int(os.getenv("POSTGRES_PORT", 5433)),
+    "database": os.getenv("POSTGRES_DB", "ai_visibility"),
+    "user": os.getenv("POSTGRES_USER", "postgres"),
+    "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+}
+
+
+def main(project_ids: list[int] | None = None, force: bool = False):
+    with psycopg2.connect(**DB_CFG) as conn:
+        with conn.cursor() as cur:
+            ensure_cluster_tables(cur)
+            conn.commit()
+            if not project_ids:
+                if force:
+                    cur.execute("SELECT DISTINCT query_id FROM mentions WHERE embedding IS NOT NULL AND query_id IS NOT NULL")
+                    project_ids = sorted(int(r[0]) for r in cur.fetchall())
+                else:
+                    project_ids = projects_needing_refit(cur)
+            logging.info("🚀 Reajustando clusters de %s proyectos", len(project_ids))
+            for pid in project_ids:
+                model = fit_project_clusters(cur, pid)
+                conn.commit()
+                if model is None:
+                    logging.info("Proyecto %s: sin embeddings suficientes", pid)
+            # Menciones escritas durante el ajuste o con embeddings rellenados después
+            pending = assign_pending_mentions(cur)
+            conn.commit()
+            logging.info("Menciones pendientes asignadas: %s", pending)
+
+    logging.info("✅ Clusters reajustados")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reajusta los centroides persistidos de clusters por proyecto")
+    parser.add_argument("--project", type=int, action="append", help="Proyecto (queries.id); repetible")
+    parser.add_argument("--force", action="store_true",
+                        help="Reajustar todos los proyectos aunque no tengan deriva ni ajuste caducado")
+    args = parser.parse_args()
+    try:
+        main(project_ids=args.project, force=args.force)
+    except KeyboardInterrupt:
+        logging.info("Interrumpido por el usuario")
+        sys.exit(130)
+    except Exception as exc:
+        logging.exception("❌ Error reajustando clusters: %s", exc)
+        sys.exit(1)
@@ -0,0 +1,65 @@
+"""
+Diccionario canónico de marcas y detección de menciones de marca.
+
+Una mención "menciona" una marca si alguno de sus sinónimos aparece en:
+
+    • key_topics        → igualdad o substring de un tema
+    • payload.brands    → igualdad o substring de una marca extraída en el insight
+    • response / title  → substring del texto (en minúsculas)
+
+Es la misma regla que usaban los endpoints en cada petición, evaluada con un
+único ``BrandMatcher`` compilado (ver ``src/brands/matcher.py``); se aplica una
+vez al ingerir (ver ``src/brands/store.py``) y el resultado queda en
+``mention_brands`` con el origen de cada coincidencia.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.brands.matcher import BrandMatcher
+
+BRAND_SYNONYMS: Dict[str, List[str]] = {
+    "The Core School": ["the core", "the core school", "thecore"],
+    "U-TAD": ["u-tad", "utad"],
+    "ECAM": ["ecam"],
+    "TAI": ["tai"],
+    "CES": ["ces"],
+    "CEV": ["cev"],
+    "FX Barcelona Film School": ["fx barcelona", "fx barcelona film school", "fx animation"],
+    "Septima Ars": ["septima ars", "séptima ars"],
+}
+
+# Orígenes posibles de una coincidencia (columna mention_brands.source)
+BRAND_SOURCES = ("key_topics", "payload", "response", "title")
+
+
+def brand_synonyms(brand: str) -> List[str]:
+    """Sinónimos en minúsculas de ``brand`` (el propio nombre si no está en el diccionario)."""
+    alts = BRAND_SYNONYMS.get(brand)
+    if alts is None:
+        return [brand.lower()]
+    return list(dict.fromkeys([brand.lower()] + [a.lower() for a in alts]))
+
+
+_MATCHER: Optional[BrandMatcher] = None
+_LOCK = threading.Lock()
+
+
+def get_brand_matcher() -> BrandMatcher:
+    """Matcher de ``BRAND_SYNONYMS`` (se compila una vez por proceso)."""
+    global _MATCHER
+    if _MATCHER is None:
+        with _LOCK:
+            if _MATCHER is None:
+                _MATCHER = BrandMatcher(BRAND_SYNONYMS)
+    return _MATCHER
+
+
+def detect_brand_sources(topics_list: Any, resp_text: Any, title_text: Any, payload: Any = None) -> List[Tuple[str, str]]:
+    """Pares (marca canónica, origen) detectados en una mención."""
+    return get_brand_matcher().sources(topics_list, resp_text, title_text, payload)
+
+
+def detect_brands(topics_list: Any, resp_text: Any, title_text: Any, payload: Any = None) -> List[str]:
+    """Marcas canónicas detectadas (sin repetir, en el orden del diccionario)."""
+    return get_brand_matcher().detect(topics_list, resp_text, title_text, payload)
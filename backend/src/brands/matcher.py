@@ -0,0 +1,125 @@
+"""
+Motor único de detección de marcas.
+
+``BrandMatcher`` compila todos los sinónimos del diccionario en UNA expresión
+regular (alternancia ordenada de más largo a más corto dentro de un lookahead),
+de modo que cada texto se recorre una sola vez, en lugar de buscar cada sinónimo
+de cada marca por separado. La instancia del diccionario canónico se construye una vez por proceso
+(``src.brands.detection.get_brand_matcher``) y la comparten la API, el agregador
+de informes y el polling.
+
+    • find(text)            → marcas canónicas presentes en un texto
+    • find_many(texts)      → versión por lotes
+    • sources(...)          → pares (marca, origen) de una mención
+    • detect_many(rows)     → marcas por mención para un lote de filas
+
+Con ``word_boundary=False`` (por defecto) un sinónimo cuenta como substring, la
+regla histórica de los endpoints; con ``True`` solo cuenta como palabra completa.
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Separador al unir listas (key_topics, payload.brands): ningún sinónimo lo contiene
+_JOIN = "\n"
+
+
+def _lower_items(xs: Any) -> List[str]:
+    if isinstance(xs, str):
+        try:
+            xs = json.loads(xs)
+        except Exception:
+            xs = [xs]
+    if not isinstance(xs, (list, tuple)):
+        return []
+    out = []
+    for t in xs:
+        s = str(t or '').lower().strip()
+        if s:
+            out.append(s)
+    return out
+
+
+def payload_brand_names(payload: Any) -> List[str]:
+    """Nombres en minúsculas de ``payload.brands`` (strings u objetos ``{"name": ...}``)."""
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except Exception:
+            return []
+    if not isinstance(payload, dict):
+        return []
+    raw = payload.get('brands') or []
+    if not isinstance(raw, list):
+        return []
+    return _lower_items([b.get('name') if isinstance(b, dict) else b for b in raw])
+
+
+class BrandMatcher:
+    def __init__(self, synonyms: Dict[str, Sequence[str]], word_boundary: bool = False):
+        self.brands: List[str] = list(synonyms)
+        self._order = {b: i for i, b in enumerate(self.brands)}
+        # Sinónimo (minúsculas) → marcas canónicas; el nombre canónico cuenta como sinónimo
+        self._canon_of: Dict[str, List[str]] = {}
+        for canon, alts in synonyms.items():
+            for alt in [canon, *alts]:
+                key = (alt or '').lower().strip()
+                if key and canon not in self._canon_of.setdefault(key, []):
+                    self._canon_of[key].append(canon)
+        alternation = "|".join(re.escape(a) for a in sorted(self._canon_of, key=len, reverse=True))
+        if word_boundary:
+            alternation = rf"(?<!\w)(?:{alternation})(?!\w)"
+        # Dentro de un lookahead cada posición se evalúa aunque caiga dentro de una coincidencia
+        # anterior, así no se pierden sinónimos solapados de otras marcas
+        self._regex = re.compile(rf"(?=({alternation}))") if self._canon_of else None
+
+    def _sorted(self, found: Iterable[str]) -> List[str]:
+        return sorted(set(found), key=self._order.__getitem__)
+
+    def find(self, text: Optional[str]) -> List[str]:
+        """Marcas canónicas presentes en ``text`` (en el orden del diccionario)."""
+        if not text or self._regex is None:
+            return []
+        found: Set[str] = set()
+        for m in self._regex.finditer(text.lower()):
+            found.update(self._canon_of[m.group(1)])
+        return self._sorted(found)
+
+    def find_many(self, texts: Iterable[Optional[str]]) -> List[List[str]]:
+        return [self.find(t) for t in texts]
+
+    def find_in_items(self, items: Any) -> List[str]:
+        """Marcas en una lista de términos (igualdad o substring de algún término)."""
+        return self.find(_JOIN.join(_lower_items(items)))
+
+    def contains(self, text: Optional[str], brand: str) -> bool:
+        return brand in self.find(text)
+
+    def sources(self, topics_list: Any, resp_text: Any, title_text: Any, payload: Any = None) -> List[Tuple[str, str]]:
+        """Pares (marca canónica, origen) de una mención: key_topics, payload, response, title."""
+        found: List[Tuple[str, str]] = []
+        per_source = (
+            ("key_topics", self.find_in_items(topics_list)),
+            ("payload", self.find(_JOIN.join(payload_brand_names(payload)))),
+            ("response", self.find(str(resp_text or ''))),
+            ("title", self.find(str(title_text or ''))),
+        )
+        for source, brands in per_source:
+            found.extend((b, source) for b in brands)
+        found.sort(key=lambda p: self._order[p[0]])
+        return found
+
+    def detect(self, topics_list: Any, resp_text: Any, title_text: Any, payload: Any = None) -> List[str]:
+        return self._sorted(b for b, _ in self.sources(topics_list, resp_text, title_text, payload))
+
+    def detect_many(self, rows: Iterable[Sequence[Any]]) -> List[List[str]]:
+        """Marcas por fila para filas ``(key_topics, response, title[, payload])``."""
+        return [self.detect(*row) for row in rows]
+
+
+@lru_cache(maxsize=128)
+def matcher_for(brands: Tuple[str, ...], word_boundary: bool = True) -> BrandMatcher:
+    """Matcher para una lista ad hoc de marcas (cada marca es su propio sinónimo)."""
+    return BrandMatcher({b: [] for b in brands if b and b.strip()}, word_boundary=word_boundary)
@@ -0,0 +1,207 @@
+"""
+Tabla ``mention_brands``: marcas detectadas por mención, calculadas al ingerir.
+
+    • ensure_mention_brands_table() → DDL idempotente (tabla, índices y
+      ``mentions.brands_detected_at``, que marca las menciones ya indexadas)
+    • index_mentions()              → detecta y guarda las marcas de un lote
+    • brand_filter()                → predicado SQL "la mención cita la marca"
+    • stored_brands_sql()           → columna con las marcas precalculadas
+    • count_mention_brands()        → menciones por marca (y grupo) agregadas en SQL
+
+Las marcas fuera de ``BRAND_SYNONYMS`` no se indexan; para ellas
+``brand_filter`` conserva el predicado LIKE original sobre el texto, que también
+cubre las menciones aún sin indexar (``brands_detected_at IS NULL``).
+"""
+
+import logging
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from src.brands.detection import BRAND_SYNONYMS, brand_synonyms, detect_brand_sources, get_brand_matcher
+
+logger = logging.getLogger(__name__)
+
+# Filas por lote al detectar marcas de menciones aún sin indexar
+PENDING_BATCH_SIZE = int(os.getenv("BRAND_PENDING_BATCH_SIZE", "2000"))
+
+# (mention_id, key_topics, response, source_title, insight_payload)
+MentionRow = Tuple[int, Any, Optional[str], Optional[str], Any]
+
+# Misma regla que ``BrandMatcher``: un sinónimo cuenta si es substring de cualquier
+# término de key_topics, de payload.brands, de la respuesta o del título
+_LEGACY_BRAND_SQL = """(
+    EXISTS (
+        SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb({m}.key_topics),'[]'::jsonb)) kt
+        WHERE LOWER(kt) LIKE ANY({likes})
+    )
+    OR LOWER(COALESCE({m}.response,'')) LIKE ANY({likes})
+    OR LOWER(COALESCE({m}.source_title,'')) LIKE ANY({likes})
+    OR EXISTS (
+        SELECT 1 FROM jsonb_array_elements(COALESCE({i}.payload->'brands','[]'::jsonb)) b
+        WHERE LOWER(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END) LIKE ANY({likes})
+    )
+)"""
+
+
+def ensure_mention_brands_table(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mention_brands (
+            mention_id INT NOT NULL REFERENCES mentions(id) ON DELETE CASCADE,
+            brand TEXT NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (mention_id, brand, source)
+        );
+        CREATE INDEX IF NOT EXISTS idx_mention_brands_brand ON mention_brands (brand, mention_id);
+        ALTER TABLE mentions ADD COLUMN IF NOT EXISTS brands_detected_at TIMESTAMPTZ;
+        CREATE INDEX IF NOT EXISTS idx_mentions_brands_pending ON mentions (id) WHERE brands_detected_at IS NULL;
+        """
+    )
+
+
+def index_mentions(cur, rows: Iterable[MentionRow]) -> int:
+    """Detecta y guarda las marcas de cada mención (reemplaza lo anterior). Devuelve filas escritas.
+
+    El commit lo hace quien llama; todas las menciones quedan marcadas con
+    ``brands_detected_at`` aunque no citen ninguna marca.
+    """
+    ids: List[int] = []
+    values: List[Tuple[int, str, str]] = []
+    for mention_id, key_topics, response, title, payload in rows:
+        ids.append(mention_id)
+        values.extend((mention_id, brand, source) for brand, source in detect_brand_sources(key_topics, response, title, payload))
+    if not ids:
+        return 0
+    cur.execute("DELETE FROM mention_brands WHERE mention_id = ANY(%s)", (ids,))
+    if values:
+        execute_values(
+            cur,
+            "INSERT INTO mention_brands (mention_id, brand, source) VALUES %s ON CONFLICT DO NOTHING",
+            values,
+            page_size=1000,
+        )
+    cur.execute("UPDATE mentions SET brands_detected_at = NOW() WHERE id = ANY(%s)", (ids,))
+    return len(values)
+
+
+def brand_filter(brand: str, alias: str = "m", insight_alias: str = "i",
+                 named: bool = False) -> Tuple[str, Any]:
+    """Predicado SQL (y sus parámetros) que indica si la mención ``alias`` cita ``brand``.
+
+    Con ``named=True`` usa parámetros ``:brand_*`` (SQLAlchemy ``text``) y
+    devuelve un dict; si no, ``%s`` y una lista en orden. El predicado legacy
+    (marcas sin diccionario y menciones sin indexar) necesita el JOIN a
+    ``insights`` como ``insight_alias``.
+    """
+    likes = [f"%{s}%" for s in brand_synonyms(brand)]
+    if named:
+        legacy_sql = _LEGACY_BRAND_SQL.format(m=alias, i=insight_alias, likes=":brand_likes")
+        legacy_params: Any = {"brand_likes": likes}
+    else:
+        legacy_sql = _LEGACY_BRAND_SQL.format(m=alias, i=insight_alias, likes="%s")
+        legacy_params = [likes, likes, likes, likes]
+    if brand not in BRAND_SYNONYMS:
+        return legacy_sql, legacy_params
+    # Indexadas → mention_brands; pendientes (histórico o SAVEPOINT del writer deshecho) → predicado legacy
+    placeholder = ":brand_name" if named else "%s"
+    sql = (
+        f"(({alias}.brands_detected_at IS NOT NULL AND EXISTS (SELECT 1 FROM mention_brands mb "
+        f"WHERE mb.mention_id = {alias}.id AND mb.brand = {placeholder})) "
+        f"OR ({alias}.brands_detected_at IS NULL AND {legacy_sql}))"
+    )
+    if named:
+        return sql, {"brand_name": brand, **legacy_params}
+    return sql, [brand] + legacy_params
+
+
+def stored_brands_sql(alias: str = "m", sources: Optional[Sequence[str]] = None) -> str:
+    """Columna con las marcas precalculadas de la mención (NULL si aún no está indexada).
+
+    ``sources`` restringe los orígenes, p.ej. ``("key_topics", "response", "title")``
+    para replicar detecciones que ignoraban ``payload.brands``.
+    """
+    where_source = ""
+    if sources:
+        where_source = " AND mb.source IN (" + ", ".join(f"'{s}'" for s in sources) + ")"
+    return (
+        f"CASE WHEN {alias}.brands_detected_at IS NOT NULL THEN ARRAY("
+        f"SELECT DISTINCT mb.brand FROM mention_brands mb WHERE mb.mention_id = {alias}.id{where_source}) END"
+    )
+
+
+def pending_text_sql(column: str, alias: str = "m") -> str:
+    """``LOWER(column)`` solo para menciones sin indexar (evita traer el texto completo)."""
+    return f"CASE WHEN {alias}.brands_detected_at IS NULL THEN LOWER(COALESCE({alias}.{column},'')) END"
+
+
+def mention_brand_stats(cur) -> Dict[str, int]:
+    cur.execute(
+        """
+        SELECT COUNT(*) FILTER (WHERE brands_detected_at IS NOT NULL),
+               COUNT(*) FILTER (WHERE brands_detected_at IS NULL)
+        FROM mentions
+        """
+    )
+    indexed, pending = cur.fetchone()
+    return {"indexed": int(indexed or 0), "pending": int(pending or 0)}
+
+
+def count_mention_brands(cur, where_sql: str, params: Sequence[Any] = (),
+                         group_sql: Optional[str] = None) -> Counter:
+    """Menciones distintas por marca sobre ``mentions m JOIN queries q``.
+
+    Las menciones indexadas se cuentan en SQL sobre ``mention_brands`` (solo
+    vuelven filas agregadas). Las pendientes (``brands_detected_at IS NULL``)
+    se leen con un cursor de servidor por lotes y se detectan en caliente con
+    el matcher compartido, así la memoria no depende del tamaño de la ventana.
+
+    Devuelve ``Counter`` con claves ``marca`` o ``(grupo, marca)`` si se pasa
+    ``group_sql`` (p.ej. ``"q.topic"``).
+    """
+    group_col = f"{group_sql} AS grp, " if group_sql else ""
+    group_by = "grp, " if group_sql else ""
+    params = tuple(params)
+    counts: Counter = Counter()
+
+    cur.execute(
+        f"""
+        SELECT {group_col}mb.brand, COUNT(DISTINCT m.id)
+        FROM mentions m
+        JOIN queries q ON q.id = m.query_id
+        JOIN mention_brands mb ON mb.mention_id = m.id
+        WHERE ({where_sql}) AND m.brands_detected_at IS NOT NULL
+        GROUP BY {group_by}mb.brand
+        """,
+        params,
+    )
+    for row in cur.fetchall():
+        *grp, brand, n = row
+        counts[(grp[0], brand) if group_sql else brand] += int(n or 0)
+
+    matcher = get_brand_matcher()
+    with cur.connection.cursor(name="pending_brand_counts") as pending:
+        pending.itersize = PENDING_BATCH_SIZE
+        pending.execute(
+            f"""
+            SELECT {group_col}m.key_topics, LOWER(COALESCE(m.response,'')),
+                   LOWER(COALESCE(m.source_title,'')), i.payload
+            FROM mentions m
+            JOIN queries q ON q.id = m.query_id
+            LEFT JOIN insights i ON i.id = m.generated_insight_id
+            WHERE ({where_sql}) AND m.brands_detected_at IS NULL
+            """,
+            params,
+        )
+        while True:
+            batch = pending.fetchmany(PENDING_BATCH_SIZE)
+            if not batch:
+                break
+            groups = [r[0] for r in batch] if group_sql else None
+            detected = matcher.detect_many(tuple(r[-4:]) for r in batch)
+            for idx, brands in enumerate(detected):
+                for brand in set(brands):
+                    counts[(groups[idx], brand) if group_sql else brand] += 1
+    return counts
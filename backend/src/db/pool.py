@@ -0,0 +1,146 @@
+"""
+Pool de conexiones psycopg2 compartido por el proceso (API Flask y helpers).
+
+``ThreadedConnectionPool`` no espera cuando se agota (lanza PoolError), así que
+el checkout va detrás de un semáforo con timeout: bajo carga las peticiones
+esperan un hueco en lugar de abrir conexiones nuevas hasta agotar los slots de
+Postgres. ``get_connection()`` devuelve un proxy cuyo ``close()`` devuelve la
+conexión al pool (con rollback de lo no confirmado), de modo que el código que
+ya hacía ``conn.close()`` sigue funcionando sin cambios.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No hubo conexión libre en ``DB_POOL_TIMEOUT`` segundos."""
+
+
+class ConnectionPool:
+    def __init__(self, db_config: Dict[str, Any], minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 timeout: float = DB_POOL_TIMEOUT):
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+        self._pool = ThreadedConnectionPool(min(minconn, self.maxconn), self.maxconn, **db_config)
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self._stats = {"checkouts": 0, "in_use": 0, "max_in_use": 0, "waits": 0,
+                       "wait_ms_total": 0.0, "timeouts": 0, "discarded": 0}
+
+    def getconn(self) -> "PooledConnection":
+        start = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeout(f"Sin conexiones libres en el pool tras {self.timeout}s (max={self.maxconn})")
+        try:
+            conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["max_in_use"] = max(self._stats["max_in_use"], self._stats["in_use"])
+            self._stats["wait_ms_total"] += (time.perf_counter() - start) * 1000
+        return PooledConnection(self, conn)
+
+    def putconn(self, conn) -> None:
+        try:
+            broken = bool(conn.closed)
+            if not broken and conn.autocommit:
+                conn.autocommit = False
+            # El pool hace rollback de transacciones abiertas al devolverla
+            self._pool.putconn(conn, close=broken)
+            if broken:
+                with self._lock:
+                    self._stats["discarded"] += 1
+        except Exception as exc:
+            logger.warning("⚠️ Error devolviendo conexión al pool: %s", exc)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["max_size"] = self.maxconn
+        stats["open"] = len(self._pool._used) + len(self._pool._pool)  # conexiones físicas abiertas
+        stats["idle"] = len(self._pool._pool)
+        stats["avg_wait_ms"] = round(stats.pop("wait_ms_total") / stats["checkouts"], 3) if stats["checkouts"] else 0.0
+        return stats
+
+    def closeall(self) -> None:
+        self._pool.closeall()
+
+
+class PooledConnection:
+    """Proxy de una conexión del pool: ``close()`` la devuelve en lugar de cerrarla."""
+
+    def __init__(self, pool: ConnectionPool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return 1 if self._returned else self._conn.closed
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self) -> None:
+        if not self._returned:
+            self._returned = True
+            self._pool.putconn(self._conn)
+
+    # Mismo comportamiento que psycopg2: ``with conn`` confirma o deshace, no cierra
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool(db_config: Dict[str, Any]) -> ConnectionPool:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(db_config)
+                logger.info("🔌 Pool de conexiones creado (max=%s, timeout=%ss)", _POOL.maxconn, _POOL.timeout)
+    return _POOL
+
+
+def get_connection(db_config: Dict[str, Any]) -> PooledConnection:
+    return get_pool(db_config).getconn()
+
+
+def pool_stats() -> Dict[str, Any]:
+    return _POOL.stats() if _POOL is not None else {"max_size": DB_POOL_MAX, "open": 0, "in_use": 0}
@@ -0,0 +1,154 @@
+"""
+Lectura binaria de columnas pgvector.
+
+``fetch_vector_matrix`` trae ``(id, embedding)`` con
+``COPY (...) TO STDOUT (FORMAT binary)`` y lo convierte en una única matriz
+float32 de NumPy sin pasar por texto: en el formato binario de pgvector cada
+vector es ``int16 dim, int16 unused, dim × float4`` (big-endian).
+
+Como todas las filas tienen la misma longitud (mismo tipo de id y misma
+dimensión), la copia entera se interpreta con un dtype estructurado de un solo
+golpe; si no (dimensiones mezcladas, NULLs) se recorre tupla a tupla. Si la
+conexión no admite COPY, ``fetch_vector_matrix`` recurre a ``embedding::text``.
+"""
+
+import io
+import logging
+import struct
+from typing import Any, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PGCOPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_HEADER_LEN = len(PGCOPY_SIGNATURE) + 8  # firma + flags + longitud de la extensión
+_INT_DTYPES = {2: ">i2", 4: ">i4", 8: ">i8"}
+
+
+def _empty() -> Tuple[np.ndarray, np.ndarray]:
+    return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+
+def _data_start(mv: memoryview) -> int:
+    if bytes(mv[: len(PGCOPY_SIGNATURE)]) != PGCOPY_SIGNATURE:
+        raise ValueError("No es una copia binaria de Postgres")
+    (ext_len,) = struct.unpack_from(">i", mv, _HEADER_LEN - 4)
+    return _HEADER_LEN + ext_len
+
+
+def _parse_uniform(mv: memoryview, start: int) -> Tuple[np.ndarray, np.ndarray] | None:
+    """Camino rápido: todas las tuplas con la misma forma → una vista estructurada."""
+    nfields, id_len = struct.unpack_from(">hi", mv, start)
+    if nfields != 2 or id_len not in _INT_DTYPES:
+        return None
+    (vec_len,) = struct.unpack_from(">i", mv, start + 6 + id_len)
+    if vec_len < 4:
+        return None
+    (dim,) = struct.unpack_from(">h", mv, start + 10 + id_len)
+    stride = 2 + 4 + id_len + 4 + vec_len
+    body = len(mv) - start - 2  # trailer int16 = -1
+    if vec_len != 4 + 4 * dim or body % stride:
+        return None
+    dtype = np.dtype([
+        ("nfields", ">i2"), ("id_len", ">i4"), ("id", _INT_DTYPES[id_len]),
+        ("vec_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("vec", ">f4", (dim,)),
+    ])
+    rows = np.frombuffer(mv, dtype=dtype, count=body // stride, offset=start)
+    if not ((rows["nfields"] == 2).all() and (rows["id_len"] == id_len).all() and (rows["vec_len"] == vec_len).all()):
+        return None
+    ids = rows["id"].astype(np.int64)
+    matrix = np.empty((rows.shape[0], dim), dtype=np.float32)
+    matrix[...] = rows["vec"]  # big-endian → float32 nativo en una sola pasada
+    return ids, matrix
+
+
+def _parse_rows(mv: memoryview, start: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Camino general: recorre tuplas; omite NULLs y vectores de otra dimensión que el primero."""
+    pos = start
+    found: list = []  # (id, offset de los floats)
+    dim = None
+    while True:
+        (nfields,) = struct.unpack_from(">h", mv, pos)
+        pos += 2
+        if nfields == -1:
+            break
+        if nfields != 2:
+            raise ValueError(f"Se esperaban 2 columnas (id, embedding) y llegaron {nfields}")
+        (id_len,) = struct.unpack_from(">i", mv, pos)
+        pos += 4
+        rid = int.from_bytes(mv[pos:pos + id_len], "big", signed=True) if id_len > 0 else None
+        pos += max(id_len, 0)
+        (vec_len,) = struct.unpack_from(">i", mv, pos)
+        pos += 4
+        if vec_len < 0 or rid is None:
+            continue
+        (d,) = struct.unpack_from(">h", mv, pos)
+        if dim is None:
+            dim = d
+        if d == dim:
+            found.append((rid, pos + 4))
+        else:
+            logger.warning("⚠️ Embedding de la mención %s con dimensión %s (se esperaba %s); se omite", rid, d, dim)
+        pos += vec_len
+    if not found:
+        return _empty()
+    ids = np.fromiter((rid for rid, _ in found), dtype=np.int64, count=len(found))
+    matrix = np.empty((len(found), dim), dtype=np.float32)
+    for i, (_, off) in enumerate(found):
+        matrix[i] = np.frombuffer(mv, dtype=">f4", count=dim, offset=off)
+    return ids, matrix
+
+
+def parse_vector_copy(data: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """``(ids int64, matriz float32 n×dim)`` a partir de una copia binaria de ``(id, vector)``."""
+    mv = memoryview(data).cast("B")
+    if len(mv) == 0:
+        return _empty()
+    start = _data_start(mv)
+    if len(mv) - start <= 2:
+        return _empty()
+    return _parse_uniform(mv, start) or _parse_rows(mv, start)
+
+
+def _parse_text_vectors(rows: Sequence[Tuple[Any, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Fallback ``embedding::text`` ("[v1,v2,...]") directo a una matriz preasignada."""
+    rows = [(rid, txt) for rid, txt in rows if isinstance(txt, str) and txt.strip("[] ")]
+    if not rows:
+        return _empty()
+    first = np.array(rows[0][1].strip("[] ").split(","), dtype=np.float32)
+    matrix = np.empty((len(rows), first.size), dtype=np.float32)
+    ids = np.empty(len(rows), dtype=np.int64)
+    n = 0
+    for rid, txt in rows:
+        vec = np.array(txt.strip("[] ").split(","), dtype=np.float32)
+        if vec.size != first.size:
+            continue
+        matrix[n] = vec
+        ids[n] = int(rid)
+        n += 1
+    return ids[:n], matrix[:n]
+
+
+def fetch_vector_matrix(cur, select_sql: str, params: Sequence[Any] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """Ejecuta ``select_sql`` (debe devolver ``id, embedding``) y devuelve ``(ids, matriz float32)``.
+
+    ``cur`` es un cursor psycopg2; ``params`` se incrustan con ``mogrify``
+    porque COPY no admite parámetros.
+    """
+    sql = cur.mogrify(select_sql, tuple(params)).decode("utf-8") if params else select_sql
+    buf = io.BytesIO()
+    cur.execute("SAVEPOINT vector_copy")
+    try:
+        cur.copy_expert(f"COPY ({sql}) TO STDOUT (FORMAT binary)", buf)
+        cur.execute("RELEASE SAVEPOINT vector_copy")
+    except Exception as exc:
+        logger.warning("⚠️ COPY binario de embeddings no disponible (%s); se usa embedding::text", exc)
+        cur.execute("ROLLBACK TO SAVEPOINT vector_copy")
+    else:
+        try:
+            return parse_vector_copy(buf.getbuffer())
+        except Exception as exc:
+            logger.warning("⚠️ Copia binaria de embeddings no reconocida (%s); se usa embedding::text", exc)
+    cur.execute(f"SELECT id, embedding::text FROM ({sql}) v")
+    return _parse_text_vectors(cur.fetchall())
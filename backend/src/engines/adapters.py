@@ -0,0 +1,82 @@
+# src/engines/adapters.py
+"""
+Adaptadores de motor para el polling.
+
+Cada adaptador hace exactamente UNA llamada al proveedor por query y devuelve
+texto, fuentes estructuradas y metadatos juntos (``EngineResult``), de modo que
+el pipeline no tenga que volver a llamar al motor para obtener los metadatos
+ni mida latencias de llamadas que luego descarta.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, TypedDict
+
+from src.engines.openai_engine import fetch_response_with_metadata
+from src.engines.perplexity import fetch_perplexity_with_metadata
+from src.engines.serp import get_search_results_structured
+
+
+class EngineResult(TypedDict):
+    text: str
+    sources: List[Dict[str, Any]]  # rank, title, url, domain, snippet
+    meta: Dict[str, Any]           # model_name, api_status_code, engine_request_id, tokens, price...
+    latency_ms: int
+
+
+class EngineAdapter:
+    """Interfaz mínima: ``name`` (valor de mentions.engine) y ``fetch(query)``."""
+
+    name: str = ""
+
+    def _call(self, query: str) -> tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        raise NotImplementedError
+
+    def fetch(self, query: str) -> EngineResult:
+        start = time.time()
+        text, sources, meta = self._call(query)
+        return {
+            "text": text if isinstance(text, str) else "",
+            "sources": sources or [],
+            "meta": meta or {},
+            "latency_ms": int((time.time() - start) * 1000),
+        }
+
+
+class OpenAIAdapter(EngineAdapter):
+    name = "gpt-4"
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+
+    def _call(self, query: str):
+        text, meta = fetch_response_with_metadata(query, model=self.model)
+        return text, [], meta
+
+
+class PerplexityAdapter(EngineAdapter):
+    name = "pplx-7b-chat"
+
+    def _call(self, query: str):
+        text, meta = fetch_perplexity_with_metadata(query)
+        return text, [], meta
+
+
+class SerpAdapter(EngineAdapter):
+    name = "serpapi"
+
+    def __init__(self, top_k: int = 5):
+        self.top_k = top_k
+
+    def _call(self, query: str):
+        text, structured = get_search_results_structured(query, top_k=self.top_k)
+        if not structured:
+            # Sin resultados orgánicos no hay nada que analizar
+            return "", [], {"model_name": None, "error_category": "no_results"}
+        return text, structured, {}
+
+
+def get_default_adapters() -> List[EngineAdapter]:
+    """Motores que se consultan en cada ciclo de polling, en orden."""
+    return [OpenAIAdapter(model="gpt-4o-mini"), PerplexityAdapter(), SerpAdapter(top_k=5)]
@@ -0,0 +1,141 @@
+# src/engines/embedding_store.py
+"""
+Almacén de embeddings direccionado por contenido (tabla ``embedding_cache``).
+
+Clave: sha256 del texto normalizado (NFC, espacios colapsados) + modelo.
+Antes de llamar a ``embeddings.create`` se buscan los hashes en Postgres; solo
+los textos nuevos (y deduplicados dentro del propio lote) van a la API, y sus
+vectores se guardan para la siguiente vez. Lo usan el polling y
+scripts/backfill_embeddings.py; ``embedding_cache_stats()`` expone los contadores
+de aciertos del proceso.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+Vector = Union[str, Sequence[float]]
+
+_WS_RE = re.compile(r"\s+")
+
+_STATS_LOCK = threading.Lock()
+_STATS = {"lookups": 0, "hits": 0, "deduplicated": 0, "embedded": 0}
+
+
+def normalize_text(text: Optional[str]) -> str:
+    return _WS_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def content_hash(text: Optional[str]) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def to_vector_literal(vec: Vector) -> str:
+    """Literal ``[x,y,...]`` para castear a ::vector (acepta ya-literales)."""
+    if isinstance(vec, str):
+        return vec
+    return "[" + ",".join(f"{float(x):.8f}" for x in vec) + "]"
+
+
+def ensure_embedding_cache_table(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            content_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            embedding vector NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (content_hash, model)
+        )
+        """
+    )
+
+
+def _record(**deltas: int) -> None:
+    with _STATS_LOCK:
+        for key, value in deltas.items():
+            _STATS[key] += value
+
+
+def embedding_cache_stats(reset: bool = False) -> Dict[str, float]:
+    """Contadores del proceso: búsquedas, aciertos en BD, duplicados en lote y textos embebidos."""
+    with _STATS_LOCK:
+        stats: Dict[str, float] = dict(_STATS)
+        if reset:
+            for key in _STATS:
+                _STATS[key] = 0
+    lookups = stats["lookups"]
+    stats["hit_rate"] = round((stats["hits"] + stats["deduplicated"]) / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def embed_with_cache(cur, texts: List[str], embed_fn: Callable[[List[str]], List[Optional[Vector]]],
+                     model: str) -> List[Optional[str]]:
+    """Devuelve un literal ::vector por texto (None si no se pudo embeber).
+
+    ``embed_fn`` recibe solo los textos que faltan (únicos) y devuelve sus
+    vectores alineados; los nuevos se guardan en ``embedding_cache`` en el
+    mismo cursor (el commit lo hace quien llama).
+    """
+    if not texts:
+        return []
+    hashes = [content_hash(t) for t in texts]
+    found: Dict[str, str] = {}
+    # SAVEPOINT: si la tabla no existe o falla, no se aborta la transacción de quien llama
+    cur.execute("SAVEPOINT embedding_cache")
+    try:
+        cur.execute(
+            "SELECT content_hash, embedding::text FROM embedding_cache WHERE model = %s AND content_hash = ANY(%s)",
+            (model, list(set(hashes))),
+        )
+        found = {h: emb for h, emb in cur.fetchall()}
+        cur.execute("RELEASE SAVEPOINT embedding_cache")
+    except Exception as exc:
+        logger.warning("⚠️ No se pudo consultar embedding_cache: %s", exc)
+        cur.execute("ROLLBACK TO SAVEPOINT embedding_cache")
+
+    missing: Dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in found and h not in missing:
+            missing[h] = t
+
+    hits = sum(1 for h in hashes if h in found)
+    embedded = 0
+
+    if missing:
+        miss_hashes = list(missing.keys())
+        vectors = embed_fn([missing[h] for h in miss_hashes]) or []
+        new_rows = []
+        for h, vec in zip(miss_hashes, vectors):
+            if vec is None:
+                continue
+            literal = to_vector_literal(vec)
+            found[h] = literal
+            new_rows.append((h, model, literal))
+        if new_rows:
+            cur.execute("SAVEPOINT embedding_cache")
+            try:
+                execute_values(
+                    cur,
+                    "INSERT INTO embedding_cache (content_hash, model, embedding) VALUES %s "
+                    "ON CONFLICT (content_hash, model) DO NOTHING",
+                    new_rows,
+                    template="(%s, %s, %s::vector)",
+                )
+                cur.execute("RELEASE SAVEPOINT embedding_cache")
+                embedded = len(new_rows)
+            except Exception as exc:
+                logger.warning("⚠️ No se pudieron guardar %s embeddings en caché: %s", len(new_rows), exc)
+                cur.execute("ROLLBACK TO SAVEPOINT embedding_cache")
+    # Solo se cuenta lo que llegó a la API y se guardó: si embed_fn falla, el lote no altera los contadores
+    _record(lookups=len(texts), hits=hits, deduplicated=len(texts) - hits - len(missing), embedded=embedded)
+    return [found.get(h) for h in hashes]
@@ -0,0 +1,70 @@
+# src/engines/http_client.py
+"""
+Clientes HTTP compartidos por los motores (Perplexity, SerpAPI).
+
+Un único ``httpx.Client`` por proceso (``get_http_client``) con keep-alive y
+pool de conexiones, para que las llamadas concurrentes del polling reutilicen
+conexiones TLS en lugar de abrir una nueva por petición.
+
+HTTP/2 se negocia por ALPN si el paquete opcional ``h2`` está instalado
+(``pip install httpx[http2]``); si no, se usa HTTP/1.1 con keep-alive.
+Timeouts y tamaño del pool se configuran por entorno.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "90"))
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "64"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "32"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+try:  # HTTP/2 es opcional
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = os.getenv("HTTP2_ENABLED", "true").lower() in {"1", "true", "yes"}
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_CLIENT: Optional[httpx.Client] = None
+_LOCK = threading.Lock()
+
+
+def default_timeout(read: Optional[float] = None) -> httpx.Timeout:
+    return httpx.Timeout(read if read is not None else HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """Cliente síncrono compartido (thread-safe)."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _LOCK:
+            if _CLIENT is None:
+                _CLIENT = httpx.Client(http2=HTTP2_AVAILABLE, limits=_limits(), timeout=default_timeout())
+                logger.info("🌐 Cliente HTTP compartido (http2=%s, pool=%s)", HTTP2_AVAILABLE, HTTP_POOL_MAX_CONNECTIONS)
+    return _CLIENT
+
+
+def close_clients() -> None:
+    """Cierra el cliente síncrono (p.ej. al final de un script)."""
+    global _CLIENT
+    with _LOCK:
+        if _CLIENT is not None:
+            _CLIENT.close()
+            _CLIENT = None
@@ -14,15 +14,19 @@ from __future__ import annotations
 import json
 import logging
 import os
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from dotenv import load_dotenv
 from openai import OpenAI, OpenAIError
 import httpx
 
+from src.engines.response_cache import get_response_cache, is_cacheable, make_cache_key
+from src.engines.rate_limit import call_with_retry, estimate_tokens
+
 # ───────────────────────── Config ──────────────────────────
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Sin reintentos internos del SDK: los gestiona src/engines/rate_limit.call_with_retry
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 DEFAULT_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "25"))
 MAX_INPUT_CHARS = int(os.getenv("OPENAI_MAX_INPUT_CHARS", "60000"))
 
@@ -46,16 +50,29 @@ def _truncate_input(text: str) -> str:
 
 
 # ─────────────────── Funciones del Engine ──────────────────
+FETCH_RESPONSE_SYSTEM_PROMPT = (
+    "Eres un analista especializado en educación superior y captación de alumnos. "
+    "Conoces a 'The Core School' en Madrid: escuela superior de entretenimiento y artes audiovisuales "
+    "(cine, videojuegos, animación, producción). Prioriza exactitud, JSON válido y contexto de negocio."
+)
+
+
 def fetch_response(
     prompt: str,
     *,
     model: str = "gpt-4o-mini",
     temperature: float = 0.3,
     max_tokens: int = 1_024,
+    use_cache: Optional[bool] = None,
 ) -> str:
     """
     Envía un prompt y devuelve la respuesta textual del modelo.
     Usa gpt-4o-mini por defecto por ser rápido y económico.
+
+    Las respuestas se cachean por (modelo, system prompt, prompt, temperature,
+    max_tokens) según src/engines/response_cache.py: por defecto solo las
+    deterministas; ``use_cache=True`` cachea también una salida muestreada (solo
+    para texto que no se parsea después) y ``use_cache=False`` fuerza una llamada nueva.
     """
     try:
         user_content = prompt if isinstance(prompt, str) else json.dumps(prompt, ensure_ascii=False)
@@ -63,24 +80,32 @@ def fetch_response(
             logger.error("fetch_response: prompt vacío o None; evitando llamada al modelo.")
             return ""
         user_content = _truncate_input(user_content)
-        res = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Eres un analista especializado en educación superior y captación de alumnos. "
-                        "Conoces a 'The Core School' en Madrid: escuela superior de entretenimiento y artes audiovisuales "
-                        "(cine, videojuegos, animación, producción). Prioriza exactitud, JSON válido y contexto de negocio."
-                    ),
-                },
-                {"role": "user", "content": user_content},
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=DEFAULT_TIMEOUT,
+
+        cache = get_response_cache() if use_cache is not False and is_cacheable(temperature, bool(use_cache)) else None
+        cache_key = None
+        if cache is not None:
+            cache_key = make_cache_key(model, FETCH_RESPONSE_SYSTEM_PROMPT, user_content, temperature, max_tokens)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        res = call_with_retry(
+            "openai",
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": FETCH_RESPONSE_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=DEFAULT_TIMEOUT,
+            ),
+            est_tokens=estimate_tokens(FETCH_RESPONSE_SYSTEM_PROMPT, user_content) + max_tokens,
         )
         answer: str = res.choices[0].message.content.strip()
+        if cache is not None:
+            cache.set(cache_key, answer)
         return answer
     except (OpenAIError, httpx.TimeoutException, TimeoutError) as exc:
         logger.exception("❌ OpenAI API error en fetch_response: %s", exc)
@@ -165,15 +190,19 @@ def fetch_response_with_metadata(
                 "error": "empty_prompt",
             }
         user_content = _truncate_input(user_content)
-        res = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "Eres un asistente útil. Sigue exactamente las instrucciones del usuario."},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=DEFAULT_TIMEOUT,
+        res = call_with_retry(
+            "openai",
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "Eres un asistente útil. Sigue exactamente las instrucciones del usuario."},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=DEFAULT_TIMEOUT,
+            ),
+            est_tokens=estimate_tokens(user_content) + max_tokens,
         )
         answer = res.choices[0].message.content.strip()
         usage = getattr(res, "usage", None)
@@ -1,8 +1,13 @@
 import os
-import requests
+import httpx
 from typing import Tuple, Dict, Any
 from dotenv import load_dotenv
 
+from src.engines.http_client import default_timeout, get_http_client
+from src.engines.rate_limit import (
+    RetryableResponse, call_with_retry, check_response, estimate_tokens,
+)
+
 load_dotenv()
 
 PPLX_KEY = os.getenv("PERPLEXITY_API_KEY")
@@ -11,29 +16,29 @@ HEADERS  = {
     "Authorization": f"Bearer {PPLX_KEY}",
     "Content-Type": "application/json"
 }
+# Timeout de lectura en segundos; sonar-reasoning puede tardar en responder
+TIMEOUT = default_timeout(float(os.getenv("PERPLEXITY_TIMEOUT", "90")))
 
-def fetch_perplexity_response(query: str) -> str:
-    body = {
+
+def _body(query: str) -> Dict[str, Any]:
+    return {
         "model": "sonar-reasoning",                # modelo disponible en cuentas free
         "messages": [{"role": "user", "content": query}],
         "temperature": 0.7
     }
-    resp = requests.post(API_URL, headers=HEADERS, json=body)
-    if resp.status_code != 200:
-        print("🔴 PPLX error detail:", resp.text)  # mostrará la causa exacta
-        resp.raise_for_status()
 
-    data = resp.json()
-    return data["choices"][0]["message"]["content"].strip()
 
+def _post(body: Dict[str, Any]) -> httpx.Response:
+    """POST por el cliente HTTP compartido (keep-alive/HTTP2), con presupuesto y reintentos."""
+    client = get_http_client()
+    return call_with_retry(
+        "perplexity",
+        lambda: check_response(client.post(API_URL, headers=HEADERS, json=body, timeout=TIMEOUT)),
+        est_tokens=estimate_tokens(*(m["content"] for m in body["messages"])),
+    )
 
-def fetch_perplexity_with_metadata(query: str) -> Tuple[str, Dict[str, Any]]:
-    body = {
-        "model": "sonar-reasoning",
-        "messages": [{"role": "user", "content": query}],
-        "temperature": 0.7
-    }
-    resp = requests.post(API_URL, headers=HEADERS, json=body)
+
+def _response_with_metadata(resp: httpx.Response, body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
     meta: Dict[str, Any] = {
         "model_name": body["model"],
         "api_status_code": resp.status_code,
@@ -53,3 +58,25 @@ def fetch_perplexity_with_metadata(query: str) -> Tuple[str, Dict[str, Any]]:
     })
     # Si publican pricing por token, se puede estimar aquí
     return text, meta
+
+def fetch_perplexity_response(query: str) -> str:
+    try:
+        resp = _post(_body(query))
+    except RetryableResponse as exc:
+        resp = exc.response
+    if resp.status_code != 200:
+        print("🔴 PPLX error detail:", resp.text)  # mostrará la causa exacta
+        resp.raise_for_status()
+
+    data = resp.json()
+    return data["choices"][0]["message"]["content"].strip()
+
+
+def fetch_perplexity_with_metadata(query: str) -> Tuple[str, Dict[str, Any]]:
+    body = _body(query)
+    try:
+        resp = _post(body)
+    except RetryableResponse as exc:
+        # Agotados los reintentos: se registra como error de API igual que antes
+        resp = exc.response
+    return _response_with_metadata(resp, body)
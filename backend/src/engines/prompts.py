@@ -67,3 +67,24 @@ Texto a analizar:
 """
 
 
+
+
+# --- ANÁLISIS POR LOTES (POLLING) ---
+
+BATCH_MENTION_ANALYSIS_JSON = """
+Eres un analista experto en ESPAÑOL. Vas a recibir varios DOCUMENTOS numerados.
+Para CADA documento devuelve:
+1. "summary": resumen conciso y atractivo en una sola frase (máximo 25 palabras).
+2. "key_topics": lista de los 3 a 5 temas, marcas o conceptos más importantes mencionados.
+3. "sentiment": número entre -1 (muy negativo) y 1 (muy positivo). Información factual sin
+   valoración → −0.2 a 0.2. Incertidumbre, preocupación, riesgo, caída o crítica NUNCA dan
+   un valor positivo (ambiguo con preocupación ≈ −0.2 a −0.4).
+4. "emotion": alegría, tristeza, enojo, miedo, sorpresa o neutral.
+5. "confidence": número entre 0 y 1.
+
+Devuelve SOLO este JSON (sin texto adicional), con un elemento por documento y el mismo "id":
+{{"results": [{{"id": 1, "summary": "...", "key_topics": ["..."], "sentiment": 0.0, "emotion": "neutral", "confidence": 0.9}}]}}
+
+DOCUMENTOS:
+{documents}
+"""
@@ -0,0 +1,204 @@
+# src/engines/rate_limit.py
+"""
+Limitador de tasa compartido por todos los motores (OpenAI, Perplexity, SerpAPI).
+
+    • TokenBucket      → cubo de tokens thread-safe (recarga continua por minuto)
+    • ProviderLimiter  → presupuesto RPM + TPM por proveedor y "cooldown" común
+                         cuando el proveedor responde 429 con Retry-After
+    • call_with_retry  → reserva presupuesto, llama y reintenta errores
+                         transitorios (429, 5xx, timeouts, conexión) con backoff
+                         exponencial con jitter, respetando Retry-After
+
+Los límites se configuran por entorno: ``<PROVEEDOR>_RPM`` y ``<PROVEEDOR>_TPM``
+(p.ej. OPENAI_RPM=500, OPENAI_TPM=200000). 0 desactiva ese presupuesto.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "1.0"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+
+# Presupuestos por defecto (conservadores; ajustar al contrato de cada proveedor)
+_DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200_000},
+    "perplexity": {"rpm": 50, "tpm": 0},
+    "serpapi": {"rpm": 60, "tpm": 0},
+}
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Cubo de tokens con recarga continua de ``per_minute`` tokens por minuto."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = float(per_minute) / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Bloquea hasta disponer de ``amount`` tokens. Devuelve los segundos esperados."""
+        # Peticiones mayores que la capacidad se limitan a la capacidad para no bloquear para siempre
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate if self.rate > 0 else 1.0
+            self._sleep(wait)
+            waited += wait
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.name = name
+        self.requests = TokenBucket(rpm, clock=clock, sleep=sleep) if rpm else None
+        self.tokens = TokenBucket(tpm, clock=clock, sleep=sleep) if tpm else None
+        self._clock = clock
+        self._sleep = sleep
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def penalize(self, seconds: float) -> None:
+        """Pausa a todos los llamantes del proveedor (p.ej. tras un 429 con Retry-After)."""
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, self._clock() + max(0.0, seconds))
+
+    def acquire(self, est_tokens: int = 0) -> None:
+        with self._lock:
+            pause = self._cooldown_until - self._clock()
+        if pause > 0:
+            self._sleep(pause)
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and est_tokens:
+            self.tokens.acquire(est_tokens)
+
+
+_LIMITERS: Dict[str, ProviderLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(provider)
+        if limiter is None:
+            defaults = _DEFAULT_LIMITS.get(provider, {"rpm": 0, "tpm": 0})
+            prefix = provider.upper()
+            limiter = ProviderLimiter(
+                provider,
+                rpm=float(os.getenv(f"{prefix}_RPM", defaults["rpm"])),
+                tpm=float(os.getenv(f"{prefix}_TPM", defaults["tpm"])),
+            )
+            _LIMITERS[provider] = limiter
+        return limiter
+
+
+def estimate_tokens(*texts: Any) -> int:
+    """Estimación barata (~4 caracteres por token) para el presupuesto TPM."""
+    return sum(len(t) for t in texts if isinstance(t, str)) // 4
+
+
+class RetryableResponse(Exception):
+    """Respuesta HTTP transitoria (429/5xx) de un cliente que no lanza por sí mismo."""
+
+    def __init__(self, response: Any):
+        super().__init__(f"HTTP {getattr(response, 'status_code', '?')}")
+        self.response = response
+        self.status_code = getattr(response, "status_code", None)
+
+
+def check_response(response: Any) -> Any:
+    """Lanza ``RetryableResponse`` si el status es transitorio; si no, devuelve la respuesta."""
+    if getattr(response, "status_code", None) in RETRYABLE_STATUS:
+        raise RetryableResponse(response)
+    return response
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Lee Retry-After / retry-after-ms de la respuesta asociada a la excepción."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers.get("retry-after-ms")) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(exc).__name__.lower()
+    return any(k in name for k in ("timeout", "connection", "connect", "ratelimit"))
+
+
+def _backoff_delay(limiter: ProviderLimiter, exc: BaseException, attempt: int, retries: int) -> float:
+    """Full jitter exponencial; Retry-After manda si es mayor. Un 429 pausa a todo el proveedor."""
+    delay = random.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+    hinted = retry_after_seconds(exc)
+    if hinted is not None:
+        delay = max(delay, hinted)
+    if _status_of(exc) == 429:
+        limiter.penalize(delay)
+    logger.warning("⏳ %s: error transitorio (%s). Reintento %s/%s en %.1fs",
+                   limiter.name, exc, attempt, retries, delay)
+    return delay
+
+
+def call_with_retry(provider: str, fn: Callable[[], T], *, est_tokens: int = 0,
+                    max_retries: Optional[int] = None, sleep: Callable[[float], None] = time.sleep) -> T:
+    """Ejecuta ``fn`` dentro del presupuesto de ``provider`` reintentando errores transitorios.
+
+    Los errores no transitorios (400, 401...) y el último intento fallido se
+    relanzan tal cual para que cada motor mantenga su manejo de errores.
+    """
+    limiter = get_limiter(provider)
+    retries = RATE_LIMIT_MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        limiter.acquire(est_tokens)
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt >= retries or not is_retryable(exc):
+                raise
+            attempt += 1
+            delay = _backoff_delay(limiter, exc, attempt, retries)
+            sleep(delay)
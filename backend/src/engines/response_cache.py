@@ -0,0 +1,143 @@
+# src/engines/response_cache.py
+"""
+Caché de respuestas del LLM para ``fetch_response``.
+
+La clave es un hash de (modelo, system prompt, contenido de usuario,
+temperature, max_tokens). Dos niveles:
+
+    • MemoryTier → LRU en proceso (src/utils/cache.LRUCache)
+    • DiskTier   → un JSON por clave en LLM_CACHE_DIR, compartido entre procesos
+
+Ambos aplican el mismo TTL. Por defecto solo se cachean llamadas deterministas
+(temperature <= ``LLM_CACHE_MAX_TEMPERATURE``, 0 salvo configuración); una salida
+muestreada solo se guarda si quien llama lo pide con ``fetch_response(...,
+use_cache=True)``, y ``use_cache=False`` salta la caché de forma explícita.
+``set_response_cache()`` permite sustituirla (p.ej. por otro backend).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import List, Optional
+
+from src.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join("cache", "llm_responses"))
+# Sin opt-in explícito solo se cachean llamadas con temperature <= este valor (0 = solo deterministas)
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.0"))
+
+
+def make_cache_key(model: str, system_prompt: str, user_content: str, temperature: float, max_tokens: int) -> str:
+    raw = json.dumps([model, system_prompt, user_content, round(float(temperature), 4), int(max_tokens)],
+                     ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self._lru = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._lru.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        self._lru.set(key, value)
+
+
+class DiskTier:
+    """Un fichero JSON por clave (``<dir>/<ab>/<hash>.json``); escritura atómica."""
+
+    def __init__(self, directory: str = LLM_CACHE_DIR, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logger.warning("⚠️ Entrada de caché LLM ilegible (%s): %s", path, exc)
+            return None
+        if self.ttl_seconds and time.time() - float(entry.get("created_at", 0)) > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump({"created_at": time.time(), "value": value}, fh, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as exc:
+            logger.warning("⚠️ No se pudo escribir la caché LLM en disco: %s", exc)
+
+
+class ResponseCache:
+    """Busca en los niveles en orden y rellena los niveles superiores en cada acierto."""
+
+    def __init__(self, tiers: List[object]):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        for idx, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for upper in self.tiers[:idx]:
+                    upper.set(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        # No se cachean respuestas vacías (errores de API)
+        if not value:
+            return
+        for tier in self.tiers:
+            tier.set(key, value)
+
+
+_RESPONSE_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Caché global (memoria + disco), o None si LLM_CACHE_ENABLED está desactivado."""
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is None and LLM_CACHE_ENABLED:
+        _RESPONSE_CACHE = ResponseCache([MemoryTier(), DiskTier()])
+    return _RESPONSE_CACHE
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """Sustituye la caché global (None la desactiva hasta el siguiente get)."""
+    global _RESPONSE_CACHE
+    _RESPONSE_CACHE = cache
+
+
+def is_cacheable(temperature: float, opt_in: bool = False) -> bool:
+    """Deterministas siempre; muestreadas solo con ``opt_in`` (el llamante acepta reutilizar la respuesta)."""
+    return LLM_CACHE_ENABLED and (opt_in or float(temperature) <= LLM_CACHE_MAX_TEMPERATURE)
@@ -3,13 +3,14 @@ import os
 import json
 import logging
 from . import prompts as catalog
+from .rate_limit import call_with_retry, estimate_tokens
 
 # Configurar logging para debugging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Cliente OpenAI
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
 
 def analyze_sentiment(text):
     """
@@ -20,11 +21,15 @@ def analyze_sentiment(text):
     try:
         logger.info(f"Analizando sentiment para texto de {len(text)} caracteres")
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # Modelo más confiable y barato
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,  # Muy baja para consistencia
-            max_tokens=100    # Suficiente para JSON simple
+        response = call_with_retry(
+            "openai",
+            lambda: client.chat.completions.create(
+                model="gpt-3.5-turbo",  # Modelo más confiable y barato
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1,  # Muy baja para consistencia
+                max_tokens=100    # Suficiente para JSON simple
+            ),
+            est_tokens=estimate_tokens(prompt) + 100,
         )
 
         content = response.choices[0].message.content.strip()
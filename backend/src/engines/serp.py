@@ -1,15 +1,30 @@
 import os
 from urllib.parse import urlparse
-from serpapi import GoogleSearch
 from typing import List, Dict, Any, Tuple
 
-def get_search_results(query: str) -> str:
+from src.engines.http_client import default_timeout, get_http_client
+from src.engines.rate_limit import call_with_retry, check_response
+
+SERPAPI_URL = "https://serpapi.com/search"
+SERPAPI_TIMEOUT = default_timeout(float(os.getenv("SERPAPI_TIMEOUT", "60")))
+
+
+def _search(query: str) -> Dict[str, Any]:
+    """Misma petición que ``serpapi.GoogleSearch(...).get_dict()`` pero por el cliente
+    HTTP compartido (keep-alive) en lugar de abrir una conexión nueva por búsqueda."""
     params = {
         "q": query,
-        "api_key": os.getenv("SERPAPI_KEY")
+        "api_key": os.getenv("SERPAPI_KEY"),
+        "engine": "google",
+        "output": "json",
+        "source": "python",
     }
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    client = get_http_client()
+    resp = call_with_retry("serpapi", lambda: check_response(client.get(SERPAPI_URL, params=params, timeout=SERPAPI_TIMEOUT)))
+    return resp.json()
+
+def get_search_results(query: str) -> str:
+    results = _search(query)
 
     answers = []
     for result in results.get("organic_results", []):
@@ -19,12 +34,7 @@ def get_search_results(query: str) -> str:
 
 
 def get_search_results_structured(query: str, top_k: int = 5) -> Tuple[str, List[Dict[str, Any]]]:
-    params = {
-        "q": query,
-        "api_key": os.getenv("SERPAPI_KEY")
-    }
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    results = _search(query)
 
     organic = results.get("organic_results", [])
     structured: List[Dict[str, Any]] = []
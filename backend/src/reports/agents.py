@@ -0,0 +1,143 @@
+"""
+Ejecutor de la cadena de agentes LLM del informe.
+
+Cada llamada es una tarea con nombre y, opcionalmente, dependencias: las
+independientes (análisis por cluster, secciones de la Parte 2, resumen de
+insights del agente, acciones por competidor) se lanzan a la vez y las que
+dependen de otras (la síntesis necesita todos los análisis de cluster)
+arrancan en cuanto terminan sus dependencias. El tiempo total se acerca así a
+la cadena de dependencias más larga en lugar de a la suma de llamadas.
+
+    • REPORT_AGENT_CONCURRENCY            → llamadas simultáneas por informe
+    • REPORT_AGENT_TIMEOUT_SECONDS        → tope por llamada desde que arranca
+    • REPORT_AGENT_TOTAL_TIMEOUT_SECONDS  → tope de toda la cadena
+
+Una tarea que falla o vence el tope devuelve su ``default`` (y sus
+dependientes se ejecutan con él), igual que los fallbacks silenciosos que ya
+tenía cada agente. El límite global por proveedor sigue siendo el de
+src/engines/rate_limit.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+REPORT_AGENT_CONCURRENCY = int(os.getenv("REPORT_AGENT_CONCURRENCY", "6"))
+REPORT_AGENT_TIMEOUT_SECONDS = float(os.getenv("REPORT_AGENT_TIMEOUT_SECONDS", "120"))
+REPORT_AGENT_TOTAL_TIMEOUT_SECONDS = float(os.getenv("REPORT_AGENT_TOTAL_TIMEOUT_SECONDS", "600"))
+
+# Con tareas en cola (aún sin hilo) se revisa el reloj cada POLL_SECONDS para aplicarles su tope al arrancar
+_POLL_SECONDS = 0.5
+
+
+class _Task:
+    __slots__ = ("name", "fn", "deps", "default")
+
+    def __init__(self, name: str, fn: Callable[..., Any], deps: Sequence[str], default: Any):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.default = default
+
+
+class ReportAgentExecutor:
+    """Grafo de llamadas LLM de un informe. ``add`` las registra y ``run`` las ejecuta.
+
+    ``fn`` recibe como argumentos posicionales los resultados de ``deps`` en el
+    mismo orden.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None,
+                 total_timeout: Optional[float] = None):
+        self.max_workers = max(1, int(max_workers or REPORT_AGENT_CONCURRENCY))
+        self.timeout = float(timeout or REPORT_AGENT_TIMEOUT_SECONDS)
+        self.total_timeout = float(total_timeout or REPORT_AGENT_TOTAL_TIMEOUT_SECONDS)
+        self._tasks: Dict[str, _Task] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], *, deps: Sequence[str] = (), default: Any = None) -> str:
+        if name in self._tasks:
+            raise ValueError(f"Tarea duplicada: {name}")
+        self._tasks[name] = _Task(name, fn, deps, default)
+        return name
+
+    def run(self) -> Dict[str, Any]:
+        """Ejecuta todas las tareas y devuelve ``{nombre: resultado}``."""
+        results: Dict[str, Any] = {}
+        pending = dict(self._tasks)
+        running: Dict[Any, _Task] = {}
+        started: Dict[str, float] = {}
+        lock = threading.Lock()
+        t0 = time.monotonic()
+        total_deadline = t0 + self.total_timeout
+
+        def _call(task: _Task, args: list) -> Any:
+            with lock:
+                started[task.name] = time.monotonic()
+            return task.fn(*args)
+
+        def _fallback(task: _Task, reason: str) -> None:
+            logger.warning("⏱️ Agente '%s' sin resultado (%s); se usa el valor por defecto.", task.name, reason)
+            results[task.name] = task.default
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="report-agent")
+        try:
+            while pending or running:
+                for name, task in list(pending.items()):
+                    if all(d in results for d in task.deps):
+                        args = [results[d] for d in task.deps]
+                        running[pool.submit(_call, task, args)] = task
+                        del pending[name]
+                if not running:
+                    # Dependencias que nunca se resolverán (nombre inexistente o ciclo)
+                    for task in pending.values():
+                        _fallback(task, "dependencias sin resolver")
+                    break
+
+                now = time.monotonic()
+                with lock:
+                    deadlines = [started[t.name] + self.timeout for t in running.values() if t.name in started]
+                    queued = len(deadlines) < len(running)
+                next_check = min(deadlines + [total_deadline])
+                if queued:
+                    next_check = min(next_check, now + _POLL_SECONDS)
+                done, _ = wait(list(running), timeout=max(0.0, next_check - now), return_when=FIRST_COMPLETED)
+
+                for fut in done:
+                    task = running.pop(fut)
+                    try:
+                        results[task.name] = fut.result()
+                    except Exception as exc:
+                        _fallback(task, f"error: {exc}")
+
+                now = time.monotonic()
+                with lock:
+                    expired = [
+                        fut for fut, t in running.items()
+                        if now >= total_deadline or (t.name in started and now >= started[t.name] + self.timeout)
+                    ]
+                for fut in expired:
+                    fut.cancel()
+                    _fallback(running.pop(fut), "timeout")
+                if now >= total_deadline:
+                    for task in pending.values():
+                        _fallback(task, "timeout del informe")
+                    pending.clear()
+        finally:
+            # Las llamadas vencidas siguen en su hilo hasta que responda el proveedor; no se esperan
+            pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("🤖 %s agentes del informe en %.1fs (concurrencia %s)", len(results), time.monotonic() - t0,
+                    self.max_workers)
+        return results
+
+
+def run_parallel(calls: Dict[str, Callable[[], Any]], default: Any = None, **kwargs: Any) -> Dict[str, Any]:
+    """Atajo para llamadas sin dependencias entre sí."""
+    executor = ReportAgentExecutor(**kwargs)
+    for name, fn in calls.items():
+        executor.add(name, fn, default=default)
+    return executor.run()
@@ -2,7 +2,6 @@ import os
 from typing import Dict, List, Tuple, Optional, Any
 from collections import defaultdict, Counter
 from datetime import datetime, timedelta
-import re
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
@@ -17,17 +16,13 @@ except Exception:  # pragma: no cover
     KMeans = None  # type: ignore
 from src.engines.openai_engine import fetch_response
 
-# Mapeo de sinónimos de marcas (alineado con backend/app.py)
-BRAND_SYNONYMS: Dict[str, List[str]] = {
-    "The Core School": ["the core", "the core school", "thecore"],
-    "U-TAD": ["u-tad", "utad"],
-    "ECAM": ["ecam"],
-    "TAI": ["tai"],
-    "CES": ["ces"],
-    "CEV": ["cev"],
-    "FX Barcelona Film School": ["fx barcelona", "fx barcelona film school", "fx animation"],
-    "Septima Ars": ["septima ars", "séptima ars"],
-}
+# Diccionario canónico de marcas compartido con la API y el polling
+from src.brands.detection import get_brand_matcher
+from src.brands.matcher import matcher_for
+from src.brands.store import brand_filter, count_mention_brands
+from src.db.vectors import fetch_vector_matrix
+from src.reports.clustering import precomputed_clusters
+from src.reports.agents import run_parallel
 
 
 def _db_url() -> str:
@@ -73,24 +68,11 @@ def _compute_previous_period(start_date: str, end_date: str) -> Tuple[str, str]:
     return _format_date(prev_start), _format_date(prev_end)
 
 
-def _compile_brand_patterns(brands: List[str]) -> List[Tuple[str, re.Pattern]]:
-    patterns: List[Tuple[str, re.Pattern]] = []
-    for brand in brands:
-        if not brand:
-            continue
-        escaped = re.escape(brand.strip())
-        patterns.append((brand, re.compile(rf"(?i)(?<!\w){escaped}(?!\w)")))
-    return patterns
-
-
 def _detect_brands(text: Optional[str], brands: List[str]) -> List[str]:
+    """Marcas de ``brands`` presentes como palabra completa en ``text`` (matcher compilado y cacheado)."""
     if not text:
         return []
-    found = set()
-    for original, pattern in _compile_brand_patterns(brands):
-        if pattern.search(text or ""):
-            found.add(original)
-    return list(found)
+    return matcher_for(tuple(brands)).find(text)
 
 
 def get_kpi_summary(
@@ -331,11 +313,7 @@ def get_share_of_voice_and_trends(
 
         brand_counts_by_period: List[Dict] = []
         competitors_global: Counter = Counter()
-        # Preparar sinónimos en minúsculas para detección robusta
-        norm_synonyms: Dict[str, List[str]] = {
-            canon: [canon.lower()] + [s.lower() for s in alts]
-            for canon, alts in BRAND_SYNONYMS.items()
-        }
+        matcher = get_brand_matcher()
 
         for (p_start, p_end) in periods:
             rows = session.execute(sql, {"project_id": project_id, "start_date": p_start, "end_date": p_end}).mappings().all()
@@ -347,43 +325,8 @@ def get_share_of_voice_and_trends(
             for r in rows:
                 category = str(r["category"]) if r["category"] is not None else "Desconocida"
                 key_topics = r.get("key_topics") or []
-                resp = (r.get("resp") or "").lower()
-                title = (r.get("title") or "").lower()
-                payload = r.get("payload") or {}
                 sent = float(r.get("sentiment") or 0.0)
-
-                detected: List[str] = []
-                try:
-                    # key_topics: coincidencia exacta con sinónimos normalizados
-                    try_topics = [str(t).strip().lower() for t in (key_topics or [])]
-                    # payload.brands: puede ser lista de objetos o strings
-                    payload_brands: List[str] = []
-                    try:
-                        raw_b = payload.get('brands') if isinstance(payload, dict) else []
-                        if isinstance(raw_b, list):
-                            for b in raw_b:
-                                if isinstance(b, dict):
-                                    name = (b.get('name') or '').strip().lower()
-                                    if name:
-                                        payload_brands.append(name)
-                                elif isinstance(b, str):
-                                    payload_brands.append(b.strip().lower())
-                    except Exception:
-                        pass
-
-                    for canon, syns in norm_synonyms.items():
-                        hit = False
-                        for s in syns:
-                            if s in try_topics:
-                                hit = True; break
-                            if s and (s in resp or s in title):
-                                hit = True; break
-                            if s in payload_brands:
-                                hit = True; break
-                        if hit:
-                            detected.append(canon)
-                except Exception:
-                    detected = []
+                detected = matcher.detect(key_topics, r.get("resp"), r.get("title"), r.get("payload"))
 
                 if detected:
                     seen = set()
@@ -477,28 +420,16 @@ def get_visibility_series(
             start_date = start_dt.strftime("%Y-%m-%d")
             end_date = end_dt.strftime("%Y-%m-%d")
 
-        # Preparar sinónimos + patrones LIKE
-        syns = [client_brand.lower()] + [s.lower() for s in BRAND_SYNONYMS.get(client_brand, [])]
-        likes = [f"%{s}%" for s in syns]
+        # Misma detección que /api/visibility: mention_brands o LIKE legacy si la marca no está en el diccionario
+        brand_sql, brand_params = brand_filter(client_brand, named=True)
 
         # Replicar lógica del endpoint /api/visibility (granularity=day)
         sql = text(
-            """
+            f"""
             WITH rows AS (
                 SELECT 
                     DATE(m.created_at) AS d,
-                    (
-                        EXISTS (
-                            SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                            WHERE LOWER(TRIM(kt)) = ANY(:syns)
-                        )
-                        OR LOWER(COALESCE(m.response,'')) LIKE ANY(:likes)
-                        OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(:likes)
-                        OR EXISTS (
-                            SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                            WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(:syns)
-                        )
-                    ) AS is_brand
+                    {brand_sql} AS is_brand
                 FROM mentions m
                 JOIN queries q ON q.id = m.query_id
                 LEFT JOIN insights i ON i.id = m.generated_insight_id
@@ -514,7 +445,7 @@ def get_visibility_series(
             """
         )
 
-        rows = session.execute(sql, {"start_date": start_date, "end_date": end_date, "syns": syns, "likes": likes}).all()
+        rows = session.execute(sql, {"start_date": start_date, "end_date": end_date, **brand_params}).all()
 
         # Mapear resultados por día
         by_day: Dict[str, tuple[int, int]] = {str(d): (int(b or 0), int(t or 0)) for d, b, t in rows}
@@ -540,6 +471,33 @@ def get_visibility_series(
             session.close()
 
 
+_WINDOW_SQL = "m.created_at >= %s::date AND m.created_at < (%s::date + INTERVAL '1 day')"
+
+
+def _window_brand_counts(session: Session, start_date: Optional[str], end_date: Optional[str]) -> tuple[Counter, int]:
+    """(menciones por marca, total de menciones) de la ventana, agregados en SQL."""
+    params = (start_date or "1970-01-01", end_date or "2999-12-31")
+    # Cursor DBAPI de la misma conexión/transacción de la sesión (permite cursor de servidor)
+    cur = session.connection().connection.cursor()
+    try:
+        counts = count_mention_brands(cur, _WINDOW_SQL, params)
+        cur.execute(f"SELECT COUNT(*) FROM mentions m JOIN queries q ON q.id = m.query_id WHERE {_WINDOW_SQL}", params)
+        total = int((cur.fetchone() or [0])[0] or 0)
+    finally:
+        cur.close()
+    return counts, total
+
+
+def get_total_mentions(session: Session, *, start_date: Optional[str], end_date: Optional[str]) -> int:
+    """Total de menciones del periodo (todas las queries)."""
+    row = session.execute(text("""
+        SELECT COUNT(*) FROM mentions m
+        WHERE m.created_at >= CAST(:start AS date)
+          AND m.created_at < (CAST(:end AS date) + INTERVAL '1 day')
+    """), {"start": start_date or "1970-01-01", "end": end_date or "2999-12-31"}).first()
+    return int(row[0] if row and row[0] is not None else 0)
+
+
 def get_industry_sov_ranking(
     session: Optional[Session],
     *,
@@ -552,57 +510,7 @@ def get_industry_sov_ranking(
         session = get_session()
         own_session = True
     try:
-        # Traer también key_topics para replicar la detección del endpoint
-        sql = text(
-            """
-            SELECT
-              m.key_topics,
-              LOWER(COALESCE(m.response,'')) AS resp,
-              LOWER(COALESCE(m.source_title,'')) AS title,
-              i.payload
-            FROM mentions m
-            JOIN queries q ON q.id = m.query_id
-            LEFT JOIN insights i ON i.id = m.generated_insight_id
-            WHERE m.created_at >= CAST(:start_date AS date)
-              AND m.created_at < (CAST(:end_date AS date) + INTERVAL '1 day')
-            """
-        )
-        rows = session.execute(sql, {"start_date": start_date or "1970-01-01", "end_date": end_date or "2999-12-31"}).mappings().all()
-        from collections import Counter
-        counts: Counter[str] = Counter()
-        # Sinónimos normalizados (canónico -> lista de variantes en minúsculas)
-        norm_synonyms: Dict[str, list[str]] = {c: [c.lower()] + [s.lower() for s in alts] for c, alts in BRAND_SYNONYMS.items()}
-        for r in rows:
-            payload = r.get("payload") or {}
-            resp = (r.get("resp") or "").lower()
-            title = (r.get("title") or "").lower()
-            # key_topics puede ser TEXT[] o JSONB; normalizamos a lista en minúsculas
-            try_topics: list[str] = []
-            try:
-                if isinstance(r.get("key_topics"), (list, tuple)):
-                    try_topics = [str(t).strip().lower() for t in (r.get("key_topics") or [])]
-            except Exception:
-                try_topics = []
-            payload_brands: list[str] = []
-            if isinstance(payload, dict):
-                raw_b = payload.get("brands")
-                if isinstance(raw_b, list):
-                    for b in raw_b:
-                        if isinstance(b, dict):
-                            name = (b.get("name") or "").strip().lower()
-                            if name:
-                                payload_brands.append(name)
-                        elif isinstance(b, str):
-                            payload_brands.append(b.strip().lower())
-            seen = set()
-            for canon, syns in norm_synonyms.items():
-                if canon in seen:
-                    continue
-                for s in syns:
-                    if s in try_topics or (s and (s in resp or s in title or s in payload_brands)):
-                        counts[canon] += 1
-                        seen.add(canon)
-                        break
+        counts, _ = _window_brand_counts(session, start_date, end_date)
         total = sum(counts.values()) or 1
         pairs = sorted(counts.items(), key=lambda x: x[1], reverse=True)
         return [(name, round(100.0 * cnt / total, 1)) for name, cnt in pairs]
@@ -623,57 +531,9 @@ def get_visibility_ranking(
         session = get_session()
         own_session = True
     try:
-        # Traer también key_topics para replicar la detección del endpoint
-        sql = text(
-            """
-            SELECT
-              m.key_topics,
-              LOWER(COALESCE(m.response,'')) AS resp,
-              LOWER(COALESCE(m.source_title,'')) AS title,
-              i.payload
-            FROM mentions m
-            JOIN queries q ON q.id = m.query_id
-            LEFT JOIN insights i ON i.id = m.generated_insight_id
-            WHERE m.created_at >= CAST(:start_date AS date)
-              AND m.created_at < (CAST(:end_date AS date) + INTERVAL '1 day')
-            """
-        )
-        rows = session.execute(sql, {"start_date": start_date or "1970-01-01", "end_date": end_date or "2999-12-31"}).mappings().all()
-        from collections import Counter
-        total_by_brand: Counter[str] = Counter()
-        # Sinónimos normalizados
-        norm_synonyms: Dict[str, list[str]] = {c: [c.lower()] + [s.lower() for s in alts] for c, alts in BRAND_SYNONYMS.items()}
-        for r in rows:
-            payload = r.get("payload") or {}
-            resp = (r.get("resp") or "").lower()
-            title = (r.get("title") or "").lower()
-            try_topics: list[str] = []
-            try:
-                if isinstance(r.get("key_topics"), (list, tuple)):
-                    try_topics = [str(t).strip().lower() for t in (r.get("key_topics") or [])]
-            except Exception:
-                try_topics = []
-            payload_brands: list[str] = []
-            if isinstance(payload, dict):
-                raw_b = payload.get("brands")
-                if isinstance(raw_b, list):
-                    for b in raw_b:
-                        if isinstance(b, dict):
-                            name = (b.get("name") or "").strip().lower()
-                            if name:
-                                payload_brands.append(name)
-                        elif isinstance(b, str):
-                            payload_brands.append(b.strip().lower())
-            detected: list[str] = []
-            for canon, syns in norm_synonyms.items():
-                for s in syns:
-                    if s in try_topics or (s and (s in resp or s in title or s in payload_brands)):
-                        detected.append(canon)
-                        break
-            for canon in set(detected):
-                total_by_brand[canon] += 1
-        total_responses = len(rows) or 1
-        pairs = sorted(total_by_brand.items(), key=lambda x: x[1], reverse=True)
+        counts, total_responses = _window_brand_counts(session, start_date, end_date)
+        total_responses = total_responses or 1
+        pairs = sorted(counts.items(), key=lambda x: x[1], reverse=True)
         return [(name, round(100.0 * cnt / total_responses, 1)) for name, cnt in pairs]
     finally:
         if own_session:
@@ -696,8 +556,7 @@ def get_sentiment_positive_series(
         # Resolver marca
         brow = session.execute(text("SELECT COALESCE(brand, topic, 'Unknown') AS b FROM queries WHERE id=:pid"), {"pid": int(project_id)}).first()
         client_brand = (brow[0] if brow else "Unknown")
-        syns = [client_brand.lower()]
-        syns.extend([s.lower() for s in BRAND_SYNONYMS.get(client_brand, [])])
+        brand_sql, brand_params = brand_filter(client_brand, named=True)
 
         if not start_date:
             start_date = "1970-01-01"
@@ -705,23 +564,12 @@ def get_sentiment_positive_series(
             end_date = "2999-12-31"
 
         sql = text(
-            """
+            f"""
             WITH rows AS (
                 SELECT 
                     DATE(m.created_at) AS d,
                     COALESCE(m.sentiment, 0) AS sent,
-                    (
-                        EXISTS (
-                            SELECT 1 FROM jsonb_array_elements_text(COALESCE(to_jsonb(m.key_topics),'[]'::jsonb)) kt
-                            WHERE LOWER(TRIM(kt)) = ANY(:syns)
-                        )
-                        OR LOWER(COALESCE(m.response,'')) LIKE ANY(:likes)
-                        OR LOWER(COALESCE(m.source_title,'')) LIKE ANY(:likes)
-                        OR EXISTS (
-                            SELECT 1 FROM jsonb_array_elements(COALESCE(i.payload->'brands','[]'::jsonb)) b
-                            WHERE LOWER(TRIM(CASE WHEN jsonb_typeof(b)='object' THEN COALESCE(b->>'name','') ELSE TRIM(BOTH '"' FROM b::text) END)) = ANY(:syns)
-                        )
-                    ) AS is_brand
+                    {brand_sql} AS is_brand
                 FROM mentions m
                 JOIN queries q ON q.id = m.query_id
                 LEFT JOIN insights i ON i.id = m.generated_insight_id
@@ -736,8 +584,7 @@ def get_sentiment_positive_series(
             ORDER BY d
             """
         )
-        likes = [f"%{s}%" for s in syns]
-        rows = session.execute(sql, {"syns": syns, "likes": likes, "start_date": start_date, "end_date": end_date}).all()
+        rows = session.execute(sql, {**brand_params, "start_date": start_date, "end_date": end_date}).all()
         series: list[tuple[str, float]] = []
         for d, pos, tot in rows:
             pct = (float(pos or 0) / float(max(tot or 0, 1))) * 100.0
@@ -963,16 +810,6 @@ class ClusterResult(TypedDict):
     example_mentions: list[ClusterMention]
 
 
-def _parse_vector_text(vec_text: str) -> list[float]:
-    # Espera formato "[v1,v2,...]"; robustez ante espacios
-    s = vec_text.strip()
-    if s.startswith('[') and s.endswith(']'):
-        s = s[1:-1]
-    if not s:
-        return []
-    return [float(x) for x in s.replace(' ', '').split(',') if x]
-
-
 def aggregate_clusters_for_report(
     session: Optional[Session],
     project_id: int,
@@ -984,12 +821,20 @@ def aggregate_clusters_for_report(
     """
     Recupera menciones con embedding no nulo en el periodo, ejecuta clustering (KMeans) y
     devuelve clusters con metadatos y ejemplos representativos.
+
+    Si el proyecto ya tiene centroides persistidos (src/reports/clustering.py) se leen los
+    clusters precalculados de todo el periodo y ``max_rows`` no aplica; el KMeans en línea
+    sobre las ``max_rows`` menciones más recientes queda como fallback.
     """
     own_session = False
     if session is None:
         session = get_session()
         own_session = True
     try:
+        precomputed = precomputed_clusters(session, project_id, start_date=start_date, end_date=end_date)
+        if precomputed is not None:
+            return precomputed  # type: ignore[return-value]
+
         where = [
             "q.id = :project_id",
             "m.embedding IS NOT NULL",
@@ -1009,8 +854,7 @@ def aggregate_clusters_for_report(
                    m.sentiment,
                    m.source,
                    m.source_domain,
-                   m.created_at,
-                   m.embedding::text AS emb
+                   m.created_at
             FROM mentions m
             JOIN queries q ON q.id = m.query_id
             WHERE {' AND '.join(where)}
@@ -1022,13 +866,22 @@ def aggregate_clusters_for_report(
         if not rows:
             return []
 
+        # Embeddings en binario (COPY) directamente a una matriz float32, sin parsear texto
+        ids = [int(r[0]) for r in rows]
+        cur = session.connection().connection.cursor()
+        try:
+            vec_ids, vectors = fetch_vector_matrix(
+                cur, "SELECT m.id, m.embedding FROM mentions m WHERE m.id = ANY(%s) AND m.embedding IS NOT NULL", (ids,)
+            )
+        finally:
+            cur.close()
+        row_of = {int(rid): i for i, rid in enumerate(vec_ids.tolist())}
+
         mentions: list[ClusterMention] = []
-        vectors: list[list[float]] = []
-        for rid, summary, sent, source, domain, created_at, emb_txt in rows:
-            if not isinstance(emb_txt, str):
-                continue
-            vec = _parse_vector_text(emb_txt)
-            if not vec:
+        order: list[int] = []
+        for rid, summary, sent, source, domain, created_at in rows:
+            i = row_of.get(int(rid))
+            if i is None:
                 continue
             mentions.append({
                 "id": int(rid),
@@ -1038,12 +891,13 @@ def aggregate_clusters_for_report(
                 "domain": str(domain) if domain is not None else None,
                 "created_at": str(created_at),
             })
-            vectors.append(vec)
+            order.append(i)
 
-        if not mentions or not vectors:
+        if not mentions or vectors.shape[1] == 0:
             return []
 
-        X = np.array(vectors, dtype=np.float32)
+        # Mismo orden que las menciones (created_at DESC)
+        X = vectors[np.asarray(order, dtype=np.intp)]
         # Normalizar para usar similitud coseno de forma eficiente con dot product
         norms = np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
         Xn = X / norms
@@ -1105,53 +959,13 @@ def get_full_report_data(
     """
     Devuelve un objeto híbrido con KPIs + series + SOV + clusters (con ejemplos) listo
     para ser consumido por el generador de informes.
+
+    Sale de la instantánea memoizada del informe (src/reports/snapshot.py): los
+    bloques ya calculados para el mismo proyecto y rango no se recalculan.
     """
-    session = get_session()
-    try:
-        # KPIs y métricas (aplicar rango temporal si viene informado)
-        kpis = get_kpi_summary(session, project_id, start_date=start_date, end_date=end_date)
-        evo = get_sentiment_evolution(session, project_id, start_date=start_date, end_date=end_date)
-        by_cat = get_sentiment_by_category(session, project_id, start_date=start_date, end_date=end_date)
-        top5, bottom5 = get_topics_by_sentiment(session, project_id, start_date=start_date, end_date=end_date)
-        sov_trends = get_share_of_voice_and_trends(session, project_id, start_date=start_date, end_date=end_date)
-
-        # Clusters
-        clusters = aggregate_clusters_for_report(session, project_id, start_date=start_date, end_date=end_date, max_rows=max_rows)
-
-        # Oportunidades competitivas (tabla)
-        def _resolve_main_brand(sess: Session, pid: int) -> str:
-            row = sess.execute(text("SELECT COALESCE(brand, topic, 'Unknown') FROM queries WHERE id=:pid"), {"pid": pid}).first()
-            return str(row[0]) if row and row[0] is not None else "Unknown"
-
-        main_brand = _resolve_main_brand(session, project_id)
-        competitive_opps = get_competitive_opportunities(
-            session,
-            project_id,
-            start_date=start_date or "1970-01-01",
-            end_date=end_date or "2999-12-31",
-            main_brand=main_brand,
-            top_n=10,
-        )
+    from .snapshot import get_report_snapshot
 
-        # Serie global de visibilidad para el dashboard
-        visibility_series = get_visibility_series(session, project_id, start_date=start_date, end_date=end_date)
-
-        return {
-            "project_id": project_id,
-            "kpis": kpis,
-            "time_series": {
-                "sentiment_per_day": evo,
-            },
-            "visibility_timeseries": visibility_series,
-            "sentiment_by_category": by_cat,
-            "topics_top5": top5,
-            "topics_bottom5": bottom5,
-            "sov": sov_trends,
-            "clusters": clusters,
-            "competitive_opportunities": competitive_opps,
-        }
-    finally:
-        session.close()
+    return get_report_snapshot(project_id, start_date, end_date).full_report_data(max_rows)
 
 
 class Aggregator:
@@ -1223,23 +1037,25 @@ def get_competitive_opportunities(
     candidates.sort(key=lambda x: x.get("#", 0), reverse=True)
     selected = candidates[:max(1, min(top_n, len(candidates)))]
 
-    # Generar acción de contenido con IA
-    enriched: List[Dict[str, Any]] = []
-    for item in selected:
-        competitor = item["Competidor"]
-        weakness_topic = item["Debilidad Detectada"]
+    # Generar acción de contenido con IA: una llamada por competidor, en paralelo
+    def _idea(competitor: str, weakness_topic: str) -> str:
         prompt = (
             f"Eres un estratega de contenidos. Un competidor llamado '{competitor}' tiene fuerte presencia en el tema "
             f"'{weakness_topic}'. Propón una acción de contenido concreta para que '{main_brand}' capitalice esta situación. "
             f"Devuelve una única idea en una frase, clara y accionable."
         )
-        try:
-            idea = fetch_response(prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=80)
-        except Exception:
-            idea = ""  # Fallback silencioso
+        return fetch_response(prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=80, use_cache=True)
+
+    ideas = run_parallel(
+        {str(i): (lambda it=item: _idea(it["Competidor"], it["Debilidad Detectada"])) for i, item in enumerate(selected)},
+        default="",  # Fallback silencioso
+    )
+    enriched: List[Dict[str, Any]] = []
+    for i, item in enumerate(selected):
+        idea = ideas.get(str(i)) or ""
         enriched.append({
-            "Competidor": competitor,
-            "Debilidad Detectada": weakness_topic,
+            "Competidor": item["Competidor"],
+            "Debilidad Detectada": item["Debilidad Detectada"],
             "#": item["#"],
             "Acción de Contenido": (idea or "Producir una pieza diferenciadora enfocado en el tema.").strip(),
         })
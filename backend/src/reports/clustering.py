@@ -0,0 +1,416 @@
+"""
+Clustering incremental de los embeddings de menciones.
+
+Por proyecto (``queries.id``) se guardan los centroides en
+``mention_cluster_models`` y cada mención lleva su ``cluster_id`` (más la
+distancia coseno a su centroide y la versión del modelo) en ``mentions``:
+
+    • fit_project_clusters()    → MiniBatchKMeans con ``partial_fit`` sobre TODO el
+                                  histórico, por bloques de ``CLUSTER_CHUNK_ROWS``
+                                  (memoria acotada), y asignación de cada mención
+    • assign_mentions()         → el writer del polling asigna las menciones nuevas al
+                                  centroide más cercano y actualiza ese centroide en
+                                  línea (media incremental), sin reajustar
+    • refresh_clusters()        → reajusta solo los proyectos sin modelo, con mucho
+                                  crecimiento desde el último ajuste, con deriva (la
+                                  distancia media de lo asignado supera la del ajuste)
+                                  o con un ajuste más antiguo que ``CLUSTER_REFIT_DAYS``;
+                                  después asigna las menciones sin la versión vigente
+                                  (embeddings rellenados más tarde, o asignadas por el
+                                  writer mientras corría un reajuste)
+    • precomputed_clusters()    → clusters del periodo leídos en SQL para informes e
+                                  /api/insights (sin KMeans en la petición)
+
+``scripts/refit_clusters.py`` fuerza el reajuste; el polling llama a
+``refresh_clusters`` al terminar cada ciclo.
+"""
+
+import logging
+import os
+from collections import Counter
+from math import sqrt
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+
+from src.db.vectors import fetch_vector_matrix
+
+try:
+    from sklearn.cluster import MiniBatchKMeans
+except Exception:  # pragma: no cover
+    MiniBatchKMeans = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+CLUSTERS_ENABLED = os.getenv("CLUSTERS_ENABLED", "true").lower() in {"1", "true", "yes"}
+CLUSTER_CHUNK_ROWS = int(os.getenv("CLUSTER_CHUNK_ROWS", "5000"))
+CLUSTER_MAX_K = int(os.getenv("CLUSTER_MAX_K", "12"))
+CLUSTER_REFIT_GROWTH = float(os.getenv("CLUSTER_REFIT_GROWTH", "0.25"))
+CLUSTER_DRIFT_THRESHOLD = float(os.getenv("CLUSTER_DRIFT_THRESHOLD", "0.2"))
+CLUSTER_DRIFT_MIN_ROWS = int(os.getenv("CLUSTER_DRIFT_MIN_ROWS", "50"))
+CLUSTER_REFIT_DAYS = int(os.getenv("CLUSTER_REFIT_DAYS", "7"))
+CLUSTER_EXAMPLES = int(os.getenv("CLUSTER_EXAMPLES", "20"))
+
+_VECTORS_SQL = "SELECT m.id, m.embedding FROM mentions m WHERE m.id = ANY(%s) AND m.embedding IS NOT NULL"
+
+
+def ensure_cluster_tables(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mention_cluster_models (
+            project_id INT PRIMARY KEY,
+            version INT NOT NULL DEFAULT 1,
+            k INT NOT NULL,
+            dim INT NOT NULL,
+            centroids BYTEA NOT NULL,
+            counts BIGINT[] NOT NULL,
+            fitted_rows INT NOT NULL DEFAULT 0,
+            mean_distance DOUBLE PRECISION NOT NULL DEFAULT 0,
+            assigned_since_fit INT NOT NULL DEFAULT 0,
+            drift_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            fitted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+    cur.execute("ALTER TABLE mentions ADD COLUMN IF NOT EXISTS cluster_id INT")
+    cur.execute("ALTER TABLE mentions ADD COLUMN IF NOT EXISTS cluster_version INT")
+    cur.execute("ALTER TABLE mentions ADD COLUMN IF NOT EXISTS cluster_distance REAL")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mentions_query_cluster ON mentions (query_id, cluster_version, cluster_id)"
+    )
+
+
+def choose_k(n: int) -> int:
+    """Mismo criterio que el clustering del informe: ~sqrt(n/2) acotado a [2, CLUSTER_MAX_K]."""
+    return int(max(2, min(CLUSTER_MAX_K, round(sqrt(n / 2)))))
+
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+
+
+def nearest_centroids(Xn: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(cluster, distancia coseno) de cada fila normalizada de ``Xn``."""
+    sims = Xn @ _normalize(centroids).T
+    labels = np.argmax(sims, axis=1)
+    return labels, (1.0 - sims[np.arange(len(labels)), labels]).astype(np.float32)
+
+
+def _chunks(ids: Sequence[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(ids), max(1, size)):
+        yield list(ids[i:i + size])
+
+
+def _load_vectors(cur, ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    vec_ids, X = fetch_vector_matrix(cur, _VECTORS_SQL, (list(ids),))
+    return vec_ids, _normalize(X) if X.size else X
+
+
+def _write_assignments(cur, version: int, ids: np.ndarray, labels: np.ndarray, distances: np.ndarray) -> None:
+    execute_values(
+        cur,
+        """
+        UPDATE mentions m
+        SET cluster_id = v.cluster_id, cluster_distance = v.distance, cluster_version = %s
+        FROM (VALUES %%s) AS v(id, cluster_id, distance)
+        WHERE m.id = v.id
+        """ % int(version),
+        list(zip(ids.tolist(), labels.tolist(), distances.tolist())),
+        template="(%s, %s, %s::real)",
+        page_size=CLUSTER_CHUNK_ROWS,
+    )
+
+
+def fit_project_clusters(cur, project_id: int) -> Optional[Dict[str, Any]]:
+    """Ajusta los centroides del proyecto con todo su histórico y reasigna sus menciones."""
+    cur.execute(
+        "SELECT id FROM mentions WHERE query_id = %s AND embedding IS NOT NULL ORDER BY id", (int(project_id),)
+    )
+    ids = [int(r[0]) for r in cur.fetchall()]
+    if len(ids) < 2:
+        return None
+    k = choose_k(len(ids))
+
+    # 1ª pasada: ajuste por bloques (memoria acotada a CLUSTER_CHUNK_ROWS vectores)
+    if MiniBatchKMeans is not None:
+        km = MiniBatchKMeans(n_clusters=k, batch_size=1024, random_state=42)
+        fitted = False
+        for chunk in _chunks(ids, max(CLUSTER_CHUNK_ROWS, k)):
+            _, Xn = _load_vectors(cur, chunk)
+            if Xn.shape[0] >= (1 if fitted else k):
+                km.partial_fit(Xn)
+                fitted = True
+        if not fitted:
+            return None
+        centroids = _normalize(km.cluster_centers_.astype(np.float32))
+    else:
+        # Sin sklearn: un único cluster (media del histórico)
+        total, n = None, 0
+        for chunk in _chunks(ids, CLUSTER_CHUNK_ROWS):
+            _, Xn = _load_vectors(cur, chunk)
+            if Xn.size:
+                total = Xn.sum(axis=0) if total is None else total + Xn.sum(axis=0)
+                n += Xn.shape[0]
+        if not n:
+            return None
+        centroids = _normalize((total / n)[None, :].astype(np.float32))
+
+    cur.execute("SELECT version FROM mention_cluster_models WHERE project_id = %s FOR UPDATE", (int(project_id),))
+    row = cur.fetchone()
+    version = (int(row[0]) + 1) if row else 1
+
+    # 2ª pasada: asignación de cada mención al centroide final
+    counts = np.zeros(centroids.shape[0], dtype=np.int64)
+    dist_sum, assigned = 0.0, 0
+    for chunk in _chunks(ids, CLUSTER_CHUNK_ROWS):
+        vec_ids, Xn = _load_vectors(cur, chunk)
+        if not Xn.size:
+            continue
+        labels, distances = nearest_centroids(Xn, centroids)
+        _write_assignments(cur, version, vec_ids, labels, distances)
+        counts += np.bincount(labels, minlength=centroids.shape[0])
+        dist_sum += float(distances.sum())
+        assigned += int(labels.size)
+
+    model = {
+        "project_id": int(project_id), "version": version, "k": int(centroids.shape[0]),
+        "dim": int(centroids.shape[1]), "centroids": centroids, "counts": counts,
+        "fitted_rows": assigned, "mean_distance": dist_sum / max(assigned, 1),
+    }
+    cur.execute(
+        """
+        INSERT INTO mention_cluster_models
+            (project_id, version, k, dim, centroids, counts, fitted_rows, mean_distance,
+             assigned_since_fit, drift_sum, fitted_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 0, 0, NOW())
+        ON CONFLICT (project_id) DO UPDATE SET
+            version = EXCLUDED.version, k = EXCLUDED.k, dim = EXCLUDED.dim, centroids = EXCLUDED.centroids,
+            counts = EXCLUDED.counts, fitted_rows = EXCLUDED.fitted_rows, mean_distance = EXCLUDED.mean_distance,
+            assigned_since_fit = 0, drift_sum = 0, fitted_at = NOW()
+        """,
+        (model["project_id"], version, model["k"], model["dim"], _centroid_bytes(centroids),
+         counts.tolist(), assigned, model["mean_distance"]),
+    )
+    logger.info("🧩 Clusters del proyecto %s: k=%s sobre %s menciones (v%s)", project_id, model["k"], assigned, version)
+    return model
+
+
+def _centroid_bytes(centroids: np.ndarray) -> bytes:
+    return psycopg2.Binary(np.ascontiguousarray(centroids, dtype="<f4").tobytes())
+
+
+def _centroids_from(raw: Any, k: int, dim: int) -> np.ndarray:
+    return np.frombuffer(bytes(raw), dtype="<f4").reshape(int(k), int(dim)).astype(np.float32)
+
+
+def assign_mentions(cur, mention_ids: Sequence[int]) -> int:
+    """Asigna menciones recién guardadas al centroide más cercano de su proyecto.
+
+    Cada centroide se mueve hacia sus nuevas menciones con la media incremental
+    (c += (x - c) / n_c) y se acumula la distancia para detectar deriva. Los
+    proyectos sin modelo se quedan sin asignar hasta el siguiente ``refresh_clusters``.
+    """
+    if not mention_ids:
+        return 0
+    cur.execute(
+        "SELECT id, query_id FROM mentions WHERE id = ANY(%s) AND embedding IS NOT NULL", (list(mention_ids),)
+    )
+    project_of = {int(mid): int(pid) for mid, pid in cur.fetchall() if pid is not None}
+    if not project_of:
+        return 0
+    cur.execute(
+        """
+        SELECT project_id, version, k, dim, centroids, counts FROM mention_cluster_models
+        WHERE project_id = ANY(%s) ORDER BY project_id FOR UPDATE
+        """,
+        (sorted(set(project_of.values())),),
+    )
+    models = {int(r[0]): r for r in cur.fetchall()}
+    ids = [mid for mid, pid in project_of.items() if pid in models]
+    if not ids:
+        return 0
+    vec_ids, Xn = _load_vectors(cur, ids)
+    if not Xn.size:
+        return 0
+
+    assigned = 0
+    vec_projects = np.array([project_of[int(i)] for i in vec_ids.tolist()])
+    for pid, (_, version, k, dim, raw, counts) in models.items():
+        mask = vec_projects == pid
+        if not mask.any() or Xn.shape[1] != int(dim):
+            continue
+        X = Xn[mask]
+        centroids = _centroids_from(raw, k, dim).copy()
+        counts = np.asarray(counts or [0] * int(k), dtype=np.int64)
+        labels, distances = nearest_centroids(X, centroids)
+        for label, x in zip(labels.tolist(), X):
+            counts[label] += 1
+            centroids[label] += (x - centroids[label]) / counts[label]
+        _write_assignments(cur, int(version), vec_ids[mask], labels, distances)
+        cur.execute(
+            """
+            UPDATE mention_cluster_models
+            SET centroids = %s, counts = %s, assigned_since_fit = assigned_since_fit + %s,
+                drift_sum = drift_sum + %s
+            WHERE project_id = %s
+            """,
+            (_centroid_bytes(_normalize(centroids)), counts.tolist(), int(labels.size), float(distances.sum()), pid),
+        )
+        assigned += int(labels.size)
+    return assigned
+
+
+def projects_needing_refit(cur) -> List[int]:
+    """Proyectos con embeddings y sin modelo, con crecimiento, con deriva o con un ajuste antiguo."""
+    cur.execute(
+        """
+        SELECT q.id
+        FROM queries q
+        LEFT JOIN mention_cluster_models c ON c.project_id = q.id
+        WHERE EXISTS (SELECT 1 FROM mentions m WHERE m.query_id = q.id AND m.embedding IS NOT NULL)
+          AND (
+                c.project_id IS NULL
+             OR c.assigned_since_fit > c.fitted_rows * %s
+             OR (c.assigned_since_fit >= %s AND c.drift_sum / c.assigned_since_fit > c.mean_distance * (1 + %s))
+             OR c.fitted_at < NOW() - make_interval(days => %s)
+          )
+        ORDER BY q.id
+        """,
+        (CLUSTER_REFIT_GROWTH, CLUSTER_DRIFT_MIN_ROWS, CLUSTER_DRIFT_THRESHOLD, CLUSTER_REFIT_DAYS),
+    )
+    return [int(r[0]) for r in cur.fetchall()]
+
+
+def assign_pending_mentions(cur, project_ids: Optional[Sequence[int]] = None) -> int:
+    """Asigna las menciones con embedding cuya ``cluster_version`` no es la del modelo de su proyecto.
+
+    Recorre por ``id`` (keyset) en bloques de ``CLUSTER_CHUNK_ROWS``, así las que
+    no se puedan asignar (p.ej. otra dimensión) no se vuelven a leer.
+    """
+    scope, scope_params = "", []
+    if project_ids is not None:
+        scope, scope_params = " AND c.project_id = ANY(%s)", [[int(p) for p in project_ids]]
+    last_id, assigned = 0, 0
+    while True:
+        cur.execute(
+            f"""
+            SELECT m.id FROM mentions m
+            JOIN mention_cluster_models c ON c.project_id = m.query_id
+            WHERE m.embedding IS NOT NULL
+              AND m.cluster_version IS DISTINCT FROM c.version
+              AND m.id > %s{scope}
+            ORDER BY m.id
+            LIMIT %s
+            """,
+            tuple([last_id] + scope_params + [CLUSTER_CHUNK_ROWS]),
+        )
+        ids = [int(r[0]) for r in cur.fetchall()]
+        if not ids:
+            return assigned
+        assigned += assign_mentions(cur, ids)
+        last_id = ids[-1]
+
+
+def refresh_clusters(cur, project_ids: Optional[Sequence[int]] = None) -> int:
+    """Reajusta ``project_ids`` (o los que lo necesiten) y asigna las menciones pendientes.
+
+    Devuelve los proyectos ajustados; commit del que llama. Lo asignado cuenta en
+    ``assigned_since_fit``, de modo que un relleno grande dispara el siguiente reajuste.
+    """
+    targets = list(project_ids) if project_ids is not None else projects_needing_refit(cur)
+    done = 0
+    for pid in targets:
+        if fit_project_clusters(cur, pid) is not None:
+            done += 1
+    pending = assign_pending_mentions(cur, project_ids)
+    if pending:
+        logger.info("🧩 %s menciones asignadas a los clusters vigentes", pending)
+    return done
+
+
+# ───────────────────────── Lectura para informes ─────────────────────────
+def precomputed_clusters(session, project_id: int, *, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """Clusters del periodo a partir de ``mentions.cluster_id`` (todo el histórico del rango, sin tope de filas).
+
+    Devuelve None si el proyecto aún no tiene modelo (quien llama recurre al KMeans en línea).
+    """
+    from sqlalchemy import text
+
+    if not CLUSTERS_ENABLED:
+        return None
+    try:
+        model = session.execute(
+            text("SELECT version, k, dim, centroids FROM mention_cluster_models WHERE project_id = :pid"),
+            {"pid": int(project_id)},
+        ).first()
+    except Exception:
+        session.rollback()
+        return None
+    if not model:
+        return None
+    version, k, dim, raw = model
+    centroids = _centroids_from(raw, k, dim)
+
+    where = ["m.query_id = :pid", "m.cluster_version = :version", "m.cluster_id IS NOT NULL"]
+    params: Dict[str, Any] = {"pid": int(project_id), "version": int(version), "examples": CLUSTER_EXAMPLES}
+    if start_date:
+        where.append("m.created_at >= CAST(:start AS date)")
+        params["start"] = start_date
+    if end_date:
+        where.append("m.created_at < (CAST(:end AS date) + INTERVAL '1 day')")
+        params["end"] = end_date
+    where_sql = " AND ".join(where)
+
+    stats = session.execute(text(f"""
+        SELECT m.cluster_id, COUNT(*), AVG(COALESCE(m.sentiment, 0))
+        FROM mentions m WHERE {where_sql}
+        GROUP BY m.cluster_id
+    """), params).all()
+    if not stats:
+        return []
+    sources = session.execute(text(f"""
+        SELECT m.cluster_id, COALESCE(m.source_domain, m.source, 'unknown') AS src, COUNT(*)
+        FROM mentions m WHERE {where_sql}
+        GROUP BY 1, 2
+    """), params).all()
+    examples = session.execute(text(f"""
+        SELECT cluster_id, id, summary, sentiment, source, source_domain, created_at
+        FROM (
+            SELECT m.cluster_id, m.id, m.summary, m.sentiment, m.source, m.source_domain, m.created_at,
+                   ROW_NUMBER() OVER (PARTITION BY m.cluster_id ORDER BY m.cluster_distance ASC, m.id DESC) AS rn
+            FROM mentions m WHERE {where_sql}
+        ) ranked
+        WHERE rn <= :examples
+        ORDER BY cluster_id, rn
+    """), params).all()
+
+    by_source: Dict[int, Counter] = {}
+    for cid, src, n in sources:
+        by_source.setdefault(int(cid), Counter())[src or "unknown"] += int(n)
+    by_examples: Dict[int, List[Dict[str, Any]]] = {}
+    for cid, rid, summary, sent, source, domain, created_at in examples:
+        by_examples.setdefault(int(cid), []).append({
+            "id": int(rid),
+            "summary": str(summary or ""),
+            "sentiment": float(sent or 0.0),
+            "source": str(source) if source is not None else None,
+            "domain": str(domain) if domain is not None else None,
+            "created_at": str(created_at),
+        })
+
+    results = []
+    for cid, count, avg_sent in stats:
+        cid = int(cid)
+        results.append({
+            "cluster_id": cid,
+            "centroid": [float(x) for x in centroids[cid].tolist()] if cid < len(centroids) else [],
+            "count": int(count),
+            "avg_sentiment": float(avg_sent or 0.0),
+            "top_sources": [(s, int(n)) for s, n in by_source.get(cid, Counter()).most_common(5)],
+            "example_mentions": by_examples.get(cid, []),
+        })
+    results.sort(key=lambda c: c["count"], reverse=True)
+    return results
@@ -1,4 +1,4 @@
-from typing import Dict, List, Any
+from typing import Any, Callable, Dict, List, Sequence
 import os
 from datetime import datetime
 
@@ -7,6 +7,8 @@ from . import plotter
 from . import pdf_writer
 from ..engines.openai_engine import fetch_response
 from ..engines import strategic_prompts as s_prompts
+from .agents import ReportAgentExecutor, run_parallel
+from .snapshot import ReportSnapshot, get_report_snapshot
 import json
 from typing import Optional
 
@@ -45,242 +47,261 @@ def _extract_insights_to_json(aggregated: Dict[str, Any]) -> Dict[str, Any]:
         return {}
 
 
-def _generate_full_part2_texts(insights_json: Dict[str, Any], aggregated: Dict[str, Any]) -> Dict[str, str]:
-    """Genera todos los textos de la Parte 2 invocando prompts especialistas.
-    Aplica limpieza robusta: elimina fences y, si la IA devuelve JSON, lo parsea
-    y lo transforma a párrafos/bullets legibles.
-    """
-    out: Dict[str, str] = {}
+def _strip_fences(text: str) -> str:
+    if not text:
+        return ""
+    s = text.strip()
+    # Quitar fences tipo ```json ... ``` o ``` ... ```
+    if s.startswith("```json"):
+        s = s[len("```json"):].strip()
+        if s.endswith("```"):
+            s = s[:-3].strip()
+    if s.startswith("```") and s.endswith("```"):
+        s = s[3:-3].strip()
+    # Quitar prefijo "json" si viene suelto
+    if s.lower().startswith("json ") or s.lower().startswith("json\n"):
+        s = s[4:].strip()
+    # Si hay texto previo y luego un JSON, extraer desde el primer '{' o '['
+    try:
+        first_brace = s.find('{')
+        first_brack = s.find('[')
+        pos = min([p for p in [first_brace, first_brack] if p != -1]) if (first_brace != -1 or first_brack != -1) else -1
+        if pos > 0:
+            # Si antes solo hay "json" o espacio, recortar
+            prefix = s[:pos].strip().lower()
+            if prefix in ("", "json"):
+                s = s[pos:]
+    except Exception:
+        pass
+    return s
 
-    def _strip_fences(text: str) -> str:
-        if not text:
-            return ""
-        s = text.strip()
-        # Quitar fences tipo ```json ... ``` o ``` ... ```
-        if s.startswith("```json"):
-            s = s[len("```json"):].strip()
-            if s.endswith("```"):
-                s = s[:-3].strip()
-        if s.startswith("```") and s.endswith("```"):
-            s = s[3:-3].strip()
-        # Quitar prefijo "json" si viene suelto
-        if s.lower().startswith("json ") or s.lower().startswith("json\n"):
-            s = s[4:].strip()
-        # Si hay texto previo y luego un JSON, extraer desde el primer '{' o '['
-        try:
-            first_brace = s.find('{')
-            first_brack = s.find('[')
-            pos = min([p for p in [first_brace, first_brack] if p != -1]) if (first_brace != -1 or first_brack != -1) else -1
-            if pos > 0:
-                # Si antes solo hay "json" o espacio, recortar
-                prefix = s[:pos].strip().lower()
-                if prefix in ("", "json"):
-                    s = s[pos:]
-        except Exception:
-            pass
-        return s
-
-    def _to_text_from_structure(data: Any, section: str | None = None) -> str:
-        # Especial: plan de acción
-        if section == "action_plan":
-            plan_items: list[str] = []
-            src = None
-            if isinstance(data, dict):
-                # Estructuras comunes
-                for key in ("plan_de_accion_estrategico", "plan_estrategico", "plan", "acciones", "actions"):
-                    if isinstance(data.get(key), list):
-                        src = data.get(key); break
-                if src is None and isinstance(data.get("recommendations"), list):
-                    src = data.get("recommendations")
-            elif isinstance(data, list):
-                src = data
-            if isinstance(src, list):
-                for it in src:
-                    if not isinstance(it, dict):
-                        plan_items.append("- " + str(it))
-                        continue
-                    # Caso A: item con prioridad/accion directamente
-                    pr = it.get("prioridad") or it.get("priority")
-                    ac = it.get("accion") or it.get("action") or it.get("tarea")
-                    plazo = it.get("plazo") or it.get("timeline") or it.get("due")
-                    owner = it.get("owner") or it.get("responsable")
-                    just = it.get("justificacion") or it.get("justification")
-                    recs = it.get("recomendaciones") or it.get("recommendations")
-                    if ac:
-                        bullet = "- " + (f"[{pr}] " if pr else "") + ac
-                        suffix = []
-                        if plazo: suffix.append(f"plazo: {plazo}")
-                        if owner: suffix.append(f"owner: {owner}")
-                        if suffix:
-                            bullet += " — (" + ", ".join(suffix) + ")"
-                        plan_items.append(bullet)
-                        if just:
-                            plan_items.append(f"  • Justificación: {just}")
-                        if isinstance(recs, list):
-                            for r in recs[:5]:
-                                plan_items.append("  • " + str(r))
-                        continue
-                    # Caso B: item con 'acciones' anidadas por plazo u otra dimensión
-                    acciones = it.get("acciones") or it.get("actions")
-                    plazo_item = it.get("plazo") or it.get("timeline")
-                    if isinstance(acciones, list):
-                        for a in acciones:
-                            if not isinstance(a, dict):
-                                plan_items.append("- " + str(a))
-                                continue
-                            # Aceptar más sinónimos: "descripcion" suele venir en estos items
-                            act = (
-                                a.get("accion")
-                                or a.get("action")
-                                or a.get("tarea")
-                                or a.get("descripcion")
-                                or a.get("description")
-                            )
-                            pr2 = a.get("prioridad") or a.get("priority") or pr
-                            just2 = a.get("justificacion") or a.get("justification")
-                            recs2 = a.get("recomendaciones") or a.get("recommendations")
-                            if not act:
-                                # Fallback: representación compacta sin volcar JSON crudo
-                                other_kv = []
-                                for k, v in a.items():
-                                    if k in ("prioridad", "priority", "justificacion", "justification", "recomendaciones", "recommendations"):
-                                        continue
-                                    if k in ("accion", "action", "tarea", "descripcion", "description"):
-                                        continue
-                                    other_kv.append(f"{k}: {v}")
-                                act = ", ".join(other_kv) or "(acción)"
-                            line = "- " + (f"[{pr2}] " if pr2 else "") + (f"[{plazo_item}] " if plazo_item else "") + str(act)
-                            plan_items.append(line)
-                            if just2:
-                                plan_items.append(f"  • Justificación: {just2}")
-                            if isinstance(recs2, list):
-                                for r in recs2[:5]:
-                                    plan_items.append("  • " + str(r))
-                        # Mitigación de riesgos (si existe en el mismo bloque temporal)
-                        mr = it.get("mitigacion_riesgos") or it.get("risk_mitigation")
-                        if isinstance(mr, list):
-                            for m in mr:
-                                if isinstance(m, dict):
-                                    riesgo = m.get("riesgo") or m.get("risk")
-                                    estrategia = m.get("estrategia") or m.get("strategy")
-                                    owner_m = m.get("owner") or m.get("responsable")
-                                    plazo_m = m.get("plazo") or m.get("timeline")
-                                    parts = [p for p in [riesgo, estrategia] if p]
-                                    if parts:
-                                        extra = []
-                                        if owner_m: extra.append(f"owner: {owner_m}")
-                                        if plazo_m: extra.append(f"plazo: {plazo_m}")
-                                        suffix = f" — ({', '.join(extra)})" if extra else ""
-                                        plan_items.append("- Mitigación de riesgos: " + " | ".join(parts) + suffix)
-                        continue
-                    # Fallback: volcar pares clave-valor legibles
-                    plan_items.append("- " + _to_text_from_structure(it, section))
-                return "\n".join([ln for ln in plan_items if ln.strip()])
-            # fallback genérico
-            return _to_text_from_structure({"plan": data})
-
-        # Genérico
-        if isinstance(data, str):
-            return data.strip()
-        if isinstance(data, list):
-            lines: list[str] = []
-            for it in data:
-                if isinstance(it, (dict, list)):
-                    txt = _to_text_from_structure(it, section)
-                    if txt:
-                        for ln in txt.splitlines():
-                            lines.append("- " + ln if not ln.startswith("-") else ln)
-                else:
-                    lines.append("- " + str(it))
-            return "\n".join(lines)
+
+def _to_text_from_structure(data: Any, section: str | None = None) -> str:
+    # Especial: plan de acción
+    if section == "action_plan":
+        plan_items: list[str] = []
+        src = None
         if isinstance(data, dict):
-            lines: list[str] = []
-            for k, v in data.items():
-                key = str(k).strip().replace("_", " ").capitalize()
-                if isinstance(v, (dict, list)):
-                    sub = _to_text_from_structure(v, section)
-                    if sub:
-                        lines.append(f"{key}:")
-                        lines.extend([("- " + ln if not ln.startswith("-") else ln) for ln in sub.splitlines()])
-                else:
-                    val = str(v).strip()
-                    if val:
-                        lines.append(f"- {key}: {val}")
-            return "\n".join(lines)
-        try:
-            return str(data)
-        except Exception:
-            return ""
+            # Estructuras comunes
+            for key in ("plan_de_accion_estrategico", "plan_estrategico", "plan", "acciones", "actions"):
+                if isinstance(data.get(key), list):
+                    src = data.get(key); break
+            if src is None and isinstance(data.get("recommendations"), list):
+                src = data.get("recommendations")
+        elif isinstance(data, list):
+            src = data
+        if isinstance(src, list):
+            for it in src:
+                if not isinstance(it, dict):
+                    plan_items.append("- " + str(it))
+                    continue
+                # Caso A: item con prioridad/accion directamente
+                pr = it.get("prioridad") or it.get("priority")
+                ac = it.get("accion") or it.get("action") or it.get("tarea")
+                plazo = it.get("plazo") or it.get("timeline") or it.get("due")
+                owner = it.get("owner") or it.get("responsable")
+                just = it.get("justificacion") or it.get("justification")
+                recs = it.get("recomendaciones") or it.get("recommendations")
+                if ac:
+                    bullet = "- " + (f"[{pr}] " if pr else "") + ac
+                    suffix = []
+                    if plazo: suffix.append(f"plazo: {plazo}")
+                    if owner: suffix.append(f"owner: {owner}")
+                    if suffix:
+                        bullet += " — (" + ", ".join(suffix) + ")"
+                    plan_items.append(bullet)
+                    if just:
+                        plan_items.append(f"  • Justificación: {just}")
+                    if isinstance(recs, list):
+                        for r in recs[:5]:
+                            plan_items.append("  • " + str(r))
+                    continue
+                # Caso B: item con 'acciones' anidadas por plazo u otra dimensión
+                acciones = it.get("acciones") or it.get("actions")
+                plazo_item = it.get("plazo") or it.get("timeline")
+                if isinstance(acciones, list):
+                    for a in acciones:
+                        if not isinstance(a, dict):
+                            plan_items.append("- " + str(a))
+                            continue
+                        # Aceptar más sinónimos: "descripcion" suele venir en estos items
+                        act = (
+                            a.get("accion")
+                            or a.get("action")
+                            or a.get("tarea")
+                            or a.get("descripcion")
+                            or a.get("description")
+                        )
+                        pr2 = a.get("prioridad") or a.get("priority") or pr
+                        just2 = a.get("justificacion") or a.get("justification")
+                        recs2 = a.get("recomendaciones") or a.get("recommendations")
+                        if not act:
+                            # Fallback: representación compacta sin volcar JSON crudo
+                            other_kv = []
+                            for k, v in a.items():
+                                if k in ("prioridad", "priority", "justificacion", "justification", "recomendaciones", "recommendations"):
+                                    continue
+                                if k in ("accion", "action", "tarea", "descripcion", "description"):
+                                    continue
+                                other_kv.append(f"{k}: {v}")
+                            act = ", ".join(other_kv) or "(acción)"
+                        line = "- " + (f"[{pr2}] " if pr2 else "") + (f"[{plazo_item}] " if plazo_item else "") + str(act)
+                        plan_items.append(line)
+                        if just2:
+                            plan_items.append(f"  • Justificación: {just2}")
+                        if isinstance(recs2, list):
+                            for r in recs2[:5]:
+                                plan_items.append("  • " + str(r))
+                    # Mitigación de riesgos (si existe en el mismo bloque temporal)
+                    mr = it.get("mitigacion_riesgos") or it.get("risk_mitigation")
+                    if isinstance(mr, list):
+                        for m in mr:
+                            if isinstance(m, dict):
+                                riesgo = m.get("riesgo") or m.get("risk")
+                                estrategia = m.get("estrategia") or m.get("strategy")
+                                owner_m = m.get("owner") or m.get("responsable")
+                                plazo_m = m.get("plazo") or m.get("timeline")
+                                parts = [p for p in [riesgo, estrategia] if p]
+                                if parts:
+                                    extra = []
+                                    if owner_m: extra.append(f"owner: {owner_m}")
+                                    if plazo_m: extra.append(f"plazo: {plazo_m}")
+                                    suffix = f" — ({', '.join(extra)})" if extra else ""
+                                    plan_items.append("- Mitigación de riesgos: " + " | ".join(parts) + suffix)
+                    continue
+                # Fallback: volcar pares clave-valor legibles
+                plan_items.append("- " + _to_text_from_structure(it, section))
+            return "\n".join([ln for ln in plan_items if ln.strip()])
+        # fallback genérico
+        return _to_text_from_structure({"plan": data})
+
+    # Genérico
+    if isinstance(data, str):
+        return data.strip()
+    if isinstance(data, list):
+        lines: list[str] = []
+        for it in data:
+            if isinstance(it, (dict, list)):
+                txt = _to_text_from_structure(it, section)
+                if txt:
+                    for ln in txt.splitlines():
+                        lines.append("- " + ln if not ln.startswith("-") else ln)
+            else:
+                lines.append("- " + str(it))
+        return "\n".join(lines)
+    if isinstance(data, dict):
+        lines: list[str] = []
+        for k, v in data.items():
+            key = str(k).strip().replace("_", " ").capitalize()
+            if isinstance(v, (dict, list)):
+                sub = _to_text_from_structure(v, section)
+                if sub:
+                    lines.append(f"{key}:")
+                    lines.extend([("- " + ln if not ln.startswith("-") else ln) for ln in sub.splitlines()])
+            else:
+                val = str(v).strip()
+                if val:
+                    lines.append(f"- {key}: {val}")
+        return "\n".join(lines)
+    try:
+        return str(data)
+    except Exception:
+        return ""
 
-    def _normalize_section(raw: str, section: str) -> str:
-        s = _strip_fences(raw)
-        # Intentar parsear JSON si aplica
-        parsed: Any | None = None
-        try:
-            if s.startswith("{") or s.startswith("["):
-                parsed = json.loads(s)
-        except Exception:
-            parsed = None
-        if parsed is not None:
-            return _to_text_from_structure(parsed, section)
-        return s
 
-    # Resumen Ejecutivo (experto)
+def _normalize_section(raw: str, section: str) -> str:
+    s = _strip_fences(raw)
+    # Intentar parsear JSON si aplica
+    parsed: Any | None = None
     try:
-        exec_prompt = s_prompts.get_executive_summary_prompt(aggregated)
-        out["executive_summary"] = _normalize_section(fetch_response(exec_prompt, model="gpt-4o", temperature=0.3, max_tokens=900), "executive_summary")
+        if s.startswith("{") or s.startswith("["):
+            parsed = json.loads(s)
     except Exception:
-        out["executive_summary"] = _normalize_section(insights_json.get("executive_summary", ""), "executive_summary")
+        parsed = None
+    if parsed is not None:
+        return _to_text_from_structure(parsed, section)
+    return s
+
+
+PART2_SECTIONS = ("executive_summary", "summary_and_findings", "competitive_analysis",
+                  "trends", "correlations", "action_plan")
+
+
+def _add_part2_tasks(executor: ReportAgentExecutor, aggregated: Dict[str, Any],
+                     insights_task: str = "insights_json") -> None:
+    """Añade una tarea ``part2:<sección>`` por cada texto de la Parte 2.
+
+    Las secciones que solo usan ``aggregated`` no esperan a la extracción de
+    insights (``insights_task``); el resto la reciben como argumento.
+    """
+    def _executive_summary() -> str:
+        exec_prompt = s_prompts.get_executive_summary_prompt(aggregated)
+        return _normalize_section(fetch_response(exec_prompt, model="gpt-4o", temperature=0.3, max_tokens=900, use_cache=True), "executive_summary")
 
     # Resumen Ejecutivo y Hallazgos (usar strategic_summary sobre JSON)
-    try:
+    def _summary_and_findings(insights_json: Dict[str, Any]) -> str:
+        insights_json = insights_json or {}
         sum_prompt = s_prompts.get_strategic_summary_prompt({
             "executive_summary": insights_json.get("executive_summary", ""),
             "key_findings": insights_json.get("key_findings", []),
         })
-        out["summary_and_findings"] = _normalize_section(fetch_response(sum_prompt, model="gpt-4o", temperature=0.3, max_tokens=900), "summary_and_findings")
-    except Exception:
-        out["summary_and_findings"] = ""
+        return _normalize_section(fetch_response(sum_prompt, model="gpt-4o", temperature=0.3, max_tokens=900, use_cache=True), "summary_and_findings")
 
     # Análisis Competitivo (usa KPIs agregados ya presentes en aggregated)
-    try:
+    def _competitive_analysis() -> str:
         comp_prompt = s_prompts.get_competitive_analysis_prompt(aggregated)
-        out["competitive_analysis"] = _normalize_section(fetch_response(comp_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=900), "competitive_analysis")
-    except Exception:
-        out["competitive_analysis"] = ""
+        return _normalize_section(fetch_response(comp_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=900, use_cache=True), "competitive_analysis")
 
     # Tendencias y Señales (usa aggregated.trends)
-    try:
+    def _trends() -> str:
         trends_prompt = s_prompts.get_trends_anomalies_prompt(aggregated)
-        out["trends"] = _normalize_section(fetch_response(trends_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=900), "trends")
-    except Exception:
-        out["trends"] = ""
+        return _normalize_section(fetch_response(trends_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=900, use_cache=True), "trends")
 
     # Correlaciones Transversales (si hubiera un bloque en insights_json)
-    try:
-        corr = insights_json.get("time_series_analysis", {})
-        if corr:
-            corr_prompt = s_prompts.get_correlation_interpretation_prompt(aggregated, corr)
-            out["correlations"] = _normalize_section(fetch_response(corr_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=900), "correlations")
-        else:
-            out["correlations"] = ""
-    except Exception:
-        out["correlations"] = ""
+    def _correlations(insights_json: Dict[str, Any]) -> str:
+        corr = (insights_json or {}).get("time_series_analysis", {})
+        if not corr:
+            return ""
+        corr_prompt = s_prompts.get_correlation_interpretation_prompt(aggregated, corr)
+        return _normalize_section(fetch_response(corr_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=900, use_cache=True), "correlations")
 
     # Plan de Acción Estratégico (oportunidades + riesgos + recomendaciones)
-    try:
+    def _action_plan(insights_json: Dict[str, Any]) -> str:
+        insights_json = insights_json or {}
         plan_prompt = s_prompts.get_strategic_plan_prompt({
             "opportunities": insights_json.get("opportunities", []),
             "risks": insights_json.get("risks", []),
             "recommendations": insights_json.get("recommendations", []),
         })
-        out["action_plan"] = _normalize_section(fetch_response(plan_prompt, model="gpt-4o", temperature=0.3, max_tokens=1100), "action_plan")
-    except Exception:
-        out["action_plan"] = ""
+        return _normalize_section(fetch_response(plan_prompt, model="gpt-4o", temperature=0.3, max_tokens=1100, use_cache=True), "action_plan")
 
+    # Resumen Ejecutivo (experto): None si falla para recurrir al del JSON de insights
+    executor.add("part2:executive_summary", _executive_summary, default=None)
+    executor.add("part2:summary_and_findings", _summary_and_findings, deps=[insights_task], default="")
+    executor.add("part2:competitive_analysis", _competitive_analysis, default="")
+    executor.add("part2:trends", _trends, default="")
+    executor.add("part2:correlations", _correlations, deps=[insights_task], default="")
+    executor.add("part2:action_plan", _action_plan, deps=[insights_task], default="")
+
+
+def _collect_part2(results: Dict[str, Any], insights_json: Dict[str, Any]) -> Dict[str, str]:
+    out: Dict[str, str] = {s: results.get(f"part2:{s}") or "" for s in PART2_SECTIONS}
+    if results.get("part2:executive_summary") is None:
+        out["executive_summary"] = _normalize_section((insights_json or {}).get("executive_summary", ""), "executive_summary")
     return out
 
 
+def _generate_full_part2_texts(insights_json: Dict[str, Any], aggregated: Dict[str, Any]) -> Dict[str, str]:
+    """Genera todos los textos de la Parte 2 invocando prompts especialistas (en paralelo).
+    Aplica limpieza robusta: elimina fences y, si la IA devuelve JSON, lo parsea
+    y lo transforma a párrafos/bullets legibles.
+    """
+    executor = ReportAgentExecutor()
+    executor.add("insights_json", lambda: insights_json)
+    _add_part2_tasks(executor, aggregated)
+    return _collect_part2(executor.run(), insights_json)
+
+
 def _analyze_cluster(cluster_obj: Dict[str, Any]) -> Dict[str, Any]:
     """
     Llama al Analista de Clusters (Nivel 1) y devuelve un dict con topic_name y key_points.
@@ -330,48 +351,79 @@ def _synthesize_clusters(cluster_summaries: List[Dict[str, Any]]) -> Dict[str, A
         return {}
 
 
+def _cluster_obj(c: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "count": int(c.get("count", 0)),
+        "avg_sentiment": float(c.get("avg_sentiment", 0.0)),
+        "top_sources": c.get("top_sources", []),
+        "example_mentions": c.get("example_mentions", []),
+    }
+
+
+def _cluster_summaries(cluster_objs: List[Dict[str, Any]], analyzed: Sequence[Dict[str, Any]],
+                       examples: int = 0) -> List[Dict[str, Any]]:
+    """Une cada cluster con su análisis (Nivel 1); ``examples`` > 0 añade menciones de ejemplo."""
+    out: List[Dict[str, Any]] = []
+    for obj, res in zip(cluster_objs, analyzed):
+        res = res or {}
+        item = {
+            "topic_name": res.get("topic_name", "(sin nombre)"),
+            "key_points": res.get("key_points", []),
+            "volume": int(obj["count"]),
+            "sentiment": float(obj["avg_sentiment"]),
+        }
+        if examples:
+            item["examples"] = obj["example_mentions"][:examples]
+        out.append(item)
+    return out
+
+
+def _report_progress(progress: Optional[Callable[[str, int], None]], stage: str, pct: int) -> None:
+    if progress is None:
+        return
+    try:
+        progress(stage, pct)
+    except Exception:
+        pass
+
+
 def generate_report(project_id: int, clusters: List[Dict[str, Any]] | None = None,
                     save_insights_json: bool = True,
-                    *, start_date: str | None = None, end_date: str | None = None) -> bytes:
-    session = aggregator.get_session()
-    try:
-        # 1) Nombre de marca del proyecto (solo para mostrar)
-        kpis_name_only = aggregator.get_kpi_summary(session, project_id)
-        brand_name = kpis_name_only.get("brand_name") or "Empresa"
-
-        # 2) Métricas y gráficos GLOBALES (todos los topics)
-        #    SOV global por marca
-        sov_pairs = aggregator.get_industry_sov_ranking(session, start_date=start_date, end_date=end_date)
-        brand_sov = next((float(v or 0.0) for n, v in sov_pairs if str(n).strip() == str(brand_name).strip()), 0.0)
-
-        #    Visibilidad global diaria
-        vis_dates, vis_vals = aggregator.get_visibility_series(session, project_id, start_date=start_date, end_date=end_date)
-
-        #    Sentimiento: serie diaria de promedio [-1, 1]
-        sent_evo = aggregator.get_sentiment_evolution(session, project_id, start_date=start_date, end_date=end_date)
-
-        #    Datos por categoría solo para el anexo y gráficos secundarios
-        by_cat = aggregator.get_sentiment_by_category(session, project_id, start_date=start_date, end_date=end_date)
-        top5, bottom5 = aggregator.get_topics_by_sentiment(session, project_id, start_date=start_date, end_date=end_date)
-
-        #    Total de menciones del periodo (todas las queries)
-        from sqlalchemy import text as _text
-        s_date = start_date or "1970-01-01"
-        e_date = end_date or "2999-12-31"
-        total_mentions_row = session.execute(_text("""
-            SELECT COUNT(*) FROM mentions m
-            WHERE m.created_at >= CAST(:start AS date)
-              AND m.created_at < (CAST(:end AS date) + INTERVAL '1 day')
-        """), {"start": s_date, "end": e_date}).first()
-        total_mentions = int(total_mentions_row[0] if total_mentions_row and total_mentions_row[0] is not None else 0)
-
-        # 3) Insights del agente para Parte 2
-        agent_insights = aggregator.get_agent_insights_data(session, project_id, limit=200)
-        # Nuevo: permitir inyectar clusters precalculados para evitar recomputar
-        if clusters is None:
-            clusters = aggregator.aggregate_clusters_for_report(session, project_id, start_date=start_date, end_date=end_date, max_rows=5000)
-    finally:
-        session.close()
+                    *, start_date: str | None = None, end_date: str | None = None,
+                    progress: Optional[Callable[[str, int], None]] = None,
+                    snapshot: Optional[ReportSnapshot] = None) -> bytes:
+    """PDF del informe ejecutivo. ``progress(etapa, porcentaje)`` recibe el avance (cola de informes)."""
+    _report_progress(progress, "data", 5)
+    # Instantánea compartida: lo ya calculado para este proyecto y rango no se vuelve a consultar
+    if snapshot is None:
+        snapshot = get_report_snapshot(project_id, start_date, end_date)
+
+    # 1) Nombre de marca del proyecto (solo para mostrar)
+    brand_name = snapshot.brand_name()
+
+    # 2) Métricas y gráficos GLOBALES (todos los topics)
+    #    SOV global por marca
+    sov_pairs = snapshot.sov_ranking()
+    brand_sov = next((float(v or 0.0) for n, v in sov_pairs if str(n).strip() == str(brand_name).strip()), 0.0)
+
+    #    Visibilidad global diaria
+    vis_dates, vis_vals = snapshot.visibility_series()
+
+    #    Sentimiento: serie diaria de promedio [-1, 1]
+    sent_evo = snapshot.sentiment_evolution()
+
+    #    Datos por categoría solo para el anexo y gráficos secundarios
+    by_cat = snapshot.sentiment_by_category()
+    top5, bottom5 = snapshot.topics_by_sentiment()
+
+    #    Total de menciones del periodo (todas las queries)
+    total_mentions = snapshot.total_mentions()
+
+    # 3) Insights del agente para Parte 2
+    agent_insights = snapshot.agent_insights(limit=200)
+    # Nuevo: permitir inyectar clusters precalculados para evitar recomputar
+    if clusters is None:
+        clusters = snapshot.clusters(max_rows=5000)
 
     # KPI: sentimiento medio global del periodo (media de la serie diaria)
     sentiment_avg = (sum(v for _, v in sent_evo) / max(len(sent_evo), 1)) if sent_evo else 0.0
@@ -397,29 +449,38 @@ def generate_report(project_id: int, clusters: List[Dict[str, Any]] | None = Non
         "topics_bottom5": bottom5,
     }
 
-    # Nivel 1: análisis por cluster
-    cluster_summaries: List[Dict[str, Any]] = []
-    for c in (clusters or [])[:12]:  # límite defensivo para rendimiento
-        cluster_obj = {
-            "count": int(c.get("count", 0)),
-            "avg_sentiment": float(c.get("avg_sentiment", 0.0)),
-            "top_sources": c.get("top_sources", []),
-            "example_mentions": c.get("example_mentions", []),
-        }
-        analyzed = _analyze_cluster(cluster_obj)
-        cluster_summaries.append({
-            "topic_name": analyzed.get("topic_name", "(sin nombre)"),
-            "key_points": analyzed.get("key_points", []),
-            "volume": int(cluster_obj["count"]),
-            "sentiment": float(cluster_obj["avg_sentiment"]),
-        })
+    _report_progress(progress, "agents", 30)
+    # Cadena de agentes en paralelo; solo esperan las tareas con dependencias:
+    #   cluster:i ──► synthesis          (Nivel 1 → Nivel 2)
+    #   insights_json ──► part2:* que usan el JSON de insights
+    #   part2:* sin dependencias, agent_summary
+    executor = ReportAgentExecutor()
+    cluster_objs = [_cluster_obj(c) for c in (clusters or [])[:12]]  # límite defensivo para rendimiento
+    cluster_tasks = [
+        executor.add(f"cluster:{i}", (lambda obj=obj: _analyze_cluster(obj)),
+                     default={"topic_name": "(sin nombre)", "key_points": []})
+        for i, obj in enumerate(cluster_objs)
+    ]
+    executor.add(
+        "synthesis",
+        lambda *analyzed: _synthesize_clusters(_cluster_summaries(cluster_objs, analyzed)),
+        deps=cluster_tasks, default={},
+    )
+    # 1) Extracción de insights (JSON estructurado)
+    executor.add("insights_json", lambda: _extract_insights_to_json(aggregated), default={})
+    # 2) Textos especialistas de la Parte 2
+    _add_part2_tasks(executor, aggregated)
 
-    # Nivel 2: síntesis estratégica a partir de clusters
-    synthesis = _synthesize_clusters(cluster_summaries)
+    def _agent_summary() -> str:
+        agent_prompt = s_prompts.get_agent_insights_summary_prompt({"agent_insights": agent_insights})
+        return fetch_response(agent_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=700, use_cache=True)
 
-    # Cadena de agentes (Parte 2 - estilo twolaps):
-    # 1) Extracción de insights (JSON estructurado)
-    insights_json = _extract_insights_to_json(aggregated)
+    executor.add("agent_summary", _agent_summary, default="")
+    results = executor.run()
+
+    cluster_summaries = _cluster_summaries(cluster_objs, [results[t] for t in cluster_tasks])
+    synthesis = results.get("synthesis") or {}
+    insights_json = results.get("insights_json") or {}
     # Guardar JSON para trazabilidad si se solicita
     if save_insights_json and insights_json:
         try:
@@ -431,24 +492,14 @@ def generate_report(project_id: int, clusters: List[Dict[str, Any]] | None = Non
                 json.dump(insights_json, f, ensure_ascii=False, indent=2)
         except Exception:
             pass
+    strategic_sections = _collect_part2(results, insights_json)
+    agent_summary_text = results.get("agent_summary") or ""
 
-    # 2) Generar todos los textos especialistas para Parte 2 usando el JSON de insights
-    strategic_sections = _generate_full_part2_texts(insights_json, aggregated)
-    agent_summary_text = ""
-    try:
-        agent_prompt = s_prompts.get_agent_insights_summary_prompt({"agent_insights": agent_insights})
-        agent_summary_text = fetch_response(agent_prompt, model="gpt-4o-mini", temperature=0.3, max_tokens=700)
-    except Exception:
-        agent_summary_text = ""
-
+    _report_progress(progress, "charts", 75)
     # Gráficos alineados a la API y frontend: sentimiento como % positivo y visibilidad diaria
     try:
         # Serie diaria de % de menciones positivas (0–100)
-        session = aggregator.get_session()
-        try:
-            pos_series = aggregator.get_sentiment_positive_series(session, project_id, start_date=start_date, end_date=end_date)
-        finally:
-            session.close()
+        pos_series = snapshot.sentiment_positive_series()
         pos_dates = [d for d, _ in pos_series]
         pos_vals = [float(v) for _, v in pos_series]
         sent_img = plotter.plot_line_series(pos_dates, pos_vals, title="% de menciones positivas", ylabel="Positivo (%)", ylim=(0, 100), color="#16a34a")
@@ -481,11 +532,7 @@ def generate_report(project_id: int, clusters: List[Dict[str, Any]] | None = Non
     except Exception:
         sov_rank_img = None
     try:
-        session = aggregator.get_session()
-        try:
-            vis_rank_pairs = aggregator.get_visibility_ranking(session, start_date=start_date, end_date=end_date)
-        finally:
-            session.close()
+        vis_rank_pairs = snapshot.visibility_ranking()
         items = [f"{i+1}. {n} — {v:.1f}%" for i, (n, v) in enumerate(vis_rank_pairs[:10])]
         if items:
             import matplotlib.pyplot as plt
@@ -588,6 +635,7 @@ def generate_report(project_id: int, clusters: List[Dict[str, Any]] | None = Non
     }
 
     # Render final del esqueleto con contenido
+    _report_progress(progress, "pdf", 90)
     return pdf_writer.build_skeleton_from_content(content_bundle)
 
 
@@ -595,7 +643,6 @@ def generate_hybrid_report(full_data: Dict[str, Any]) -> bytes:
     """Rellena el esqueleto con 3 páginas en dos columnas: SOV, Sentimiento, Visibilidad (últimos 30 días)."""
     from .pdf_writer import build_skeleton_with_content as build
     from . import plotter
-    from . import aggregator as agg
     kpis = full_data.get("kpis", {})
     brand_name = kpis.get("brand_name") or full_data.get("brand") or "Empresa"
 
@@ -604,51 +651,49 @@ def generate_hybrid_report(full_data: Dict[str, Any]) -> bytes:
     end_date = full_data.get("end_date") or None
 
     # 1) SOV global (pie) y ranking (lista)
-    session = agg.get_session();
+    # Misma instantánea que generate_report / get_full_report_data para este proyecto y rango
+    snapshot = get_report_snapshot(int(full_data.get("project_id") or 1), start_date, end_date)
+    sov_pairs = snapshot.sov_ranking()
+    sov_img = plotter.plot_sov_pie([(name, val) for name, val in sov_pairs[:10]])
+    # Render ranking como tabla simple en imagen: reutilizamos barh con porcentajes
     try:
-        sov_pairs = agg.get_industry_sov_ranking(session, start_date=start_date, end_date=end_date)
-        sov_img = plotter.plot_sov_pie([(name, val) for name, val in sov_pairs[:10]])
-        # Render ranking como tabla simple en imagen: reutilizamos barh con porcentajes
-        try:
-            # Renderizar ranking como imagen de lista simple
-            labels = [f"{i+1}. {n} — {v:.1f}%" for i, (n, v) in enumerate(sov_pairs[:10])]
-            import matplotlib.pyplot as plt
-            h = max(1.6, 0.32 * len(labels) + 0.6)
-            plt.figure(figsize=(4.2, h))
-            for i, txt in enumerate(labels):
-                plt.text(0.01, 1.0 - (i+1)/(len(labels)+1), txt, fontsize=9)
-            plt.axis('off')
-            from .plotter import _tmp_path
-            sov_rank_img = _tmp_path("sov_rank_"); plt.tight_layout(); plt.savefig(sov_rank_img, dpi=160, bbox_inches='tight', pad_inches=0.1); plt.close()
-        except Exception:
-            sov_rank_img = None
+        # Renderizar ranking como imagen de lista simple
+        labels = [f"{i+1}. {n} — {v:.1f}%" for i, (n, v) in enumerate(sov_pairs[:10])]
+        import matplotlib.pyplot as plt
+        h = max(1.6, 0.32 * len(labels) + 0.6)
+        plt.figure(figsize=(4.2, h))
+        for i, txt in enumerate(labels):
+            plt.text(0.01, 1.0 - (i+1)/(len(labels)+1), txt, fontsize=9)
+        plt.axis('off')
+        from .plotter import _tmp_path
+        sov_rank_img = _tmp_path("sov_rank_"); plt.tight_layout(); plt.savefig(sov_rank_img, dpi=160, bbox_inches='tight', pad_inches=0.1); plt.close()
+    except Exception:
+        sov_rank_img = None
 
-        # 2) Sentimiento positivo por día (serie) en una sola columna (sin gráfico derecho)
-        sent_series = agg.get_sentiment_positive_series(session, int(full_data.get("project_id") or 1), start_date=start_date, end_date=end_date)
-        sent_img = plotter.plot_line_series([d for d, _ in sent_series], [float(v) for _, v in sent_series], title="% de menciones positivas", ylabel="Positivo (%)", ylim=(0,100), color="#16a34a")
-        sent_dist_img = None
+    # 2) Sentimiento positivo por día (serie) en una sola columna (sin gráfico derecho)
+    sent_series = snapshot.sentiment_positive_series()
+    sent_img = plotter.plot_line_series([d for d, _ in sent_series], [float(v) for _, v in sent_series], title="% de menciones positivas", ylabel="Positivo (%)", ylim=(0,100), color="#16a34a")
+    sent_dist_img = None
 
-        # 3) Visibilidad por día y ranking
-        vis_dates, vis_vals = agg.get_visibility_series(session, int(full_data.get("project_id") or 1), start_date=start_date, end_date=end_date)
-        try:
-            vis_line_img = plotter.plot_visibility_series(vis_dates, vis_vals)
-        except Exception:
-            vis_line_img = None
-        vis_rank_pairs = agg.get_visibility_ranking(session, start_date=start_date, end_date=end_date)
-        try:
-            items = [f"{i+1}. {n} — {v:.1f}%" for i, (n, v) in enumerate(vis_rank_pairs[:10])]
-            import matplotlib.pyplot as plt
-            h = max(1.6, 0.32 * len(items) + 0.6)
-            plt.figure(figsize=(4.2, h))
-            for i, txt in enumerate(items):
-                plt.text(0.01, 1.0 - (i+1)/(len(items)+1), txt, fontsize=9)
-            plt.axis('off')
-            from .plotter import _tmp_path
-            vis_rank_img = _tmp_path("vis_rank_"); plt.tight_layout(); plt.savefig(vis_rank_img, dpi=160, bbox_inches='tight', pad_inches=0.1); plt.close()
-        except Exception:
-            vis_rank_img = None
-    finally:
-        session.close()
+    # 3) Visibilidad por día y ranking
+    vis_dates, vis_vals = snapshot.visibility_series()
+    try:
+        vis_line_img = plotter.plot_visibility_series(vis_dates, vis_vals)
+    except Exception:
+        vis_line_img = None
+    vis_rank_pairs = snapshot.visibility_ranking()
+    try:
+        items = [f"{i+1}. {n} — {v:.1f}%" for i, (n, v) in enumerate(vis_rank_pairs[:10])]
+        import matplotlib.pyplot as plt
+        h = max(1.6, 0.32 * len(items) + 0.6)
+        plt.figure(figsize=(4.2, h))
+        for i, txt in enumerate(items):
+            plt.text(0.01, 1.0 - (i+1)/(len(items)+1), txt, fontsize=9)
+        plt.axis('off')
+        from .plotter import _tmp_path
+        vis_rank_img = _tmp_path("vis_rank_"); plt.tight_layout(); plt.savefig(vis_rank_img, dpi=160, bbox_inches='tight', pad_inches=0.1); plt.close()
+    except Exception:
+        vis_rank_img = None
 
     images = {
         "sov_pie": sov_img,
@@ -664,23 +709,12 @@ def generate_hybrid_report(full_data: Dict[str, Any]) -> bytes:
     sov = full_data.get("sov", {})
     clusters = full_data.get("clusters", [])
 
-    # Preparar análisis de clusters (Nivel 1 y 2)
-    cluster_summaries: List[Dict[str, Any]] = []
-    for c in (clusters or [])[:12]:
-        cluster_obj = {
-            "count": int(c.get("count", 0)),
-            "avg_sentiment": float(c.get("avg_sentiment", 0.0)),
-            "top_sources": c.get("top_sources", []),
-            "example_mentions": c.get("example_mentions", []),
-        }
-        analyzed = _analyze_cluster(cluster_obj)
-        cluster_summaries.append({
-            "topic_name": analyzed.get("topic_name", "(sin nombre)"),
-            "key_points": analyzed.get("key_points", []),
-            "volume": int(cluster_obj["count"]),
-            "sentiment": float(cluster_obj["avg_sentiment"]),
-            "examples": cluster_obj["example_mentions"][:3],
-        })
+    # Preparar análisis de clusters (Nivel 1 y 2): los análisis van en paralelo
+    cluster_objs = [_cluster_obj(c) for c in (clusters or [])[:12]]
+    analyzed = run_parallel({f"cluster:{i}": (lambda obj=obj: _analyze_cluster(obj)) for i, obj in enumerate(cluster_objs)},
+                            default={"topic_name": "(sin nombre)", "key_points": []})
+    cluster_summaries = _cluster_summaries(cluster_objs, [analyzed[f"cluster:{i}"] for i in range(len(cluster_objs))],
+                                           examples=3)
 
     synthesis = _synthesize_clusters(cluster_summaries)
 
@@ -721,13 +755,13 @@ def generate_hybrid_report(full_data: Dict[str, Any]) -> bytes:
                 "executive_summary": "" ,
                 "key_findings": [kp for c in cluster_summaries for kp in c.get("key_points", [])][:6],
             })
-            strategic_sections["executive_summary"] = fetch_response(exec_prompt, model="gpt-4o", temperature=0.3, max_tokens=700)
+            strategic_sections["executive_summary"] = fetch_response(exec_prompt, model="gpt-4o", temperature=0.3, max_tokens=700, use_cache=True)
             plan_prompt = s_prompts.get_strategic_plan_prompt({
                 "opportunities": [],
                 "risks": [],
                 "recommendations": synthesis.get("plan_estrategico", []),
             })
-            strategic_sections["action_plan"] = fetch_response(plan_prompt, model="gpt-4o", temperature=0.3, max_tokens=900)
+            strategic_sections["action_plan"] = fetch_response(plan_prompt, model="gpt-4o", temperature=0.3, max_tokens=900, use_cache=True)
             # Headline + key findings simples a partir de puntos de clusters
             try:
                 strategic_sections["key_findings"] = [kp for c in cluster_summaries for kp in c.get("key_points", [])][:4]
@@ -0,0 +1,386 @@
+"""
+Cola persistente de informes (tabla ``report_jobs``) y almacén de PDFs.
+
+El endpoint solo encola: ``enqueue_report_job`` inserta el trabajo o, si ya
+hay uno idéntico (mismo ``request_hash``) en cola o ejecutándose, devuelve ese
+mismo id. Un pool de hilos por proceso (``ReportJobWorkers``) reclama trabajos
+con ``FOR UPDATE SKIP LOCKED``, ejecuta ``generate_report`` anotando la etapa y
+el progreso, y guarda el PDF por su sha256 en disco o en Postgres
+(``REPORT_ARTIFACT_STORE``). Los clientes consultan el estado (o hacen
+long-poll) y descargan el artefacto al terminar.
+
+Estados: queued → running → done | failed. Igual que en ``poll_tasks``, un
+trabajo ``running`` cuyo lease caduca (proceso muerto) vuelve a ser reclamable
+mientras le queden intentos; cada cambio de etapa renueva el lease.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_LEASE_SECONDS = int(os.getenv("REPORT_JOB_LEASE_SECONDS", "900"))
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "2"))
+REPORT_JOB_POLL_SECONDS = float(os.getenv("REPORT_JOB_POLL_SECONDS", "2"))
+REPORT_ARTIFACT_STORE = os.getenv("REPORT_ARTIFACT_STORE", "disk").lower()
+REPORT_ARTIFACT_DIR = os.getenv(
+    "REPORT_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "files", "reports"),
+)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("done", "failed")
+
+# Prefijo del nombre de descarga por tipo de informe
+REPORT_KINDS = {
+    "executive": "Informe_Ejecutivo",
+    "v2": "Informe_Geocore",
+}
+
+_JOB_COLUMNS = ("id", "kind", "params", "status", "stage", "progress", "attempts", "artifact_hash",
+                "artifact_size", "error", "created_at", "started_at", "finished_at")
+
+ProgressFn = Callable[[str, int], None]
+
+
+def ensure_report_jobs_table(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params JSONB NOT NULL DEFAULT '{}'::jsonb,
+            request_hash TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT NOT NULL DEFAULT 'queued',
+            progress SMALLINT NOT NULL DEFAULT 0,
+            attempts INT NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            claimed_at TIMESTAMPTZ,
+            artifact_hash TEXT,
+            artifact_size INT,
+            error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ
+        )
+        """
+    )
+    # A lo sumo un trabajo activo por petición: las repetidas se funden con él
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_report_jobs_active ON report_jobs (request_hash) "
+        "WHERE status IN ('queued', 'running')"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_status ON report_jobs (status, id)")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS report_artifacts (
+            hash TEXT PRIMARY KEY,
+            data BYTEA NOT NULL,
+            size INT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+def request_hash(kind: str, params: Dict[str, Any]) -> str:
+    raw = json.dumps({"kind": kind, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _expire_stale_jobs(cur) -> None:
+    """Da por fallidos los ``running`` con lease caducado y sin intentos: si no, bloquearían la fusión."""
+    cur.execute(
+        """
+        UPDATE report_jobs
+        SET status = 'failed', stage = 'failed', error = 'lease caducado', finished_at = NOW()
+        WHERE status = 'running' AND attempts >= %s
+          AND claimed_at < NOW() - make_interval(secs => %s)
+        """,
+        (REPORT_JOB_MAX_ATTEMPTS, REPORT_JOB_LEASE_SECONDS),
+    )
+
+
+def enqueue_report_job(cur, kind: str, params: Dict[str, Any]) -> Tuple[int, bool]:
+    """Encola un informe y devuelve ``(job_id, merged)``; ``merged`` indica que ya había uno idéntico activo."""
+    digest = request_hash(kind, params)
+    _expire_stale_jobs(cur)
+    for _ in range(3):
+        cur.execute(
+            """
+            INSERT INTO report_jobs (kind, params, request_hash) VALUES (%s, %s::jsonb, %s)
+            ON CONFLICT (request_hash) WHERE status IN ('queued', 'running') DO NOTHING
+            RETURNING id
+            """,
+            (kind, json.dumps(params, default=str), digest),
+        )
+        row = cur.fetchone()
+        if row:
+            return int(row[0]), False
+        cur.execute(
+            "SELECT id FROM report_jobs WHERE request_hash = %s AND status IN ('queued', 'running') ORDER BY id DESC LIMIT 1",
+            (digest,),
+        )
+        row = cur.fetchone()
+        if row:
+            return int(row[0]), True
+        # El activo terminó entre el INSERT y el SELECT: se vuelve a intentar
+    raise RuntimeError("No se pudo encolar el informe")
+
+
+def claim_report_job(cur, worker_id: str) -> Optional[Tuple[int, str, Dict[str, Any]]]:
+    """Reclama el trabajo más antiguo disponible. Quien llama debe hacer commit."""
+    cur.execute(
+        """
+        WITH claimable AS (
+            SELECT id FROM report_jobs
+            WHERE status = 'queued'
+               OR (status = 'running' AND attempts < %s AND claimed_at < NOW() - make_interval(secs => %s))
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        UPDATE report_jobs j
+        SET status = 'running', stage = 'starting', progress = 0, claimed_by = %s, claimed_at = NOW(),
+            started_at = COALESCE(j.started_at, NOW()), attempts = j.attempts + 1
+        FROM claimable c
+        WHERE j.id = c.id
+        RETURNING j.id, j.kind, j.params
+        """,
+        (REPORT_JOB_MAX_ATTEMPTS, REPORT_JOB_LEASE_SECONDS, worker_id),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    params = row[2] if isinstance(row[2], dict) else json.loads(row[2] or "{}")
+    return int(row[0]), row[1], params
+
+
+def update_report_job(cur, job_id: int, stage: str, progress: int) -> None:
+    """Anota etapa y progreso (0-100) y renueva el lease."""
+    cur.execute(
+        "UPDATE report_jobs SET stage = %s, progress = %s, claimed_at = NOW() WHERE id = %s AND status = 'running'",
+        (stage, max(0, min(int(progress), 100)), job_id),
+    )
+
+
+def complete_report_job(cur, job_id: int, artifact_hash: str, size: int) -> None:
+    cur.execute(
+        """
+        UPDATE report_jobs
+        SET status = 'done', stage = 'done', progress = 100, artifact_hash = %s, artifact_size = %s,
+            error = NULL, finished_at = NOW()
+        WHERE id = %s
+        """,
+        (artifact_hash, size, job_id),
+    )
+
+
+def fail_report_job(cur, job_id: int, error: str) -> None:
+    cur.execute(
+        "UPDATE report_jobs SET status = 'failed', stage = 'failed', error = %s, finished_at = NOW() WHERE id = %s",
+        (error[:500], job_id),
+    )
+
+
+def get_report_job(cur, job_id: int) -> Optional[Dict[str, Any]]:
+    cur.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM report_jobs WHERE id = %s", (job_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    job = dict(zip(_JOB_COLUMNS, row))
+    for key in ("created_at", "started_at", "finished_at"):
+        if job.get(key) is not None:
+            job[key] = job[key].isoformat()
+    return job
+
+
+# ───────────────────────── Almacén de PDFs ─────────────────────────
+def artifact_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskArtifactStore:
+    """Un fichero por hash (``<dir>/<ab>/<hash>.pdf``); escritura atómica. Ignora ``cur``."""
+
+    def __init__(self, directory: str = REPORT_ARTIFACT_DIR):
+        self.directory = directory
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.pdf")
+
+    def put(self, cur, data: bytes) -> str:
+        digest = artifact_hash(data)
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        return digest
+
+    def get(self, cur, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._path(digest), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+
+class PostgresArtifactStore:
+    """Tabla ``report_artifacts`` (BYTEA); útil con varios hosts sin disco compartido."""
+
+    def put(self, cur, data: bytes) -> str:
+        import psycopg2
+
+        digest = artifact_hash(data)
+        cur.execute(
+            "INSERT INTO report_artifacts (hash, data, size) VALUES (%s, %s, %s) ON CONFLICT (hash) DO NOTHING",
+            (digest, psycopg2.Binary(data), len(data)),
+        )
+        return digest
+
+    def get(self, cur, digest: str) -> Optional[bytes]:
+        cur.execute("SELECT data FROM report_artifacts WHERE hash = %s", (digest,))
+        row = cur.fetchone()
+        return bytes(row[0]) if row else None
+
+
+_STORE = None
+
+
+def get_artifact_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = PostgresArtifactStore() if REPORT_ARTIFACT_STORE == "postgres" else DiskArtifactStore()
+    return _STORE
+
+
+def set_artifact_store(store) -> None:
+    global _STORE
+    _STORE = store
+
+
+# ───────────────────────── Ejecución ─────────────────────────
+def run_report_job(kind: str, params: Dict[str, Any], progress: ProgressFn) -> bytes:
+    """Genera el PDF de un trabajo (todos los tipos usan la cadena de agentes de ``generate_report``)."""
+    from src.reports.generator import generate_report
+
+    return generate_report(
+        int(params.get("project_id") or 1),
+        start_date=params.get("start_date"),
+        end_date=params.get("end_date"),
+        progress=progress,
+    )
+
+
+class ReportJobWorkers:
+    """Hilos del proceso que vacían ``report_jobs``. ``notify()`` despierta a uno tras encolar."""
+
+    def __init__(self, connect: Callable[[], Any], workers: int = REPORT_JOB_WORKERS,
+                 runner: Callable[[str, Dict[str, Any], ProgressFn], bytes] = run_report_job,
+                 store=None, poll_seconds: float = REPORT_JOB_POLL_SECONDS):
+        self.connect = connect
+        self.workers = max(1, int(workers))
+        self.runner = runner
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f"report-job-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            logger.info("📄 %s workers de informes arrancados (%s)", self.workers, self.worker_id)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as exc:
+                logger.error("❌ Worker de informes: %s", exc)
+                ran = False
+            if not ran:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def run_once(self) -> bool:
+        """Reclama y ejecuta un trabajo; False si la cola estaba vacía."""
+        store = self.store or get_artifact_store()
+        conn = self.connect()
+        try:
+            cur = conn.cursor()
+            job = claim_report_job(cur, self.worker_id)
+            conn.commit()
+            if not job:
+                return False
+            job_id, kind, params = job
+            logger.info("📄 Informe %s (%s) en curso", job_id, kind)
+
+            def progress(stage: str, pct: int) -> None:
+                try:
+                    update_report_job(cur, job_id, stage, pct)
+                    conn.commit()
+                except Exception as exc:
+                    conn.rollback()
+                    logger.warning("⚠️ No se pudo anotar el progreso del informe %s: %s", job_id, exc)
+
+            try:
+                pdf = self.runner(kind, params, progress)
+                digest = store.put(cur, pdf)
+                complete_report_job(cur, job_id, digest, len(pdf))
+                logger.info("✅ Informe %s listo (%s bytes, %s)", job_id, len(pdf), digest[:12])
+            except Exception as exc:
+                conn.rollback()
+                logger.error("❌ Informe %s fallido: %s", job_id, exc)
+                fail_report_job(cur, job_id, str(exc) or exc.__class__.__name__)
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+
+_WORKERS: Optional[ReportJobWorkers] = None
+_WORKERS_LOCK = threading.Lock()
+
+
+def get_report_workers(connect: Optional[Callable[[], Any]] = None) -> Optional[ReportJobWorkers]:
+    """Workers del proceso; se crean y arrancan la primera vez que se pasa ``connect``."""
+    global _WORKERS
+    with _WORKERS_LOCK:
+        if _WORKERS is None and connect is not None:
+            _WORKERS = ReportJobWorkers(connect)
+            _WORKERS.start()
+        return _WORKERS
+
+
+def set_report_workers(workers: Optional[ReportJobWorkers]) -> None:
+    global _WORKERS
+    with _WORKERS_LOCK:
+        _WORKERS = workers
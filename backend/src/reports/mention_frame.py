@@ -0,0 +1,107 @@
+"""
+Menciones del informe como DataFrame columnar.
+
+``load_mention_frame`` trae en UNA consulta solo las columnas que necesita la
+agregación del informe (sin ``response`` salvo para menciones aún no indexadas
+en ``mention_brands``) y resuelve las marcas una única vez por mención:
+
+    • brands       → marcas de todos los orígenes (key_topics, payload, response, title)
+    • text_brands  → sin ``payload.brands`` (SOV por modelo/tema y comparativa con el periodo previo)
+
+A partir de ahí ``explode_brands``/``explode_topics`` dan tablas largas
+(mención × marca, mención × tema) sobre las que el informe agrega con
+groupby en lugar de recorrer filas en Python.
+"""
+
+from datetime import date
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.brands.detection import get_brand_matcher
+from src.brands.store import pending_text_sql, stored_brands_sql
+
+TEXT_BRAND_SOURCES = ("key_topics", "response", "title")
+
+FRAME_COLUMNS = ["id", "engine", "topic", "key_topics", "sentiment", "day",
+                 "brands", "text_brands", "resp", "title", "payload"]
+
+
+def mention_frame_sql(where_sql: str) -> str:
+    return f"""
+        SELECT m.id, m.engine, q.topic, m.key_topics, m.sentiment, DATE(m.created_at) AS day,
+               {stored_brands_sql()} AS brands,
+               {stored_brands_sql(sources=TEXT_BRAND_SOURCES)} AS text_brands,
+               {pending_text_sql('response')} AS resp,
+               {pending_text_sql('source_title')} AS title,
+               CASE WHEN m.brands_detected_at IS NULL THEN i.payload END AS payload
+        FROM mentions m
+        JOIN queries q ON m.query_id = q.id
+        LEFT JOIN insights i ON i.id = m.generated_insight_id
+        WHERE {where_sql}
+    """
+
+
+def _resolve_brands(stored: List[Optional[Sequence[str]]], key_topics, resp, title, payload) -> List[List[str]]:
+    """Marcas almacenadas o, para las menciones sin indexar, detección en lote con el matcher compartido."""
+    out = [list(s) if s is not None else None for s in stored]
+    pending = [i for i, s in enumerate(out) if s is None]
+    if pending:
+        detected = get_brand_matcher().detect_many(
+            (key_topics[i], resp[i], title[i], payload[i] if payload is not None else None) for i in pending
+        )
+        for i, found in zip(pending, detected):
+            out[i] = found
+    return out
+
+
+def build_mention_frame(rows: Sequence[tuple], fallback_day: date) -> pd.DataFrame:
+    """DataFrame a partir de filas con el orden de ``FRAME_COLUMNS``."""
+    df = pd.DataFrame.from_records(list(rows), columns=FRAME_COLUMNS)
+    df["sentiment"] = pd.to_numeric(df["sentiment"], errors="coerce").astype(float)
+    df["day"] = df["day"].where(df["day"].notna(), fallback_day)
+    key_topics = [kt if isinstance(kt, (list, tuple)) else [] for kt in df["key_topics"].tolist()]
+    resp, title, payload = df["resp"].tolist(), df["title"].tolist(), df["payload"].tolist()
+    df["key_topics"] = key_topics
+    df["brands"] = _resolve_brands(df["brands"].tolist(), key_topics, resp, title, payload)
+    df["text_brands"] = _resolve_brands(df["text_brands"].tolist(), key_topics, resp, title, None)
+    # El texto solo hacía falta para detectar: no se arrastra por el resto del informe
+    return df.drop(columns=["resp", "title", "payload"])
+
+
+def load_mention_frame(cur, where_sql: str, params: Sequence[Any], fallback_day: date) -> pd.DataFrame:
+    cur.execute(mention_frame_sql(where_sql), tuple(params))
+    return build_mention_frame(cur.fetchall(), fallback_day)
+
+
+def explode_brands(df: pd.DataFrame, column: str = "brands") -> pd.DataFrame:
+    """Tabla larga mención × marca: columnas ``id, day, engine, topic, sentiment, brand``."""
+    long = df[["id", "day", "engine", "topic", "sentiment", column]].explode(column)
+    long = long[long[column].notna()].rename(columns={column: "brand"})
+    return long.drop_duplicates(["id", "brand"])
+
+
+def explode_topics(df: pd.DataFrame, lower: bool = True) -> pd.DataFrame:
+    """Tabla larga mención × key_topic (``str(t).strip()``, opcionalmente en minúsculas).
+
+    Un tema repetido en la misma mención cuenta varias veces, como en el informe original.
+    """
+    long = df[["id", "day", "sentiment", "key_topics"]].explode("key_topics")
+    raw = long["key_topics"]
+    long = long[raw.notna() & raw.astype(bool)]
+    topics = long["key_topics"].astype(str).str.strip()
+    return long.drop(columns=["key_topics"]).assign(topic=topics.str.lower() if lower else topics)
+
+
+def histogram(values: Any, bins: int = 10, range_min: float = -1.0, range_max: float = 1.0) -> List[dict]:
+    """Histograma con los extremos acotados al primer/último bin (mismo formato que ``_histogram``)."""
+    x = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float)
+    x = x[~np.isnan(x)]
+    if x.size == 0:
+        return []
+    step = (range_max - range_min) / max(bins, 1)
+    idx = np.clip(((x - range_min) / step).astype(int), 0, bins - 1)
+    hist = np.bincount(idx, minlength=bins)
+    edges = [range_min + i * step for i in range(bins + 1)]
+    return [{"bin": f"{edges[i]:.2f}..{edges[i+1]:.2f}", "count": int(hist[i])} for i in range(bins)]
@@ -0,0 +1,275 @@
+"""
+Rollups diarios de menciones (visibilidad, sentimiento y SOV).
+
+``mention_daily_rollup`` guarda, por (día, engine, source, category, topic,
+marca de la query, client_id, brand_id, marca detectada), el número de
+menciones, la suma de sentimiento y los buckets positivo/neutral/negativo
+(umbral ±0.3, el mismo de los endpoints). La fila con ``brand = '__all__'``
+cuenta todas las menciones (denominador de visibilidad); el resto sale de
+``mention_brands``.
+
+    • apply_rollup_deltas()  → el polling suma las menciones recién guardadas
+    • refresh_rollup_days()  → recalcula días completos (rebuild / backfill)
+    • moving_query_rollups() → al editar o recategorizar prompts mueve sus
+                               menciones de las dimensiones viejas a las nuevas
+    • query_rollup()         → los endpoints leen días completos del rollup y
+                               agregan en vivo solo los tramos parciales de los
+                               extremos del rango
+
+Los endpoints solo usan el rollup si se construyó al menos una vez
+(``scripts/rebuild_rollups.py``), ver ``rollups_ready``.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() in {"1", "true", "yes"}
+ROLLUP_READY_TTL = float(os.getenv("ROLLUP_READY_TTL", "60"))
+
+ALL_BRANDS = "__all__"
+
+DIMENSIONS = ("day", "engine", "source", "category", "topic", "query_brand", "client_id", "brand_id", "brand")
+METRICS = ("mentions", "sentiment_sum", "positive", "neutral", "negative")
+
+_FACTS_SQL = """
+    SELECT DATE(m.created_at) AS day,
+           COALESCE(m.engine, '') AS engine,
+           COALESCE(m.source, '') AS source,
+           COALESCE(q.category, q.topic, '') AS category,
+           COALESCE(q.topic, '') AS topic,
+           COALESCE(q.brand, '') AS query_brand,
+           COALESCE(q.client_id, 0) AS client_id,
+           COALESCE(q.brand_id, 0) AS brand_id,
+           b.brand,
+           COUNT(*) AS mentions,
+           SUM(COALESCE(m.sentiment, 0)) AS sentiment_sum,
+           COUNT(*) FILTER (WHERE COALESCE(m.sentiment, 0) > 0.3) AS positive,
+           COUNT(*) FILTER (WHERE COALESCE(m.sentiment, 0) BETWEEN -0.3 AND 0.3) AS neutral,
+           COUNT(*) FILTER (WHERE COALESCE(m.sentiment, 0) < -0.3) AS negative
+    FROM mentions m
+    JOIN queries q ON q.id = m.query_id
+    CROSS JOIN LATERAL (
+        SELECT '__all__'::text AS brand
+        UNION ALL
+        SELECT DISTINCT mb.brand FROM mention_brands mb WHERE mb.mention_id = m.id
+    ) b
+    WHERE {where}
+    GROUP BY 1, 2, 3, 4, 5, 6, 7, 8, 9
+"""
+
+_COLUMNS = ", ".join(DIMENSIONS + METRICS)
+
+_ready_cache: Dict[str, float] = {"checked_at": 0.0, "ready": 0.0}
+
+
+def ensure_rollup_tables(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mention_daily_rollup (
+            day DATE NOT NULL,
+            engine TEXT NOT NULL DEFAULT '',
+            source TEXT NOT NULL DEFAULT '',
+            category TEXT NOT NULL DEFAULT '',
+            topic TEXT NOT NULL DEFAULT '',
+            query_brand TEXT NOT NULL DEFAULT '',
+            client_id INT NOT NULL DEFAULT 0,
+            brand_id INT NOT NULL DEFAULT 0,
+            brand TEXT NOT NULL,
+            mentions INT NOT NULL DEFAULT 0,
+            sentiment_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            positive INT NOT NULL DEFAULT 0,
+            neutral INT NOT NULL DEFAULT 0,
+            negative INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, brand, engine, source, category, topic, query_brand, client_id, brand_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_mention_daily_rollup_brand_day ON mention_daily_rollup (brand, day);
+        CREATE TABLE IF NOT EXISTS rollup_meta (
+            name TEXT PRIMARY KEY,
+            built_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """
+    )
+
+
+def _apply_deltas(cur, where: str, params: Tuple[Any, ...], sign: int = 1) -> None:
+    updates = ", ".join(f"{c} = r.{c} + EXCLUDED.{c}" for c in METRICS)
+    facts = _FACTS_SQL.format(where=where)
+    if sign < 0:
+        facts = f"SELECT {', '.join(DIMENSIONS)}, {', '.join(f'-{c}' for c in METRICS)} FROM ({facts}) f"
+    cur.execute(
+        f"""
+        INSERT INTO mention_daily_rollup AS r ({_COLUMNS})
+        {facts}
+        ON CONFLICT (day, brand, engine, source, category, topic, query_brand, client_id, brand_id)
+        DO UPDATE SET {updates}
+        """,
+        params,
+    )
+
+
+def apply_rollup_deltas(cur, mention_ids: Sequence[int]) -> None:
+    """Suma al rollup las menciones ``mention_ids`` (recién insertadas y con marcas ya indexadas)."""
+    if not mention_ids:
+        return
+    _apply_deltas(cur, "m.id = ANY(%s)", (list(mention_ids),))
+
+
+@contextmanager
+def moving_query_rollups(cur, query_ids: Sequence[int]) -> Iterator[None]:
+    """Envuelve un ``UPDATE queries`` que cambia category/topic/brand de ``query_ids``.
+
+    El rollup guarda las dimensiones de la query del momento de la ingesta: antes
+    del UPDATE se restan sus menciones con las dimensiones viejas y, al salir, se
+    suman con las nuevas, en la misma transacción (el commit lo hace quien llama).
+    """
+    ids = [int(q) for q in query_ids if q is not None]
+    if not ids or not rollups_ready(cur):
+        yield
+        return
+    _apply_deltas(cur, "m.query_id = ANY(%s)", (ids,), sign=-1)
+    yield
+    _apply_deltas(cur, "m.query_id = ANY(%s)", (ids,))
+    cur.execute(
+        """
+        DELETE FROM mention_daily_rollup
+        WHERE mentions <= 0
+          AND day IN (SELECT DISTINCT DATE(created_at) FROM mentions WHERE query_id = ANY(%s))
+        """,
+        (ids,),
+    )
+
+
+def refresh_rollup_days(cur, days: Iterable[date]) -> int:
+    """Recalcula por completo los días indicados desde ``mentions``. Devuelve los días procesados."""
+    done = 0
+    for day in sorted(set(days)):
+        start = datetime.combine(day, datetime.min.time())
+        end = start + timedelta(days=1)
+        cur.execute("DELETE FROM mention_daily_rollup WHERE day = %s", (day,))
+        cur.execute(
+            f"INSERT INTO mention_daily_rollup ({_COLUMNS}) "
+            + _FACTS_SQL.format(where="m.created_at >= %s AND m.created_at < %s"),
+            (start, end),
+        )
+        done += 1
+    return done
+
+
+def mark_rollups_built(cur) -> None:
+    cur.execute(
+        "INSERT INTO rollup_meta (name, built_at) VALUES ('mention_daily_rollup', NOW()) "
+        "ON CONFLICT (name) DO UPDATE SET built_at = EXCLUDED.built_at"
+    )
+    _ready_cache["checked_at"] = 0.0
+
+
+def rollups_ready(cur) -> bool:
+    """True si el rollup se construyó alguna vez (se cachea ``ROLLUP_READY_TTL`` segundos)."""
+    if not ROLLUPS_ENABLED:
+        return False
+    now = time.monotonic()
+    if now - _ready_cache["checked_at"] < ROLLUP_READY_TTL:
+        return bool(_ready_cache["ready"])
+    ready = False
+    try:
+        cur.execute("SELECT to_regclass('rollup_meta') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute("SELECT 1 FROM rollup_meta WHERE name = 'mention_daily_rollup'")
+            ready = cur.fetchone() is not None
+    except Exception as exc:
+        logger.warning("⚠️ No se pudo comprobar el estado del rollup: %s", exc)
+        cur.connection.rollback()
+    _ready_cache.update(checked_at=now, ready=float(ready))
+    return ready
+
+
+def _midnight(dt: datetime) -> datetime:
+    return datetime.combine(dt.date(), datetime.min.time())
+
+
+def split_range(start: datetime, end: datetime) -> Tuple[Optional[Tuple[date, date]], List[Tuple[datetime, datetime]]]:
+    """Divide [start, end) en días completos [d0, d1) y tramos parciales en los extremos."""
+    first_full = _midnight(start) if start == _midnight(start) else _midnight(start) + timedelta(days=1)
+    last_full = _midnight(end)
+    if first_full >= last_full:
+        return None, [(start, end)] if start < end else []
+    edges = []
+    if start < first_full:
+        edges.append((start, first_full))
+    if last_full < end:
+        edges.append((last_full, end))
+    return (first_full.date(), last_full.date()), edges
+
+
+def _facts_for_range(start: datetime, end: datetime) -> Tuple[str, List[Any]]:
+    full_days, edges = split_range(start, end)
+    parts: List[str] = []
+    params: List[Any] = []
+    if full_days:
+        parts.append(f"SELECT {_COLUMNS} FROM mention_daily_rollup WHERE day >= %s AND day < %s")
+        params.extend(full_days)
+    for e_start, e_end in edges:
+        parts.append(_FACTS_SQL.format(where="m.created_at >= %s AND m.created_at < %s"))
+        params.extend([e_start, e_end])
+    if not parts:
+        parts.append(f"SELECT {_COLUMNS} FROM mention_daily_rollup WHERE FALSE")
+    return "\nUNION ALL\n".join(parts), params
+
+
+def rollup_sql(start: datetime, end: datetime, filters: Dict[str, Any], group_by: Sequence[str],
+               brands: Optional[Sequence[str]] = None, topic_column: str = "category",
+               query_brand: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """SQL (y parámetros posicionales) que agrega el rollup en [start, end) con los filtros de
+    ``parse_filters``; sirve como subconsulta de queries más grandes.
+
+    Columnas: ``(*group_by, mentions, sentiment_sum, positive, neutral, negative)``.
+    ``topic_column`` indica a qué columna se aplica el filtro ``topic`` (``category`` =
+    COALESCE(q.category, q.topic), ``topic`` = q.topic). ``brands=None`` excluye la fila
+    total ``'__all__'``.
+    """
+    for col in group_by:
+        if col not in DIMENSIONS:
+            raise ValueError(f"Dimensión de rollup desconocida: {col}")
+    facts_sql, params = _facts_for_range(start, end)
+    where: List[str] = []
+    if filters.get('model') and filters['model'] != 'all':
+        where.append("engine = %s"); params.append(filters['model'])
+    if filters.get('source') and filters['source'] != 'all':
+        where.append("source = %s"); params.append(filters['source'])
+    if filters.get('topic') and filters['topic'] != 'all':
+        where.append(f"{'topic' if topic_column == 'topic' else 'category'} = %s"); params.append(filters['topic'])
+    if query_brand is not None:
+        where.append("query_brand = %s"); params.append(query_brand)
+    if filters.get('client_id'):
+        where.append("client_id = %s"); params.append(filters['client_id'])
+    if filters.get('brand_id'):
+        where.append("brand_id = %s"); params.append(filters['brand_id'])
+    if brands is None:
+        where.append("brand <> %s"); params.append(ALL_BRANDS)
+    else:
+        where.append("brand = ANY(%s)"); params.append(list(brands))
+    cols = ", ".join(group_by)
+    sums = ", ".join(f"SUM({m}) AS {m}" for m in METRICS)
+    sql = f"""
+        SELECT {cols + ', ' if cols else ''}{sums}
+        FROM ({facts_sql}) f
+        WHERE {' AND '.join(where)}
+        {'GROUP BY ' + cols + ' ORDER BY ' + cols if cols else ''}
+    """
+    return sql, params
+
+
+def query_rollup(cur, start: datetime, end: datetime, filters: Dict[str, Any], group_by: Sequence[str],
+                 brands: Optional[Sequence[str]] = None, topic_column: str = "category",
+                 query_brand: Optional[str] = None) -> List[tuple]:
+    """Ejecuta ``rollup_sql`` y devuelve sus filas."""
+    sql, params = rollup_sql(start, end, filters, group_by, brands=brands, topic_column=topic_column,
+                             query_brand=query_brand)
+    cur.execute(sql, tuple(params))
+    return cur.fetchall()
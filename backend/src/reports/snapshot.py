@@ -0,0 +1,165 @@
+"""
+Instantánea memoizada de los datos de un informe.
+
+``get_report_snapshot(project_id, start_date, end_date)`` devuelve el mismo
+``ReportSnapshot`` para el mismo (proyecto, rango, generación de datos) durante
+``REPORT_SNAPSHOT_TTL_SECONDS``. Cada bloque (KPIs, SOV, series, clusters
+KMeans, insights del agente, oportunidades competitivas…) se calcula la primera
+vez que alguien lo pide y se reutiliza después, de modo que ``generate_report``,
+``generate_hybrid_report``, ``get_full_report_data`` y ``/api/insights`` no
+repiten consultas ni clustering para el mismo informe.
+
+La clave incluye la generación de src/utils/api_cache (la sube el polling al
+guardar menciones), así que los datos nuevos invalidan las instantáneas
+anteriores sin esperar al TTL.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from src.utils.cache import LRUCache
+
+from . import aggregator
+
+REPORT_SNAPSHOT_TTL_SECONDS = int(os.getenv("REPORT_SNAPSHOT_TTL_SECONDS", "900"))
+REPORT_SNAPSHOT_MAX_ENTRIES = int(os.getenv("REPORT_SNAPSHOT_MAX_ENTRIES", "16"))
+
+_SNAPSHOTS = LRUCache(max_entries=REPORT_SNAPSHOT_MAX_ENTRIES, ttl_seconds=REPORT_SNAPSHOT_TTL_SECONDS)
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+class ReportSnapshot:
+    """Datos del informe de ``project_id`` en [start_date, end_date], calculados bajo demanda una sola vez."""
+
+    def __init__(self, project_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        self.project_id = int(project_id)
+        self.start_date = start_date
+        self.end_date = end_date
+        self._values: Dict[Hashable, Any] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _memo(self, key: Hashable, compute: Callable[[Any], Any]) -> Any:
+        """Valor de ``key``; la primera llamada lo calcula con una sesión propia (una sola vez aunque haya hilos)."""
+        if key in self._values:
+            return self._values[key]
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._values:
+                session = aggregator.get_session()
+                try:
+                    self._values[key] = compute(session)
+                finally:
+                    session.close()
+        return self._values[key]
+
+    @property
+    def _range(self) -> Dict[str, Optional[str]]:
+        return {"start_date": self.start_date, "end_date": self.end_date}
+
+    # ── Bloques del informe ──
+    def kpis(self) -> Dict[str, Any]:
+        return self._memo("kpis", lambda s: aggregator.get_kpi_summary(s, self.project_id, **self._range))
+
+    def brand_name(self) -> str:
+        return self.kpis().get("brand_name") or "Empresa"
+
+    def main_brand(self) -> str:
+        def _resolve(s) -> str:
+            row = s.execute(text("SELECT COALESCE(brand, topic, 'Unknown') FROM queries WHERE id=:pid"),
+                            {"pid": self.project_id}).first()
+            return str(row[0]) if row and row[0] is not None else "Unknown"
+        return self._memo("main_brand", _resolve)
+
+    def total_mentions(self) -> int:
+        return self._memo("total_mentions", lambda s: aggregator.get_total_mentions(s, **self._range))
+
+    def sov_ranking(self) -> List[Tuple[str, float]]:
+        return self._memo("sov_ranking", lambda s: aggregator.get_industry_sov_ranking(s, **self._range))
+
+    def visibility_ranking(self) -> List[Tuple[str, float]]:
+        return self._memo("visibility_ranking", lambda s: aggregator.get_visibility_ranking(s, **self._range))
+
+    def sov_trends(self) -> Dict[str, Any]:
+        return self._memo("sov_trends", lambda s: aggregator.get_share_of_voice_and_trends(s, self.project_id, **self._range))
+
+    def visibility_series(self) -> Tuple[List[str], List[float]]:
+        return self._memo("visibility_series", lambda s: aggregator.get_visibility_series(s, self.project_id, **self._range))
+
+    def sentiment_evolution(self) -> List[Tuple[str, float]]:
+        return self._memo("sentiment_evolution", lambda s: aggregator.get_sentiment_evolution(s, self.project_id, **self._range))
+
+    def sentiment_positive_series(self) -> List[Tuple[str, float]]:
+        return self._memo("sentiment_positive_series",
+                          lambda s: aggregator.get_sentiment_positive_series(s, self.project_id, **self._range))
+
+    def sentiment_by_category(self) -> Dict[str, float]:
+        return self._memo("sentiment_by_category", lambda s: aggregator.get_sentiment_by_category(s, self.project_id, **self._range))
+
+    def topics_by_sentiment(self) -> Tuple[List, List]:
+        return self._memo("topics_by_sentiment", lambda s: aggregator.get_topics_by_sentiment(s, self.project_id, **self._range))
+
+    def clusters(self, max_rows: int = 5000) -> List[Dict[str, Any]]:
+        """Clusters KMeans del periodo (uno por ``max_rows``)."""
+        return self._memo(("clusters", int(max_rows)), lambda s: aggregator.aggregate_clusters_for_report(
+            s, self.project_id, max_rows=int(max_rows), **self._range))
+
+    def agent_insights(self, limit: int = 200, scoped: bool = True) -> Dict[str, Any]:
+        """Resumen de insights del agente; ``scoped=False`` usa el catálogo general (sin proyecto)."""
+        pid = self.project_id if scoped else None
+        return self._memo(("agent_insights", pid, int(limit)),
+                          lambda s: aggregator.get_agent_insights_data(s, pid, limit=int(limit)))
+
+    def competitive_opportunities(self, top_n: int = 10) -> List[Dict[str, Any]]:
+        main_brand = self.main_brand()
+        return self._memo(("competitive_opportunities", int(top_n)), lambda s: aggregator.get_competitive_opportunities(
+            s, self.project_id, start_date=self.start_date or "1970-01-01", end_date=self.end_date or "2999-12-31",
+            main_brand=main_brand, top_n=int(top_n)))
+
+    def full_report_data(self, max_rows: int = 5000) -> Dict[str, Any]:
+        """Objeto híbrido de ``aggregator.get_full_report_data``."""
+        top5, bottom5 = self.topics_by_sentiment()
+        return {
+            "project_id": self.project_id,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "kpis": self.kpis(),
+            "time_series": {
+                "sentiment_per_day": self.sentiment_evolution(),
+            },
+            "visibility_timeseries": self.visibility_series(),
+            "sentiment_by_category": self.sentiment_by_category(),
+            "topics_top5": top5,
+            "topics_bottom5": bottom5,
+            "sov": self.sov_trends(),
+            "clusters": self.clusters(max_rows),
+            "competitive_opportunities": self.competitive_opportunities(),
+        }
+
+
+def _data_generation() -> str:
+    try:
+        from src.utils.api_cache import get_api_cache
+
+        return get_api_cache().generation()
+    except Exception:
+        return "0"
+
+
+def get_report_snapshot(project_id: int, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> ReportSnapshot:
+    key = (int(project_id), start_date or None, end_date or None, _data_generation())
+    with _SNAPSHOTS_LOCK:
+        snap = _SNAPSHOTS.get(key)
+        if snap is None:
+            snap = ReportSnapshot(int(project_id), start_date or None, end_date or None)
+            _SNAPSHOTS.set(key, snap)
+        return snap
+
+
+def clear_report_snapshots() -> None:
+    _SNAPSHOTS.clear()
@@ -0,0 +1,131 @@
+"""
+Etapa de post-procesado por lotes del polling.
+
+En lugar de 3-4 llamadas al LLM por mención (resumen+temas, embedding,
+sentimiento), agrupa las respuestas crudas de un ciclo y las procesa en bloque:
+
+    • analyze_documents() → un prompt JSON multi-documento devuelve resumen,
+      key_topics y sentimiento de N respuestas a la vez.
+    • embed_texts()       → una petición de embeddings con varias entradas,
+      reutilizando los vectores ya guardados en ``embedding_cache``.
+
+Los documentos que el modelo no devuelva (o con JSON inválido) quedan a None
+para que quien llama aplique el análisis individual como fallback.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from src.engines.openai_engine import fetch_response, client as openai_client
+from src.engines import prompts as catalog
+from src.engines.embedding_store import embed_with_cache, to_vector_literal
+from src.engines.rate_limit import call_with_retry, estimate_tokens
+
+ANALYSIS_BATCH_SIZE = int(os.getenv("POLL_ANALYSIS_BATCH_SIZE", "8"))
+ANALYSIS_DOC_CHARS = int(os.getenv("POLL_ANALYSIS_DOC_CHARS", "4000"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("POLL_EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+VALID_EMOTIONS = {"alegría", "tristeza", "enojo", "miedo", "sorpresa", "neutral"}
+
+
+def _chunks(items: List[Any], size: int):
+    size = max(1, size)
+    for i in range(0, len(items), size):
+        yield i, items[i:i + size]
+
+
+def _parse_batch_json(raw: str) -> List[Dict[str, Any]]:
+    raw = (raw or "").strip()
+    if raw.startswith("```"):
+        raw = raw.split("\n", 1)[1] if "\n" in raw else ""
+        raw = raw.rsplit("```", 1)[0].strip()
+    data = json.loads(raw)
+    if isinstance(data, dict):
+        data = data.get("results", [])
+    return data if isinstance(data, list) else []
+
+
+def _normalize_analysis(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    summary = entry.get("summary")
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+    topics = entry.get("key_topics") or []
+    if not isinstance(topics, list):
+        topics = [topics]
+    try:
+        sentiment = max(-1.0, min(1.0, float(entry.get("sentiment", 0.0))))
+        confidence = max(0.0, min(1.0, float(entry.get("confidence", 0.5))))
+    except (TypeError, ValueError):
+        return None
+    emotion = str(entry.get("emotion") or "neutral").strip().lower()
+    if emotion not in VALID_EMOTIONS:
+        emotion = "neutral"
+    return {
+        "summary": summary.strip(),
+        "key_topics": [str(t) for t in topics if t],
+        "sentiment": sentiment,
+        "emotion": emotion,
+        "confidence": confidence,
+    }
+
+
+def analyze_documents(texts: List[str], batch_size: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+    """Resumen, key_topics y sentimiento de varios textos con un prompt por lote.
+
+    Devuelve una lista alineada con ``texts``; cada elemento es un dict con
+    summary, key_topics, sentiment, emotion y confidence, o None si ese
+    documento no pudo analizarse en lote.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    for offset, chunk in _chunks(texts, batch_size or ANALYSIS_BATCH_SIZE):
+        documents = "\n\n".join(
+            f"### DOCUMENTO {idx}\n\"\"\"{(text or '')[:ANALYSIS_DOC_CHARS]}\"\"\""
+            for idx, text in enumerate(chunk, start=1)
+        )
+        prompt = catalog.BATCH_MENTION_ANALYSIS_JSON.format(documents=documents)
+        try:
+            raw = fetch_response(prompt, model="gpt-4o-mini", temperature=0.1, max_tokens=220 * len(chunk) + 200)
+            for entry in _parse_batch_json(raw):
+                try:
+                    idx = int(entry.get("id")) - 1
+                except (TypeError, ValueError, AttributeError):
+                    continue
+                if 0 <= idx < len(chunk):
+                    results[offset + idx] = _normalize_analysis(entry)
+        except Exception as e:
+            logging.error("❌ Error en análisis por lotes (%s documentos): %s", len(chunk), e)
+        missing = sum(1 for r in results[offset:offset + len(chunk)] if r is None)
+        if missing:
+            logging.warning("⚠️ %s/%s documentos sin análisis en lote; se usará el análisis individual", missing, len(chunk))
+    return results
+
+
+def _embed_uncached(texts: List[str]) -> List[Optional[List[float]]]:
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    for offset, chunk in _chunks(texts, EMBEDDING_BATCH_SIZE):
+        inputs = [(t or "").strip() or " " for t in chunk]
+        try:
+            res = call_with_retry(
+                "openai",
+                lambda: openai_client.embeddings.create(model=EMBEDDING_MODEL, input=inputs),
+                est_tokens=estimate_tokens(*inputs),
+            )
+            for item in res.data:
+                vectors[offset + item.index] = item.embedding
+        except Exception as e:
+            logging.warning("⚠️ No se pudieron generar %s embeddings: %s", len(chunk), e)
+    return vectors
+
+
+def embed_texts(texts: List[str], cur=None) -> List[Optional[str]]:
+    """Embeddings (literal ::vector) de varios textos en peticiones multi-entrada.
+
+    Con ``cur`` se consulta antes ``embedding_cache`` por hash de contenido y
+    solo se envían a la API los textos nuevos. None si un texto no pudo embeberse.
+    """
+    if cur is not None:
+        return embed_with_cache(cur, texts, _embed_uncached, EMBEDDING_MODEL)
+    return [to_vector_literal(v) if v is not None else None for v in _embed_uncached(texts)]
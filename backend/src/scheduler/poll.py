@@ -1,18 +1,30 @@
 import os
 import time
 import json
+import argparse
+import socket
 import logging
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Callable, Union, List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 
 import psycopg2
-from psycopg2.extras import Json
 
-from src.engines.openai_engine import fetch_response, extract_insights, fetch_response_with_metadata, client as openai_client
-from src.engines.perplexity import fetch_perplexity_response, fetch_perplexity_with_metadata
-from src.engines.serp import get_search_results as fetch_serp_response
-from src.engines.serp import get_search_results_structured
+from src.engines.openai_engine import fetch_response, extract_insights
+from src.engines.adapters import EngineAdapter, get_default_adapters
+from src.engines.embedding_store import ensure_embedding_cache_table, embedding_cache_stats
+from src.brands.store import ensure_mention_brands_table
+from src.reports.rollups import ensure_rollup_tables
+from src.reports.clustering import CLUSTERS_ENABLED, ensure_cluster_tables, refresh_clusters
+from src.scheduler.batch_analysis import analyze_documents, embed_texts
+from src.scheduler.writer import MentionWriter, insert_mention, insert_insights  # noqa: F401  (API histórica)
+from src.scheduler.task_queue import (
+    ensure_poll_tasks_table, enqueue_poll, claim_tasks, complete_tasks, fail_tasks,
+    latest_unfinished_poll, poll_progress,
+)
+from src.utils.api_cache import bump_api_generation
 from src.utils.slack import send_slack_alert
 from src.engines.sentiment_fixed import analyze_sentiment
 
@@ -34,6 +46,32 @@ DB_CFG = dict(
     password=os.getenv("POSTGRES_PASSWORD", "postgres"),
 )
 
+# Concurrencia del ciclo de polling: número total de hilos y límite por motor.
+# POLL_ENGINE_CONCURRENCY admite "gpt-4=8,pplx-7b-chat=4,serpapi=4".
+# Con POLL_MAX_WORKERS=1 el ciclo se ejecuta en serie como antes.
+POLL_MAX_WORKERS = int(os.getenv("POLL_MAX_WORKERS", "12"))
+POLL_DEFAULT_ENGINE_CONCURRENCY = int(os.getenv("POLL_DEFAULT_ENGINE_CONCURRENCY", "4"))
+
+
+def _parse_engine_concurrency(raw: Optional[str]) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for part in (raw or "").split(","):
+        if "=" not in part:
+            continue
+        name, value = part.split("=", 1)
+        try:
+            limits[name.strip()] = max(1, int(value.strip()))
+        except ValueError:
+            logging.warning("⚠️ Límite de concurrencia inválido para %s: %s", name, value)
+    return limits
+
+
+ENGINE_CONCURRENCY = _parse_engine_concurrency(os.getenv("POLL_ENGINE_CONCURRENCY"))
+# Tareas (query × motor) que reclama cada worker por lote; cada lote es un commit
+POLL_TASK_BATCH_SIZE = int(os.getenv("POLL_TASK_BATCH_SIZE", "30"))
+# Extracciones de insights (gpt-4o) simultáneas durante el análisis por lotes
+POLL_INSIGHTS_CONCURRENCY = int(os.getenv("POLL_INSIGHTS_CONCURRENCY", "4"))
+
 def summarize_and_extract_topics(text: str) -> Tuple[str, List[str]]:
     prompt = f"""
 Analiza el siguiente texto y devuelve un objeto JSON con dos claves:
@@ -57,215 +95,334 @@ Responde únicamente con el JSON.
         logging.error("❌ Error al generar resumen y temas: %s", e)
         return text[:150] + "...", []
 
-def insert_mention(cur, data: Dict[str, Any]):
-    cur.execute(
-        """
-        INSERT INTO mentions (
-            query_id, engine, source, response, sentiment, emotion,
-            confidence_score, source_title, source_url, language, created_at,
-            summary, key_topics, generated_insight_id,
-            status, is_bot, spam_score, duplicate_group_id,
-            alert_triggered, alert_reason, engine_latency_ms, error,
-            model_name, api_status_code, engine_request_id,
-            input_tokens, output_tokens, price_usd,
-            analysis_latency_ms, total_pipeline_ms, error_category,
-            source_domain, source_rank, query_text, query_topic, poll_id,
-            client_id, brand_id, category, embedding
-        )
-        VALUES (
-            %(query_id)s, %(engine)s, %(source)s, %(response)s, %(sentiment)s, %(emotion)s,
-            %(confidence)s, %(source_title)s, %(source_url)s, %(language)s, %(created_at)s,
-            %(summary)s, %(key_topics)s, %(insight_id)s,
-            %(status)s, %(is_bot)s, %(spam_score)s, %(duplicate_group_id)s,
-            %(alert_triggered)s, %(alert_reason)s, %(engine_latency_ms)s, %(error)s,
-            %(model_name)s, %(api_status_code)s, %(engine_request_id)s,
-            %(input_tokens)s, %(output_tokens)s, %(price_usd)s,
-            %(analysis_latency_ms)s, %(total_pipeline_ms)s, %(error_category)s,
-            %(source_domain)s, %(source_rank)s, %(query_text)s, %(query_topic)s, %(poll_id)s,
-            %(client_id)s, %(brand_id)s, %(category)s, %(embedding)s::vector
-        )
-        RETURNING id
-        """,
-        {
-            **data,
-            "key_topics": Json(data.get("key_topics", [])),
-        },
-    )
-    return cur.fetchone()[0]
-
-def insert_insights(cur, query_id: int, insights_payload: dict,
-                    client_id: int | None, brand_id: int | None,
-                    category: str | None, topic: str | None) -> int:
-    """Inserta un insight y asocia metadatos.
-
-    Intenta guardar también el topic del prompt en la columna `topic` si existe.
-    Si la columna no existe (entornos antiguos), hace fallback sin `topic`.
+def fetch_engine_result(adapter: EngineAdapter, query_row: tuple, poll_id: str) -> Optional[Dict[str, Any]]:
+    """Etapa 1: una sola llamada al motor para una query (segura en hilos, sin BD).
+
+    Devuelve la respuesta cruda con el contexto de la query, o None si el motor
+    falló o no devolvió texto utilizable.
     """
+    query_id, query_text, query_topic, query_category, client_id, brand_id = query_row
+    name = adapter.name
+    logging.info("▶ %s | query «%s»", name, query_text)
     try:
-        cur.execute(
-            "INSERT INTO insights (query_id, payload, client_id, brand_id, category, topic) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
-            (query_id, json.dumps(insights_payload), client_id, brand_id, category, topic),
-        )
+        result = adapter.fetch(query_text)
     except Exception as exc:
-        # Fallback si la columna topic no existe en este entorno
-        msg = str(exc).lower()
-        if "column \"topic\"" in msg or "column topic" in msg:
-            cur.execute(
-                "INSERT INTO insights (query_id, payload, client_id, brand_id, category) VALUES (%s, %s, %s, %s, %s) RETURNING id",
-                (query_id, json.dumps(insights_payload), client_id, brand_id, category),
-            )
-        else:
-            raise
-    return cur.fetchone()[0]
-
-def run_engine(name: str, fetch_fn: Callable[[str], Union[str, list]],
-               query_id: int, query_text: str, query_topic: str, query_category: str | None,
-               client_id: int | None, brand_id: int | None, cur, poll_id: str) -> None:
-    logging.info("▶ %s | query «%s»", name, query_text)
+        logging.exception("❌ %s error: %s", name, exc)
+        return None
 
-    try:
-        pipeline_start = time.time()
-        engine_start = pipeline_start
-        results = fetch_fn(query_text)
-        fetch_ms = int((time.time() - engine_start) * 1000)
-        response_text = ""
-        source_title = None
-        source_url = None
-        source_domain = None
-        source_rank = None
-        model_name = None
-        api_status_code = None
-        engine_request_id = None
-        input_tokens = None
-        output_tokens = None
-        price_usd = None
-        error_category = None
-
-        if name == "serpapi":
-            response_text, structured = get_search_results_structured(query_text, top_k=5)
-            if structured:
-                top = structured[0]
-                source_title = top.get("title")
-                source_url = top.get("url")
-                source_domain = top.get("domain")
-                source_rank = top.get("rank")
-            else:
-                logging.warning("⚠️ serpapi sin resultados para: %s", query_text)
-                return
-        else:
-            if name == "gpt-4":
-                engine_start = time.time()
-                response_text, meta = fetch_response_with_metadata(query_text, model="gpt-4o-mini")
-                fetch_ms = int((time.time() - engine_start) * 1000)
-                model_name = meta.get("model_name")
-                api_status_code = meta.get("api_status_code")
-                engine_request_id = meta.get("engine_request_id")
-                input_tokens = meta.get("input_tokens")
-                output_tokens = meta.get("output_tokens")
-                price_usd = meta.get("price_usd")
-                error_category = meta.get("error_category")
-            elif name == "pplx-7b-chat":
-                engine_start = time.time()
-                response_text, meta = fetch_perplexity_with_metadata(query_text)
-                fetch_ms = int((time.time() - engine_start) * 1000)
-                model_name = meta.get("model_name")
-                api_status_code = meta.get("api_status_code")
-                engine_request_id = meta.get("engine_request_id")
-                input_tokens = meta.get("input_tokens")
-                output_tokens = meta.get("output_tokens")
-                price_usd = meta.get("price_usd")
-                error_category = meta.get("error_category")
-            else:
-                response_text = results
-
-        if not response_text or not isinstance(response_text, str):
-            logging.warning("⚠️ El motor %s no devolvió una respuesta de texto válida para: %s", name, query_text)
-            return
-
-        analysis_start = time.time()
-        summary, key_topics = summarize_and_extract_topics(response_text)
-        # Generar embedding para el summary
-        embedding = None
+    if not result["text"] or not isinstance(result["text"], str):
+        logging.warning("⚠️ El motor %s no devolvió una respuesta de texto válida para: %s", name, query_text)
+        return None
+    return {
+        "engine": name, "query_id": query_id, "query_text": query_text, "query_topic": query_topic,
+        "query_category": query_category, "client_id": client_id, "brand_id": brand_id,
+        "poll_id": poll_id, "result": result,
+    }
+
+
+def _extract_insights_many(texts: List[str]) -> List[Optional[dict]]:
+    workers = max(1, min(POLL_INSIGHTS_CONCURRENCY, len(texts)))
+
+    def _one(text):
         try:
-            emb_res = openai_client.embeddings.create(model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"), input=[summary])
-            embedding_vec = emb_res.data[0].embedding
-            # Convertimos a literal ::vector para el INSERT
-            embedding = "[" + ",".join(f"{float(x):.8f}" for x in embedding_vec) + "]"
-        except Exception as e:
-            logging.warning("⚠️ No se pudo generar embedding: %s", e)
-            embedding = None
-        target_for_sentiment = summary if summary and isinstance(summary, str) and len(summary) >= 8 else response_text
-        sentiment, emotion, confidence = analyze_sentiment(target_for_sentiment)
-        analysis_ms = int((time.time() - analysis_start) * 1000)
-        
-        insight_id = None
-        if name in {"gpt-4", "pplx-7b-chat", "serpapi"}:
-            insights_payload = extract_insights(response_text)
-            if insights_payload:
-                insight_id = insert_insights(cur, query_id, insights_payload, client_id, brand_id, query_category, query_topic)
+            return extract_insights(text)
+        except Exception as exc:
+            logging.error("❌ Error extrayendo insights: %s", exc)
+            return None
+
+    if workers == 1:
+        return [_one(t) for t in texts]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insights") as pool:
+        return list(pool.map(_one, texts))
+
 
+def analyze_raw_results(raw_items: List[Optional[Dict[str, Any]]], cur=None) -> List[Dict[str, Any]]:
+    """Etapa 2: post-procesado por lotes de las respuestas crudas de un ciclo.
+
+    Resumen, temas y sentimiento van en prompts multi-documento y los embeddings
+    en peticiones multi-entrada; los documentos que fallen en lote se analizan
+    uno a uno como antes. Los insights siguen siendo uno por respuesta (gpt-4o),
+    pero se lanzan en paralelo. Con ``cur`` los embeddings se reutilizan de
+    ``embedding_cache`` cuando el resumen ya se había embebido. Devuelve dicts ``{"mention", "insights"}`` listos
+    para ``MentionWriter``.
+    """
+    items = [r for r in raw_items if r]
+    if not items:
+        return []
+    texts = [r["result"]["text"] for r in items]
+    analysis_start = time.time()
+
+    analyses = analyze_documents(texts)
+    for i, analysis in enumerate(analyses):
+        if analysis is None:
+            summary, key_topics = summarize_and_extract_topics(texts[i])
+            target_for_sentiment = summary if summary and isinstance(summary, str) and len(summary) >= 8 else texts[i]
+            sentiment, emotion, confidence = analyze_sentiment(target_for_sentiment)
+            analyses[i] = {"summary": summary, "key_topics": key_topics, "sentiment": sentiment,
+                           "emotion": emotion, "confidence": confidence}
+
+    embeddings = embed_texts([a["summary"] for a in analyses], cur=cur)
+    insights = _extract_insights_many(texts)
+    # La latencia de análisis se reparte entre los documentos del lote
+    analysis_ms = int((time.time() - analysis_start) * 1000 / len(items))
+
+    collected = []
+    for item, analysis, embedding, insights_payload in zip(items, analyses, embeddings, insights):
+        result = item["result"]
+        meta = result["meta"]
+        top = result["sources"][0] if result["sources"] else {}
+        sentiment = analysis["sentiment"]
         alert_triggered = sentiment < SENTIMENT_THRESHOLD
         mention_data = {
-            "query_id": query_id, "engine": name, "source": name.lower(), "response": response_text,
-            "sentiment": sentiment, "emotion": emotion, "confidence": confidence,
-            "source_title": source_title, "source_url": source_url, "created_at": datetime.now(timezone.utc),
-            "summary": summary, "key_topics": key_topics, "insight_id": insight_id,
+            "query_id": item["query_id"], "engine": item["engine"], "source": item["engine"].lower(),
+            "response": result["text"],
+            "sentiment": sentiment, "emotion": analysis["emotion"], "confidence": analysis["confidence"],
+            "source_title": top.get("title"), "source_url": top.get("url"), "created_at": datetime.now(timezone.utc),
+            "summary": analysis["summary"], "key_topics": analysis["key_topics"], "insight_id": None,
             "status": "active", "is_bot": False, "spam_score": 0.0, "duplicate_group_id": None,
             "alert_triggered": alert_triggered, "alert_reason": ("sentiment_below_threshold" if alert_triggered else None),
-            "engine_latency_ms": fetch_ms, "error": None,
-            "model_name": model_name,
-            "api_status_code": api_status_code,
-            "engine_request_id": engine_request_id,
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "price_usd": price_usd,
+            "engine_latency_ms": result["latency_ms"], "error": None,
+            "model_name": meta.get("model_name"),
+            "api_status_code": meta.get("api_status_code"),
+            "engine_request_id": meta.get("engine_request_id"),
+            "input_tokens": meta.get("input_tokens"),
+            "output_tokens": meta.get("output_tokens"),
+            "price_usd": meta.get("price_usd"),
             "analysis_latency_ms": analysis_ms,
-            "total_pipeline_ms": int((time.time() - pipeline_start) * 1000),
-            "error_category": error_category,
-            "source_domain": source_domain,
-            "source_rank": source_rank,
-            "query_text": query_text,
-            "query_topic": query_topic,
+            "total_pipeline_ms": result["latency_ms"] + analysis_ms,
+            "error_category": meta.get("error_category"),
+            "source_domain": top.get("domain"),
+            "source_rank": top.get("rank"),
+            "query_text": item["query_text"],
+            "query_topic": item["query_topic"],
             "language": "unknown",
-            "poll_id": poll_id,
-            "client_id": client_id,
-            "brand_id": brand_id,
-            "category": query_category,
-            "embedding": embedding if embedding is not None else None,
+            "poll_id": item["poll_id"],
+            "client_id": item["client_id"],
+            "brand_id": item["brand_id"],
+            "category": item["query_category"],
+            "embedding": embedding,
         }
+        collected.append({"mention": mention_data, "insights": insights_payload or None, "task_id": item.get("task_id")})
+    logging.info("🧠 %s respuestas analizadas en lote (%.1fs)", len(items), time.time() - analysis_start)
+    return collected
+
+
+def _after_saved(saved: List[Tuple[Dict[str, Any], int]]) -> None:
+    for mention_data, mention_id in saved:
+        if mention_data["alert_triggered"]:
+            send_slack_alert(mention_data["query_text"], mention_data["sentiment"], mention_data["summary"])
+        logging.info("✓ %s guardado (mention_id=%s, insight_id=%s)",
+                     mention_data["engine"], mention_id, mention_data.get("insight_id"))
+
 
-        mention_id = insert_mention(cur, mention_data)
+def _persist(cur, results: List[Dict[str, Any]], batch_size: Optional[int] = None) -> List[Tuple[Dict[str, Any], int]]:
+    writer = MentionWriter(cur, batch_size=batch_size)
+    saved: List[Tuple[Dict[str, Any], int]] = []
+    for result in results:
+        saved.extend(writer.add(result))
+    saved.extend(writer.flush())
+    _after_saved(saved)
+    return saved
 
-        if alert_triggered:
-            send_slack_alert(query_text, sentiment, summary)
 
-        logging.info("✓ %s guardado (mention_id=%s, insight_id=%s)", name, mention_id, insight_id)
+def persist_results(cur, results: List[Dict[str, Any]], batch_size: Optional[int] = None) -> int:
+    """Etapa 3: escribe los resultados analizados por lotes sobre el cursor del ciclo.
+
+    Siempre en el hilo dueño del cursor; el commit lo hace quien llama.
+    Devuelve el número de menciones guardadas.
+    """
+    return len(_persist(cur, results, batch_size=batch_size))
+
+
+def run_engine(adapter: EngineAdapter, query_row: tuple, cur, poll_id: str) -> int:
+    """Procesa una única query en un motor (fetch → análisis → inserción)."""
+    return persist_results(cur, analyze_raw_results([fetch_engine_result(adapter, query_row, poll_id)], cur=cur))
+
+
+def fetch_pairs(pairs: List[Tuple[EngineAdapter, tuple]], poll_id: str,
+                max_workers: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+    """Lanza cada par (motor, query) y devuelve las respuestas crudas en el mismo orden.
+
+    Las llamadas se reparten en un pool de hilos, con un semáforo por motor para
+    no superar su límite de concurrencia (None donde el motor falló).
+    """
+    workers = max_workers if max_workers is not None else POLL_MAX_WORKERS
+    if workers <= 1:
+        return [fetch_engine_result(adapter, query_row, poll_id) for adapter, query_row in pairs]
 
+    semaphores = {
+        adapter.name: threading.BoundedSemaphore(ENGINE_CONCURRENCY.get(adapter.name, POLL_DEFAULT_ENGINE_CONCURRENCY))
+        for adapter, _ in pairs
+    }
+
+    def _task(adapter, query_row):
+        with semaphores[adapter.name]:
+            return fetch_engine_result(adapter, query_row, poll_id)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poll") as pool:
+        futures = [pool.submit(_task, adapter, query_row) for adapter, query_row in pairs]
+        return [fut.result() for fut in futures]
+
+
+def fetch_cycle(queries: List[tuple], poll_id: str, max_workers: Optional[int] = None,
+                adapters: Optional[List[EngineAdapter]] = None) -> List[Optional[Dict[str, Any]]]:
+    """Todas las queries contra todos los motores, en orden query → motor."""
+    engines = adapters if adapters is not None else get_default_adapters()
+    for query_row in queries:
+        print(f"\n🔍 Buscando menciones para query: {query_row[1]}")
+    return fetch_pairs([(adapter, query_row) for query_row in queries for adapter in engines],
+                       poll_id, max_workers=max_workers)
+
+
+def run_cycle(cur, queries: List[tuple], poll_id: str, max_workers: Optional[int] = None,
+              adapters: Optional[List[EngineAdapter]] = None) -> int:
+    """Ciclo completo: fetch concurrente → análisis por lotes → escrituras.
+
+    Las escrituras se hacen en bloque en este hilo sobre el cursor del ciclo,
+    en orden query → motor; el commit lo hace quien llama (uno por ciclo).
+    Devuelve las menciones guardadas.
+    """
+    raw = fetch_cycle(queries, poll_id, max_workers=max_workers, adapters=adapters)
+    return persist_results(cur, analyze_raw_results(raw, cur=cur))
+
+
+def drain_poll(conn, poll_id: str, worker_id: Optional[str] = None, batch_size: Optional[int] = None,
+               max_workers: Optional[int] = None, adapters: Optional[List[EngineAdapter]] = None) -> int:
+    """Vacía la cola ``poll_tasks`` de ``poll_id`` (puede haber varios procesos a la vez).
+
+    Cada lote reclamado pasa por fetch → análisis → escritura y se confirma con
+    un commit junto con el estado de sus tareas. Devuelve las menciones guardadas.
+    """
+    engines = {a.name: a for a in (adapters if adapters is not None else get_default_adapters())}
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    batch_size = batch_size or POLL_TASK_BATCH_SIZE
+    saved_total = 0
+
+    while True:
+        with conn.cursor() as cur:
+            tasks = claim_tasks(cur, poll_id, worker_id, batch_size)
+        conn.commit()
+        if not tasks:
+            break
+
+        task_ids = [task_id for task_id, _, _ in tasks]
+        try:
+            runnable = [(task_id, engines[engine], query_row) for task_id, engine, query_row in tasks if engine in engines]
+            unknown = [task_id for task_id, engine, _ in tasks if engine not in engines]
+            raw = fetch_pairs([(adapter, query_row) for _, adapter, query_row in runnable], poll_id, max_workers=max_workers)
+            for (task_id, _, _), item in zip(runnable, raw):
+                if item:
+                    item["task_id"] = task_id
+            with conn.cursor() as cur:
+                results = analyze_raw_results(raw, cur=cur)
+                saved = _persist(cur, results)
+                task_of = {id(r["mention"]): r["task_id"] for r in results}
+                done = {task_of[id(mention_data)]: mention_id for mention_data, mention_id in saved}
+                failed = [task_id for task_id in task_ids if task_id not in done and task_id not in unknown]
+                complete_tasks(cur, done)
+                fail_tasks(cur, failed, "sin respuesta del motor o error al guardar")
+                fail_tasks(cur, unknown, "motor desconocido")
+            conn.commit()
+            saved_total += len(saved)
+            if saved:
+                # Datos nuevos confirmados: invalida las respuestas cacheadas de la API
+                bump_api_generation(poll_id)
+            logging.info("📦 Lote de %s tareas: %s guardadas, %s fallidas", len(tasks), len(done), len(failed))
+        except Exception as exc:
+            logging.exception("❌ Error procesando lote de tareas de %s: %s", poll_id, exc)
+            conn.rollback()
+            with conn.cursor() as cur:
+                fail_tasks(cur, task_ids, str(exc))
+            conn.commit()
+    return saved_total
+
+
+def _new_poll_id() -> str:
+    return f"poll_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def _refresh_clusters(conn) -> None:
+    """Reajusta los clusters de los proyectos con deriva, mucho crecimiento o ajuste caducado."""
+    try:
+        with conn.cursor() as cur:
+            refitted = refresh_clusters(cur)
+        conn.commit()
+        if refitted:
+            logging.info("🧩 Clusters reajustados en %s proyectos", refitted)
     except Exception as exc:
-        logging.exception("❌ %s error: %s", name, exc)
+        conn.rollback()
+        logging.warning("⚠️ No se pudieron reajustar los clusters: %s", exc)
+
 
-def main(loop_once: bool = True, sleep_seconds: int = 6 * 3600):
+def main(loop_once: bool = True, sleep_seconds: int = 6 * 3600, max_workers: Optional[int] = None,
+         resume_poll_id: Optional[str] = None, enqueue: bool = True):
+    """Ciclo de polling sobre la cola persistente ``poll_tasks``.
+
+    - Sin ``resume_poll_id`` crea un poll_id nuevo, encola query × motor y lo vacía.
+    - Con ``resume_poll_id`` (o "latest") solo procesa las tareas pendientes de esa
+      ejecución; ``enqueue=False`` sirve para lanzar workers extra sobre un poll ya encolado.
+    """
     logging.info("🔄 Polling service started")
-    poll_id = f"poll_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
-    logging.info(f"🚀 Starting new poll run with ID: {poll_id}")
     while True:
-        with psycopg2.connect(**DB_CFG) as conn:
+        cycle_start = time.time()
+        conn = psycopg2.connect(**DB_CFG)
+        try:
+            with conn.cursor() as cur:
+                ensure_poll_tasks_table(cur)
+                ensure_embedding_cache_table(cur)
+                ensure_mention_brands_table(cur)
+                ensure_rollup_tables(cur)
+                ensure_cluster_tables(cur)
+                poll_id = resume_poll_id
+                if poll_id == "latest":
+                    poll_id = latest_unfinished_poll(cur)
+                    if not poll_id:
+                        logging.info("✅ No hay ejecuciones pendientes que reanudar")
+                        conn.commit()
+                        return
+                if poll_id:
+                    logging.info(f"⏯️ Reanudando poll run con ID: {poll_id}")
+                else:
+                    poll_id = _new_poll_id()
+                    logging.info(f"🚀 Starting new poll run with ID: {poll_id}")
+                if enqueue:
+                    cur.execute("SELECT id FROM queries WHERE enabled = TRUE")
+                    query_ids = [row[0] for row in cur.fetchall()]
+                    engine_names = [a.name for a in get_default_adapters()]
+                    enqueue_poll(cur, poll_id, query_ids, engine_names)
+            conn.commit()
+
+            saved = drain_poll(conn, poll_id, max_workers=max_workers)
             with conn.cursor() as cur:
-                cur.execute("SELECT id, query, topic, category, client_id, brand_id FROM queries WHERE enabled = TRUE")
-                for query_id, query_text, query_topic, query_category, client_id, brand_id in cur.fetchall():
-                    print(f"\n🔍 Buscando menciones para query: {query_text}")
-                    for name, fn in (
-                        ("gpt-4", lambda q: fetch_response(q, model="gpt-4o-mini")),
-                        ("pplx-7b-chat", fetch_perplexity_response),
-                        ("serpapi", fetch_serp_response),
-                    ):
-                        run_engine(name, fn, query_id, query_text, query_topic, query_category, client_id, brand_id, cur, poll_id)
-                conn.commit()
+                progress = poll_progress(cur, poll_id)
+            conn.commit()
+            if CLUSTERS_ENABLED:
+                _refresh_clusters(conn)
+        finally:
+            conn.close()
+        logging.info("📦 %s menciones guardadas en %.1fs | tareas: %s", saved, time.time() - cycle_start, progress)
+        logging.info("🧮 Caché de embeddings: %s", embedding_cache_stats(reset=True))
 
         logging.info(f"🛑 Polling cycle finished for poll_id={poll_id}")
         if loop_once:
             break
+        resume_poll_id = None
+        enqueue = True
         time.sleep(sleep_seconds)
 
+
 if __name__ == "__main__":
-    main(loop_once=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Servicio de polling de menciones")
+    parser.add_argument("--loop", action="store_true", help="Repetir el ciclo cada --sleep segundos")
+    parser.add_argument("--sleep", type=int, default=6 * 3600)
+    parser.add_argument("--workers", type=int, default=None, help="Hilos de fetch (POLL_MAX_WORKERS)")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="Reanudar un poll_id (sin valor: el último con tareas pendientes)")
+    parser.add_argument("--worker", metavar="POLL_ID", default=None,
+                        help="Solo vaciar la cola de un poll_id ya encolado (workers adicionales)")
+    args = parser.parse_args()
+    if args.worker:
+        main(loop_once=True, max_workers=args.workers, resume_poll_id=args.worker, enqueue=False)
+    else:
+        main(loop_once=not args.loop, sleep_seconds=args.sleep, max_workers=args.workers,
+             resume_poll_id=args.resume, enqueue=args.resume is None)
@@ -0,0 +1,157 @@
+"""
+Cola persistente de tareas de polling (tabla ``poll_tasks``).
+
+Cada ciclo encola una tarea por (poll_id, query, motor). Los workers reclaman
+lotes con ``FOR UPDATE SKIP LOCKED`` (varios procesos pueden vaciar la cola en
+paralelo sin pisarse) y hacen commit de cada lote junto con sus menciones, de
+modo que si el proceso cae solo se repiten las tareas pendientes.
+
+Estados: pending → running → done | failed. Una tarea ``running`` cuyo lease
+caduca (worker muerto) vuelve a ser reclamable, o pasa a ``failed`` si ya agotó
+sus intentos; las que fallan se reintentan hasta ``POLL_TASK_MAX_ATTEMPTS``
+esperando ``intentos × POLL_TASK_RETRY_SECONDS`` desde el último fallo.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+TASK_LEASE_SECONDS = int(os.getenv("POLL_TASK_LEASE_SECONDS", "900"))
+TASK_MAX_ATTEMPTS = int(os.getenv("POLL_TASK_MAX_ATTEMPTS", "3"))
+TASK_RETRY_SECONDS = int(os.getenv("POLL_TASK_RETRY_SECONDS", "60"))
+
+
+def ensure_poll_tasks_table(cur) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS poll_tasks (
+            id BIGSERIAL PRIMARY KEY,
+            poll_id TEXT NOT NULL,
+            query_id INT NOT NULL,
+            engine TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            claimed_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            mention_id INT,
+            error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            UNIQUE (poll_id, query_id, engine)
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_poll_tasks_poll_status ON poll_tasks (poll_id, status)")
+
+
+def enqueue_poll(cur, poll_id: str, query_ids: List[int], engines: List[str]) -> int:
+    """Encola (query × motor) para ``poll_id``. Idempotente: no duplica tareas ya existentes."""
+    rows = [(poll_id, qid, engine) for qid in query_ids for engine in engines]
+    if not rows:
+        return 0
+    execute_values(
+        cur,
+        "INSERT INTO poll_tasks (poll_id, query_id, engine) VALUES %s ON CONFLICT (poll_id, query_id, engine) DO NOTHING",
+        rows,
+        page_size=1000,
+    )
+    return len(rows)
+
+
+def claim_tasks(cur, poll_id: str, worker_id: str, limit: int) -> List[Tuple[int, str, tuple]]:
+    """Reclama hasta ``limit`` tareas y devuelve ``(task_id, engine, query_row)``.
+
+    ``query_row`` tiene la forma (id, query, topic, category, client_id, brand_id)
+    que espera el pipeline. Quien llama debe hacer commit para liberar los locks.
+    Las tareas fallidas esperan ``attempts × TASK_RETRY_SECONDS`` antes de volver a
+    reclamarse, para no repetir en segundos un fallo determinista (4xx, sin resultados).
+    """
+    # Leases caducados sin intentos restantes: nadie los va a reclamar, se dan por fallidos
+    cur.execute(
+        """
+        UPDATE poll_tasks
+        SET status = 'failed', finished_at = NOW(), error = COALESCE(error, 'lease caducado sin intentos restantes')
+        WHERE poll_id = %s AND status = 'running' AND attempts >= %s
+          AND claimed_at < NOW() - make_interval(secs => %s)
+        """,
+        (poll_id, TASK_MAX_ATTEMPTS, TASK_LEASE_SECONDS),
+    )
+    cur.execute(
+        """
+        WITH claimable AS (
+            SELECT id FROM poll_tasks
+            WHERE poll_id = %s
+              AND attempts < %s
+              AND (
+                    status = 'pending'
+                 OR (status = 'failed' AND finished_at < NOW() - make_interval(secs => attempts * %s))
+                 OR (status = 'running' AND claimed_at < NOW() - make_interval(secs => %s))
+              )
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT %s
+        )
+        UPDATE poll_tasks t
+        SET status = 'running', claimed_by = %s, claimed_at = NOW(), attempts = t.attempts + 1
+        FROM claimable c, queries q
+        WHERE t.id = c.id AND q.id = t.query_id
+        RETURNING t.id, t.engine, q.id, q.query, q.topic, q.category, q.client_id, q.brand_id
+        """,
+        (poll_id, TASK_MAX_ATTEMPTS, TASK_RETRY_SECONDS, TASK_LEASE_SECONDS, limit, worker_id),
+    )
+    claimed = [(row[0], row[1], tuple(row[2:])) for row in cur.fetchall()]
+    claimed.sort(key=lambda t: t[0])
+    return claimed
+
+
+def complete_tasks(cur, done: Dict[int, Optional[int]]) -> None:
+    """Marca como ``done`` las tareas (task_id → mention_id guardada, o None si no hubo mención)."""
+    if not done:
+        return
+    execute_values(
+        cur,
+        """
+        UPDATE poll_tasks t
+        SET status = 'done', mention_id = v.mention_id, finished_at = NOW(), error = NULL
+        FROM (VALUES %s) AS v(id, mention_id)
+        WHERE t.id = v.id
+        """,
+        list(done.items()),
+        template="(%s::bigint, %s::int)",
+    )
+
+
+def fail_tasks(cur, task_ids: List[int], error: str) -> None:
+    """Marca tareas como ``failed``; se reintentarán mientras queden intentos."""
+    if not task_ids:
+        return
+    cur.execute(
+        "UPDATE poll_tasks SET status = 'failed', error = %s, finished_at = NOW() WHERE id = ANY(%s)",
+        (error[:500], list(task_ids)),
+    )
+
+
+def latest_unfinished_poll(cur) -> Optional[str]:
+    """poll_id más reciente con tareas pendientes, para reanudar tras una caída.
+
+    Una tarea ``running`` sin intentos restantes solo cuenta mientras su lease siga vivo.
+    """
+    cur.execute(
+        """
+        SELECT poll_id FROM poll_tasks
+        WHERE status = 'pending'
+           OR (status = 'running' AND (attempts < %s OR claimed_at >= NOW() - make_interval(secs => %s)))
+           OR (status = 'failed' AND attempts < %s)
+        ORDER BY created_at DESC
+        LIMIT 1
+        """,
+        (TASK_MAX_ATTEMPTS, TASK_LEASE_SECONDS, TASK_MAX_ATTEMPTS),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def poll_progress(cur, poll_id: str) -> Dict[str, int]:
+    cur.execute("SELECT status, COUNT(*) FROM poll_tasks WHERE poll_id = %s GROUP BY status", (poll_id,))
+    return {status: int(n) for status, n in cur.fetchall()}
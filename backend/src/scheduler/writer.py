@@ -0,0 +1,216 @@
+"""
+Escritura en bloque de menciones e insights para el polling.
+
+``MentionWriter`` acumula los resultados analizados y los vuelca con
+``execute_values`` (un INSERT multi-fila por tabla y lote), de modo que el
+coste de ingesta depende del tamaño del lote y no del número de round-trips.
+El esquema (si ``insights`` tiene columna ``topic``) se detecta una vez con
+``information_schema`` en lugar de provocar y capturar excepciones.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import Json, execute_values
+
+from src.brands.store import index_mentions
+from src.reports.clustering import assign_mentions
+from src.reports.rollups import apply_rollup_deltas
+
+WRITE_BATCH_SIZE = int(os.getenv("POLL_WRITE_BATCH_SIZE", "200"))
+
+MENTION_COLUMNS = """
+    query_id, engine, source, response, sentiment, emotion,
+    confidence_score, source_title, source_url, language, created_at,
+    summary, key_topics, generated_insight_id,
+    status, is_bot, spam_score, duplicate_group_id,
+    alert_triggered, alert_reason, engine_latency_ms, error,
+    model_name, api_status_code, engine_request_id,
+    input_tokens, output_tokens, price_usd,
+    analysis_latency_ms, total_pipeline_ms, error_category,
+    source_domain, source_rank, query_text, query_topic, poll_id,
+    client_id, brand_id, category, embedding
+"""
+
+MENTION_TEMPLATE = """(
+    %(query_id)s, %(engine)s, %(source)s, %(response)s, %(sentiment)s, %(emotion)s,
+    %(confidence)s, %(source_title)s, %(source_url)s, %(language)s, %(created_at)s,
+    %(summary)s, %(key_topics)s, %(insight_id)s,
+    %(status)s, %(is_bot)s, %(spam_score)s, %(duplicate_group_id)s,
+    %(alert_triggered)s, %(alert_reason)s, %(engine_latency_ms)s, %(error)s,
+    %(model_name)s, %(api_status_code)s, %(engine_request_id)s,
+    %(input_tokens)s, %(output_tokens)s, %(price_usd)s,
+    %(analysis_latency_ms)s, %(total_pipeline_ms)s, %(error_category)s,
+    %(source_domain)s, %(source_rank)s, %(query_text)s, %(query_topic)s, %(poll_id)s,
+    %(client_id)s, %(brand_id)s, %(category)s, %(embedding)s::vector
+)"""
+
+# Resultado de la detección de esquema (None = aún no detectado)
+_INSIGHTS_HAS_TOPIC: Optional[bool] = None
+
+
+def detect_insights_topic_column(cur, refresh: bool = False) -> bool:
+    """Indica si ``insights.topic`` existe. Se consulta una sola vez por proceso."""
+    global _INSIGHTS_HAS_TOPIC
+    if _INSIGHTS_HAS_TOPIC is None or refresh:
+        cur.execute(
+            """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'insights' AND column_name = 'topic' AND table_schema = ANY(current_schemas(false))
+            """
+        )
+        _INSIGHTS_HAS_TOPIC = cur.fetchone() is not None
+        logging.info("🧩 insights.topic %s", "disponible" if _INSIGHTS_HAS_TOPIC else "no existe; se omite")
+    return _INSIGHTS_HAS_TOPIC
+
+
+def _mention_params(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {**data, "key_topics": Json(data.get("key_topics", []))}
+
+
+def insert_mention(cur, data: Dict[str, Any]) -> int:
+    cur.execute(
+        f"INSERT INTO mentions ({MENTION_COLUMNS}) VALUES {MENTION_TEMPLATE} RETURNING id",
+        _mention_params(data),
+    )
+    return cur.fetchone()[0]
+
+
+def _insight_row(query_id, insights_payload, client_id, brand_id, category, topic, has_topic: bool) -> tuple:
+    row = (query_id, json.dumps(insights_payload), client_id, brand_id, category)
+    return row + (topic,) if has_topic else row
+
+
+def _insights_sql(has_topic: bool, single_row: bool = False) -> str:
+    cols = ["query_id", "payload", "client_id", "brand_id", "category"] + (["topic"] if has_topic else [])
+    values = "(" + ", ".join(["%s"] * len(cols)) + ")" if single_row else "%s"
+    return f"INSERT INTO insights ({', '.join(cols)}) VALUES {values} RETURNING id"
+
+
+def insert_insights(cur, query_id: int, insights_payload: dict,
+                    client_id: int | None, brand_id: int | None,
+                    category: str | None, topic: str | None) -> int:
+    """Inserta un insight y asocia metadatos (incluido ``topic`` si la columna existe)."""
+    has_topic = detect_insights_topic_column(cur)
+    row = _insight_row(query_id, insights_payload, client_id, brand_id, category, topic, has_topic)
+    cur.execute(_insights_sql(has_topic, single_row=True), row)
+    return cur.fetchone()[0]
+
+
+class MentionWriter:
+    """Buffer de resultados ``{"mention", "insights"}`` que se vuelca por lotes.
+
+    Cada ``flush`` va dentro de un SAVEPOINT: si el INSERT multi-fila falla, se
+    deshace solo ese lote y se reintenta fila a fila para no perder el resto.
+    """
+
+    def __init__(self, cur, batch_size: Optional[int] = None):
+        self.cur = cur
+        self.batch_size = max(1, batch_size or WRITE_BATCH_SIZE)
+        self.has_topic = detect_insights_topic_column(cur)
+        self._buffer: List[Dict[str, Any]] = []
+        self.written = 0
+
+    def add(self, result: Optional[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+        """Añade un resultado; devuelve lo escrito si el buffer llegó al tamaño de lote."""
+        if result:
+            self._buffer.append(result)
+        if len(self._buffer) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Tuple[Dict[str, Any], int]]:
+        """Escribe el buffer. Devuelve pares (mention_data, mention_id) guardados."""
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return []
+        self.cur.execute("SAVEPOINT mention_writer")
+        try:
+            saved = self._write_batch(batch)
+            self.cur.execute("RELEASE SAVEPOINT mention_writer")
+        except Exception as exc:
+            logging.error("❌ Falló la escritura en bloque de %s menciones: %s; reintentando fila a fila", len(batch), exc)
+            self.cur.execute("ROLLBACK TO SAVEPOINT mention_writer")
+            saved = self._write_rows(batch)
+        self._index_brands(batch, saved)
+        self._assign_clusters(saved)
+        self.written += len(saved)
+        return saved
+
+    def _index_brands(self, batch: List[Dict[str, Any]], saved: List[Tuple[Dict[str, Any], int]]) -> None:
+        """Rellena ``mention_brands`` y suma lo guardado a los rollups diarios.
+
+        Van juntos: si falla, las menciones quedan sin indexar y el backfill de
+        marcas las recoge después (y recalcula sus días de rollup).
+        """
+        if not saved:
+            return
+        payloads = {id(r["mention"]): r.get("insights") for r in batch}
+        rows = [(mention_id, m.get("key_topics"), m.get("response"), m.get("source_title"), payloads.get(id(m)))
+                for m, mention_id in saved]
+        self.cur.execute("SAVEPOINT mention_brands")
+        try:
+            index_mentions(self.cur, rows)
+            apply_rollup_deltas(self.cur, [mention_id for _, mention_id in saved])
+            self.cur.execute("RELEASE SAVEPOINT mention_brands")
+        except Exception as exc:
+            logging.warning("⚠️ No se pudieron indexar marcas/rollups de %s menciones: %s", len(rows), exc)
+            self.cur.execute("ROLLBACK TO SAVEPOINT mention_brands")
+
+    def _assign_clusters(self, saved: List[Tuple[Dict[str, Any], int]]) -> None:
+        """Asigna las menciones guardadas al centroide más cercano de su proyecto.
+
+        Si falla, quedan sin ``cluster_id`` hasta el siguiente reajuste del proyecto.
+        """
+        ids = [mention_id for m, mention_id in saved if m.get("embedding") is not None]
+        if not ids:
+            return
+        self.cur.execute("SAVEPOINT mention_clusters")
+        try:
+            assign_mentions(self.cur, ids)
+            self.cur.execute("RELEASE SAVEPOINT mention_clusters")
+        except Exception as exc:
+            logging.warning("⚠️ No se pudieron asignar clusters a %s menciones: %s", len(ids), exc)
+            self.cur.execute("ROLLBACK TO SAVEPOINT mention_clusters")
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+        with_insights = [r for r in batch if r.get("insights")]
+        if with_insights:
+            rows = []
+            for r in with_insights:
+                m = r["mention"]
+                rows.append(_insight_row(m["query_id"], r["insights"], m["client_id"], m["brand_id"],
+                                         m["category"], m["query_topic"], self.has_topic))
+            ids = execute_values(self.cur, _insights_sql(self.has_topic), rows, page_size=len(rows), fetch=True)
+            for r, (insight_id,) in zip(with_insights, ids):
+                r["mention"]["insight_id"] = insight_id
+
+        mentions = [r["mention"] for r in batch]
+        ids = execute_values(
+            self.cur,
+            f"INSERT INTO mentions ({MENTION_COLUMNS}) VALUES %s RETURNING id",
+            [_mention_params(m) for m in mentions],
+            template=MENTION_TEMPLATE,
+            page_size=len(mentions),
+            fetch=True,
+        )
+        return [(m, mention_id) for m, (mention_id,) in zip(mentions, ids)]
+
+    def _write_rows(self, batch: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+        saved = []
+        for r in batch:
+            m = r["mention"]
+            self.cur.execute("SAVEPOINT mention_row")
+            try:
+                m["insight_id"] = None
+                if r.get("insights"):
+                    m["insight_id"] = insert_insights(self.cur, m["query_id"], r["insights"], m["client_id"],
+                                                      m["brand_id"], m["category"], m["query_topic"])
+                saved.append((m, insert_mention(self.cur, m)))
+                self.cur.execute("RELEASE SAVEPOINT mention_row")
+            except Exception as exc:
+                self.cur.execute("ROLLBACK TO SAVEPOINT mention_row")
+                logging.exception("❌ %s error: %s", m.get("engine"), exc)
+        return saved
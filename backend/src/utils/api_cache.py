@@ -0,0 +1,127 @@
+"""
+Caché de respuestas de los endpoints de solo lectura del dashboard.
+
+La clave es un hash de (endpoint, filtros normalizados, parámetros propios del
+endpoint, generación). Los niveles son los mismos que los de la caché del LLM
+(src/engines/response_cache.py):
+
+    • MemoryTier → LRU acotado en proceso
+    • DiskTier   → opcional (API_CACHE_DIR), compartido entre workers del mismo host
+
+La *generación* es el último poll_id confirmado. El polling la escribe en
+API_CACHE_GENERATION_FILE al hacer commit de cada lote (``bump_api_generation``)
+y la API la relee como mucho cada API_CACHE_GENERATION_CHECK_SECONDS, así que
+una carga repetida del dashboard no toca Postgres y un poll nuevo invalida todas
+las entradas anteriores sin tener que borrarlas (caducan por LRU/TTL).
+``set_api_cache()`` permite sustituir la caché (p.ej. por otro backend).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.engines.response_cache import DiskTier, MemoryTier, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+API_CACHE_ENABLED = os.getenv("API_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+API_CACHE_TTL_SECONDS = int(os.getenv("API_CACHE_TTL_SECONDS", "300"))
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "512"))
+# Directorio del nivel compartido en disco; vacío = solo memoria
+API_CACHE_DIR = os.getenv("API_CACHE_DIR", "")
+API_CACHE_GENERATION_FILE = os.getenv("API_CACHE_GENERATION_FILE", os.path.join("cache", "api_generation"))
+API_CACHE_GENERATION_CHECK_SECONDS = float(os.getenv("API_CACHE_GENERATION_CHECK_SECONDS", "2"))
+
+
+def make_api_cache_key(endpoint: str, parts: Dict[str, Any], generation: str) -> str:
+    raw = json.dumps([endpoint, parts, generation], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ApiCache:
+    """Caché por niveles versionada por la generación (último poll_id confirmado)."""
+
+    def __init__(self, tiers: List[object], generation_file: str = API_CACHE_GENERATION_FILE,
+                 check_seconds: float = API_CACHE_GENERATION_CHECK_SECONDS):
+        self._cache = ResponseCache(tiers)
+        self.generation_file = generation_file
+        self.check_seconds = check_seconds
+        self._generation = ""
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def generation(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at < self.check_seconds:
+                return self._generation
+            self._checked_at = now
+        try:
+            with open(self.generation_file, "r", encoding="utf-8") as fh:
+                current = fh.read().strip()
+        except FileNotFoundError:
+            current = ""
+        except Exception as exc:
+            logger.warning("⚠️ No se pudo leer la generación de la caché de la API: %s", exc)
+            current = self._generation
+        with self._lock:
+            self._generation = current
+        return current
+
+    def bump(self, generation: str) -> None:
+        """Publica una generación nueva (escritura atómica) e invalida las entradas anteriores."""
+        try:
+            directory = os.path.dirname(self.generation_file) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(generation)
+            os.replace(tmp, self.generation_file)
+        except Exception as exc:
+            logger.warning("⚠️ No se pudo publicar la generación de la caché de la API: %s", exc)
+        with self._lock:
+            self._generation = generation
+            self._checked_at = time.monotonic()
+
+    def get(self, endpoint: str, parts: Dict[str, Any]) -> Optional[str]:
+        return self._cache.get(make_api_cache_key(endpoint, parts, self.generation()))
+
+    def set(self, endpoint: str, parts: Dict[str, Any], body: str) -> None:
+        self._cache.set(make_api_cache_key(endpoint, parts, self.generation()), body)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self._cache.hits, "misses": self._cache.misses, "generation": self._generation}
+
+
+_API_CACHE: Optional[ApiCache] = None
+
+
+def get_api_cache() -> Optional[ApiCache]:
+    """Caché global (memoria + disco si API_CACHE_DIR), o None si API_CACHE_ENABLED está desactivado."""
+    global _API_CACHE
+    if _API_CACHE is None and API_CACHE_ENABLED:
+        tiers: List[object] = [MemoryTier(max_entries=API_CACHE_MAX_ENTRIES, ttl_seconds=API_CACHE_TTL_SECONDS)]
+        if API_CACHE_DIR:
+            tiers.append(DiskTier(directory=API_CACHE_DIR, ttl_seconds=API_CACHE_TTL_SECONDS))
+        _API_CACHE = ApiCache(tiers)
+    return _API_CACHE
+
+
+def set_api_cache(cache: Optional[ApiCache]) -> None:
+    """Sustituye la caché global (None la desactiva hasta el siguiente get)."""
+    global _API_CACHE
+    _API_CACHE = cache
+
+
+def bump_api_generation(poll_id: str) -> None:
+    """Invalida las respuestas cacheadas tras confirmar datos nuevos de ``poll_id``."""
+    cache = get_api_cache()
+    if cache is not None:
+        cache.bump(f"{poll_id}:{time.time_ns()}")
@@ -0,0 +1,136 @@
+"""
+Caché en memoria LRU con TTL, segura para hilos.
+
+Pensada para compartirse entre hilos de Flask, del polling o de los informes:
+``get``/``set`` son O(1) y la capacidad está acotada por número de entradas y,
+opcionalmente, por bytes aproximados (``max_bytes``). Las entradas se expulsan
+por LRU al superar cualquiera de los dos límites y por TTL al leerlas o al
+insertar (se purgan las caducadas del extremo más antiguo). ``stats()``
+devuelve aciertos, fallos, expulsiones y caducadas.
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def approx_size(value: Any) -> int:
+    """Tamaño aproximado en bytes: longitud del JSON (o ``sys.getsizeof`` si no es serializable)."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = approx_size):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = int(max_bytes) if max_bytes else None
+        self._sizeof = sizeof
+        # clave → (caduca_en, valor, bytes)
+        self._data: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _pop(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        expires_at, value, _ = entry
+        if expires_at and expires_at < time.time():
+            self._pop(key)
+            self.expirations += 1
+            return _MISSING
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.time() + ttl if ttl else 0.0
+        size = self._sizeof(value) if self.max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            if self.max_bytes and size > self.max_bytes:
+                # Nunca cabría: no se guarda (ni expulsa al resto)
+                self.evictions += 1
+                return
+            self._data[key] = (expires_at, value, size)
+            self._bytes += size
+            self._purge_expired()
+            while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _purge_expired(self) -> None:
+        # Caducadas en el extremo LRU (las más antiguas): O(k) con k = caducadas
+        now = time.time()
+        while self._data:
+            key = next(iter(self._data))
+            expires_at = self._data[key][0]
+            if not (expires_at and expires_at < now):
+                break
+            self._pop(key)
+            self.expirations += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        # No cuenta como acierto/fallo
+        with self._lock:
+            return self._lookup(key) is not _MISSING
@@ -0,0 +1,43 @@
+from unittest.mock import MagicMock, patch
+
+from src.engines.response_cache import MemoryTier
+from src.utils import api_cache
+from src.utils.api_cache import ApiCache, set_api_cache
+
+
+def test_bump_changes_generation_and_invalidates_entries(tmp_path):
+    cache = ApiCache([MemoryTier(max_entries=10, ttl_seconds=60)], generation_file=str(tmp_path / "gen"),
+                     check_seconds=0)
+    parts = {"filters": {"model": "all", "range": "30d"}, "params": {}}
+    cache.set("/api/visibility", parts, '{"visibility_score": 10}')
+    assert cache.get("/api/visibility", parts) == '{"visibility_score": 10}'
+    assert cache.get("/api/visibility", {**parts, "params": {"granularity": "hour"}}) is None
+
+    # Otro proceso (el polling) publica una generación nueva
+    ApiCache([], generation_file=str(tmp_path / "gen")).bump("poll_1:1")
+    assert cache.get("/api/visibility", parts) is None
+    assert cache.generation() == "poll_1:1"
+
+
+@patch("app.get_db_connection")
+def test_dashboard_endpoint_is_served_from_cache(mock_conn, tmp_path):
+    import app as api
+
+    cur = MagicMock()
+    cur.fetchone.return_value = (3, 5)
+    mock_conn.return_value.cursor.return_value = cur
+    set_api_cache(ApiCache([MemoryTier(max_entries=10, ttl_seconds=60)], generation_file=str(tmp_path / "gen")))
+    try:
+        client = api.app.test_client()
+        first = client.get("/api/dashboard-kpis?range=7d")
+        executed = cur.execute.call_count
+        second = client.get("/api/dashboard-kpis?range=7d")
+
+        assert first.headers["X-Cache"] == "MISS" and second.headers["X-Cache"] == "HIT"
+        assert second.get_json() == first.get_json()
+        assert cur.execute.call_count == executed
+
+        api_cache.bump_api_generation("poll_2")
+        assert client.get("/api/dashboard-kpis?range=7d").headers["X-Cache"] == "MISS"
+    finally:
+        set_api_cache(None)
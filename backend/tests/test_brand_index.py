@@ -0,0 +1,100 @@
+from unittest.mock import patch, MagicMock
+
+from src.brands.detection import detect_brand_sources, detect_brands
+from src.brands.store import brand_filter, count_mention_brands, index_mentions
+from src.scheduler import writer
+
+
+def test_detect_brand_sources_reports_every_origin():
+    found = detect_brand_sources(
+        ["ECAM Madrid"], "Estudiar en U-TAD o en la ECAM", "The Core School", {"brands": [{"name": "CEV"}, "tai"]}
+    )
+    assert ("ECAM", "key_topics") in found
+    assert ("ECAM", "response") in found
+    assert ("U-TAD", "response") in found
+    assert ("The Core School", "title") in found
+    assert ("CEV", "payload") in found and ("TAI", "payload") in found
+    assert detect_brands(None, "nada relevante", None) == []
+
+
+@patch("src.brands.store.execute_values")
+def test_index_mentions_replaces_rows_and_marks_mentions(mock_execute_values):
+    cur = MagicMock()
+    written = index_mentions(cur, [(1, ["utad"], "", "", None), (2, [], "sin marcas", "", None)])
+
+    assert written == 1
+    rows = mock_execute_values.call_args[0][2]
+    assert rows == [(1, "U-TAD", "key_topics")]
+    sqls = [c[0][0] for c in cur.execute.call_args_list]
+    assert sqls[0].startswith("DELETE FROM mention_brands")
+    # Ambas menciones quedan indexadas aunque la segunda no cite ninguna marca
+    assert "brands_detected_at" in sqls[-1] and cur.execute.call_args_list[-1][0][1] == ([1, 2],)
+
+
+def test_brand_filter_uses_index_for_known_brands_and_like_otherwise():
+    sql, params = brand_filter("ECAM")
+    assert "brands_detected_at IS NOT NULL AND EXISTS (SELECT 1 FROM mention_brands" in sql
+    # Las menciones sin indexar siguen encontrándose con el predicado legacy
+    assert "brands_detected_at IS NULL AND (" in sql and "LIKE ANY(%s)" in sql
+    assert params[0] == "ECAM" and len(params) == sql.count("%s") == 5
+
+    sql, params = brand_filter("ECAM", named=True)
+    assert params["brand_name"] == "ECAM" and "brand_likes" in params
+
+    sql, params = brand_filter("Otra Escuela", named=True)
+    assert "LIKE ANY(:brand_likes)" in sql
+    assert params == {"brand_likes": ["%otra escuela%"]}
+    # key_topics y payload.brands por substring, igual que BrandMatcher.find_in_items
+    assert "= ANY(" not in sql and sql.count("LIKE ANY(:brand_likes)") == 4
+
+
+@patch("src.scheduler.writer.index_mentions")
+@patch("src.scheduler.writer.execute_values")
+def test_writer_indexes_brands_of_saved_mentions(mock_execute_values, mock_index):
+    mock_execute_values.side_effect = lambda cur, sql, rows, **kw: [(100 + i,) for i in range(len(rows))]
+    w = writer.MentionWriter(MagicMock(), batch_size=10)
+    payload = {"brands": ["ECAM"]}
+    w.add({"mention": {"query_id": 1, "engine": "gpt-4", "client_id": 1, "brand_id": 1, "category": "Marca",
+                       "query_topic": "Marca", "key_topics": ["ecam"], "response": "texto", "source_title": None},
+           "insights": payload})
+    w.flush()
+
+    rows = mock_index.call_args[0][1]
+    assert rows == [(100, ["ecam"], "texto", None, payload)]
+
+
+def test_count_mention_brands_aggregates_in_sql_and_detects_pending_in_batches():
+    cur = MagicMock()
+    cur.fetchall.return_value = [("Marca", "ECAM", 4), ("Becas", "ECAM", 1), ("Marca", "U-TAD", 2)]
+    pending = cur.connection.cursor.return_value.__enter__.return_value
+    pending.fetchmany.side_effect = [
+        [("Marca", ["ecam"], "la ecam y la ecam", "", None), ("Becas", [], "u-tad", "", {"brands": ["TAI"]})],
+        [],
+    ]
+
+    counts = count_mention_brands(cur, "m.created_at >= %s", ["2025-01-01"], group_sql="q.topic")
+
+    sql = cur.execute.call_args[0][0]
+    assert "GROUP BY grp, mb.brand" in sql and "response" not in sql
+    assert "brands_detected_at IS NULL" in pending.execute.call_args[0][0]
+    # Presencia por mención: la ECAM repetida en el texto cuenta una vez
+    assert counts == {("Marca", "ECAM"): 5, ("Becas", "ECAM"): 1, ("Marca", "U-TAD"): 2,
+                      ("Becas", "U-TAD"): 1, ("Becas", "TAI"): 1}
+
+
+@patch("src.reports.aggregator.count_mention_brands")
+def test_industry_rankings_use_aggregated_counts(mock_counts):
+    from collections import Counter
+    from src.reports import aggregator
+
+    mock_counts.return_value = Counter({"ECAM": 3, "U-TAD": 1})
+    session = MagicMock()
+    cur = session.connection.return_value.connection.cursor.return_value
+    cur.fetchone.return_value = (8,)
+
+    assert aggregator.get_industry_sov_ranking(session, start_date="2025-01-01", end_date=None) == [
+        ("ECAM", 75.0), ("U-TAD", 25.0)]
+    assert aggregator.get_visibility_ranking(session, start_date=None, end_date=None) == [
+        ("ECAM", 37.5), ("U-TAD", 12.5)]
+    assert mock_counts.call_args[0][2] == ("1970-01-01", "2999-12-31")
+    session.execute.assert_not_called()
@@ -0,0 +1,37 @@
+from src.brands.detection import BRAND_SYNONYMS, brand_synonyms, get_brand_matcher
+from src.brands.matcher import BrandMatcher, matcher_for
+
+
+def _naive(text):
+    # Regla histórica: algún sinónimo de la marca es substring del texto en minúsculas
+    text = (text or "").lower()
+    return [c for c in BRAND_SYNONYMS if any(a in text for a in brand_synonyms(c))]
+
+
+def test_matcher_matches_naive_substring_rule():
+    texts = [
+        "Estudié en The Core School y después en U-TAD",
+        "thecore, utad, ECAM, séptima ars y fx animation",
+        "detail: cesta de cevada",  # substrings históricos: tai, ces, cev
+        "",
+        None,
+    ]
+    matcher = get_brand_matcher()
+    assert matcher.find_many(texts) == [_naive(t) for t in texts]
+    assert get_brand_matcher() is matcher
+
+
+def test_overlapping_synonyms_of_different_brands_are_all_found():
+    matcher = BrandMatcher({"Alpha": ["alpha beta"], "Beta": ["beta"], "Ph": ["pha"]})
+    assert matcher.find("ALPHA BETA") == ["Alpha", "Beta", "Ph"]
+
+
+def test_sources_and_word_boundary_matcher():
+    matcher = get_brand_matcher()
+    pairs = matcher.sources(["La ECAM"], "nada", "u-tad", {"brands": [{"name": "CEV"}]})
+    assert pairs == [("U-TAD", "title"), ("ECAM", "key_topics"), ("CEV", "payload")]
+    assert matcher.detect_many([(["ecam"], "", "", None), ([], "thecore", None, None)]) == [["ECAM"], ["The Core School"]]
+
+    wb = matcher_for(("TAI", "ECAM"))
+    assert wb.find("detail sobre la ECAM") == ["ECAM"]
+    assert matcher_for(("TAI", "ECAM")) is wb
@@ -0,0 +1,48 @@
+import threading
+from unittest.mock import patch
+
+from src.utils.cache import LRUCache
+
+
+def test_evicts_by_entries_and_bytes_in_lru_order():
+    cache = LRUCache(max_entries=3, max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    assert cache.get("a") == "xxxx"  # "b" pasa a ser la menos reciente
+    cache.set("c", "xxxx")           # 12 bytes > 10 → expulsa "b"
+    assert "b" not in cache and "a" in cache and "c" in cache
+
+    cache.set("huge", "x" * 11)      # no cabe nunca: no se guarda
+    stats = cache.stats()
+    assert "huge" not in cache
+    assert stats["bytes"] == 8 and stats["entries"] == 2 and stats["evictions"] == 2
+
+
+def test_ttl_expiry_and_counters():
+    cache = LRUCache(max_entries=10, ttl_seconds=5)
+    with patch("src.utils.cache.time.time", return_value=1000):
+        cache.set("k", [1, 2])
+        assert cache.get("k") == [1, 2]
+        assert cache.get("missing") is None
+    with patch("src.utils.cache.time.time", return_value=1006):
+        assert cache.get("k") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+
+
+def test_concurrent_access_keeps_bounds():
+    cache = LRUCache(max_entries=50, max_bytes=2000)
+
+    def worker(n):
+        for i in range(500):
+            cache.set((n, i), {"topic": f"t{i}"})
+            cache.get((n, i - 1))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = cache.stats()
+    assert stats["entries"] <= 50 and stats["bytes"] <= 2000
+    assert stats["hits"] + stats["misses"] == 8 * 500
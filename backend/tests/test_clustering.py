@@ -0,0 +1,111 @@
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from src.reports import aggregator, clustering
+
+
+def _two_groups(n=40, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.zeros((2, dim), dtype=np.float32)
+    base[0, 0] = base[1, 1] = 1.0
+    X = np.vstack([base[i % 2] + 0.05 * rng.standard_normal(dim) for i in range(n)]).astype(np.float32)
+    return np.arange(1, n + 1, dtype=np.int64), X
+
+
+def _vectors_for(ids_all, X):
+    pos = {int(i): j for j, i in enumerate(ids_all.tolist())}
+
+    def fetch(cur, sql, params):
+        wanted = [pos[int(i)] for i in params[0] if int(i) in pos]
+        return ids_all[wanted], X[wanted]
+    return fetch
+
+
+@patch.object(clustering, "execute_values")
+def test_fit_reads_full_history_in_chunks_and_persists_model(mock_values):
+    ids, X = _two_groups()
+    cur = MagicMock()
+    cur.fetchall.return_value = [(int(i),) for i in ids]
+    cur.fetchone.return_value = (3,)
+    with patch.object(clustering, "fetch_vector_matrix", side_effect=_vectors_for(ids, X)) as fetch, \
+            patch.object(clustering, "CLUSTER_CHUNK_ROWS", 16), patch.object(clustering, "CLUSTER_MAX_K", 2):
+        model = clustering.fit_project_clusters(cur, 5)
+
+    # 3 bloques para ajustar + 3 para asignar, nunca el histórico entero de golpe
+    assert fetch.call_count == 6
+    assert model["version"] == 4 and model["k"] == 2 and model["fitted_rows"] == 40
+    written = [row for call in mock_values.call_args_list for row in call.args[2]]
+    labels = {mid: cid for mid, cid, _ in written}
+    assert len(labels) == 40
+    # Las menciones alternan de grupo: las pares y las impares acaban en clusters distintos
+    assert len({labels[i] for i in range(1, 41, 2)}) == 1 and labels[1] != labels[2]
+    assert "SET cluster_id = v.cluster_id" in mock_values.call_args.args[1] and "= 4" in mock_values.call_args.args[1]
+    assert any("INSERT INTO mention_cluster_models" in c.args[0] for c in cur.execute.call_args_list)
+
+
+@patch.object(clustering, "execute_values")
+def test_assign_moves_nearest_centroid_and_accumulates_drift(mock_values):
+    centroids = np.array([[1, 0, 0], [0, 1, 0]], dtype="<f4")
+    cur = MagicMock()
+    cur.fetchall.side_effect = [
+        [(11, 7), (12, 8)],  # proyecto de cada mención; el 8 no tiene modelo
+        [(7, 2, 2, 3, centroids.tobytes(), [9, 3])],
+    ]
+    new = np.array([[0.1, 1.0, 0.0]], dtype=np.float32)
+    with patch.object(clustering, "fetch_vector_matrix", return_value=(np.array([11]), new)) as fetch:
+        assert clustering.assign_mentions(cur, [11, 12]) == 1
+
+    assert fetch.call_args.args[2] == ([11],)
+    assert mock_values.call_args.args[2][0][:2] == (11, 1)
+    sql, params = cur.execute.call_args.args
+    assert "assigned_since_fit = assigned_since_fit + %s" in sql
+    updated = np.frombuffer(params[0].adapted, dtype="<f4").reshape(2, 3)
+    np.testing.assert_array_equal(updated[0], centroids[0])
+    assert updated[1][0] > 0 and params[1] == [9, 4] and params[2] == 1 and params[4] == 7
+
+
+def test_precomputed_clusters_are_read_in_sql():
+    centroids = np.eye(2, dtype="<f4")
+    session = MagicMock()
+    session.execute.return_value.first.return_value = (3, 2, 2, centroids.tobytes())
+    session.execute.return_value.all.side_effect = [
+        [(1, 30, 0.4), (0, 50, -0.1)],
+        [(0, "a.com", 20), (0, "b.com", 30), (1, "a.com", 30)],
+        [(0, 9, "resumen", 0.5, "web", "b.com", "2025-01-02")],
+    ]
+    out = clustering.precomputed_clusters(session, 4, start_date="2025-01-01", end_date="2025-01-31")
+
+    assert [c["cluster_id"] for c in out] == [0, 1]
+    assert out[0]["top_sources"] == [("b.com", 30), ("a.com", 20)]
+    assert out[0]["example_mentions"][0]["id"] == 9 and out[1]["example_mentions"] == []
+    assert out[0]["centroid"] == [1.0, 0.0]
+    sql, params = session.execute.call_args.args
+    assert "m.cluster_version = :version" in str(sql) and params["version"] == 3 and "lim" not in params
+
+
+def test_report_clusters_skip_kmeans_when_model_exists():
+    session = MagicMock()
+    with patch.object(aggregator, "precomputed_clusters", return_value=[{"cluster_id": 0, "count": 2}]) as pre, \
+            patch.object(aggregator, "KMeans") as km:
+        assert aggregator.aggregate_clusters_for_report(session, 4, start_date="2025-01-01") == [
+            {"cluster_id": 0, "count": 2}]
+    pre.assert_called_once_with(session, 4, start_date="2025-01-01", end_date=None)
+    km.assert_not_called()
+    session.execute.assert_not_called()
+
+
+def test_refresh_assigns_unassigned_and_stale_mentions_by_keyset():
+    cur = MagicMock()
+    cur.fetchall.side_effect = [[(3,), (9,)], [(12,)], []]
+    with patch.object(clustering, "assign_mentions", side_effect=[1, 1]) as assign, \
+            patch.object(clustering, "fit_project_clusters") as fit, \
+            patch.object(clustering, "CLUSTER_CHUNK_ROWS", 2):
+        assert clustering.refresh_clusters(cur, [5]) == 1
+
+    fit.assert_called_once_with(cur, 5)
+    assert [c.args[1] for c in assign.call_args_list] == [[3, 9], [12]]
+    sql, params = cur.execute.call_args.args
+    assert "m.cluster_version IS DISTINCT FROM c.version" in sql
+    # Keyset: la siguiente página empieza después del último id, nunca repite las no asignables
+    assert params == (12, [5], 2)
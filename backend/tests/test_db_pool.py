@@ -0,0 +1,70 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.db import pool as db_pool
+
+
+class FakeThreadedPool:
+    def __init__(self, minconn, maxconn, **kwargs):
+        self._pool = []
+        self._used = {}
+
+    def getconn(self):
+        conn = self._pool.pop() if self._pool else MagicMock(closed=0, autocommit=False)
+        self._used[id(conn)] = conn
+        return conn
+
+    def putconn(self, conn, close=False):
+        self._used.pop(id(conn), None)
+        if not close:
+            self._pool.append(conn)
+
+    def closeall(self):
+        self._pool.clear()
+
+
+@patch("src.db.pool.ThreadedConnectionPool", FakeThreadedPool)
+def test_close_returns_connection_to_pool_and_reuses_it():
+    pool = db_pool.ConnectionPool({}, minconn=1, maxconn=2, timeout=0.1)
+    conn = pool.getconn()
+    raw = conn.raw
+    assert pool.stats()["in_use"] == 1
+
+    conn.close()
+    conn.close()  # idempotente
+    assert conn.closed
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["idle"] == 1
+
+    again = pool.getconn()
+    assert again.raw is raw
+    assert pool.stats()["checkouts"] == 2
+
+
+@patch("src.db.pool.ThreadedConnectionPool", FakeThreadedPool)
+def test_getconn_waits_and_times_out_when_exhausted():
+    pool = db_pool.ConnectionPool({}, minconn=1, maxconn=1, timeout=0.05)
+    held = pool.getconn()
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+    # Una espera que se resuelve cuando otro hilo devuelve la conexión
+    threading.Timer(0.01, held.close).start()
+    pool.timeout = 2
+    conn = pool.getconn()
+    stats = pool.stats()
+    assert stats["waits"] == 2 and stats["max_in_use"] == 1
+    conn.close()
+
+
+@patch("src.db.pool.ThreadedConnectionPool", FakeThreadedPool)
+def test_broken_connection_is_discarded():
+    pool = db_pool.ConnectionPool({}, minconn=1, maxconn=2, timeout=0.1)
+    conn = pool.getconn()
+    conn.raw.closed = 2
+    conn.close()
+    stats = pool.stats()
+    assert stats["discarded"] == 1 and stats["idle"] == 0 and stats["in_use"] == 0
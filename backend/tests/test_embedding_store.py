@@ -0,0 +1,45 @@
+from unittest.mock import patch, MagicMock
+
+from src.engines import embedding_store
+
+
+@patch("src.engines.embedding_store.execute_values")
+def test_embed_with_cache_only_embeds_new_unique_texts(mock_execute_values):
+    cached_hash = embedding_store.content_hash("Resumen  ya\nconocido")
+    cur = MagicMock()
+    cur.fetchall.return_value = [(cached_hash, "[0.5,0.5]")]
+    embed_fn = MagicMock(side_effect=lambda texts: [[0.1, 0.2] for _ in texts])
+    embedding_store.embedding_cache_stats(reset=True)
+
+    vectors = embedding_store.embed_with_cache(
+        cur, ["Resumen ya conocido", "Nuevo", "Nuevo ", "Otro"], embed_fn, "text-embedding-3-small"
+    )
+
+    # El texto normalizado coincide con el guardado; "Nuevo" se embebe una sola vez
+    embed_fn.assert_called_once_with(["Nuevo", "Otro"])
+    assert vectors[0] == "[0.5,0.5]"
+    assert vectors[1] == vectors[2] == embedding_store.to_vector_literal([0.1, 0.2])
+    assert len(mock_execute_values.call_args.args[2]) == 2
+
+    stats = embedding_store.embedding_cache_stats()
+    assert stats["lookups"] == 4 and stats["hits"] == 1 and stats["deduplicated"] == 1 and stats["embedded"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+@patch("src.engines.embedding_store.execute_values")
+def test_stats_only_count_vectors_returned_and_stored(mock_execute_values):
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+    embedding_store.embedding_cache_stats(reset=True)
+
+    failing = MagicMock(side_effect=RuntimeError("429"))
+    try:
+        embedding_store.embed_with_cache(cur, ["a", "b"], failing, "m")
+    except RuntimeError:
+        pass
+    assert embedding_store.embedding_cache_stats()["lookups"] == 0
+
+    vectors = embedding_store.embed_with_cache(cur, ["a", "b"], lambda texts: [[0.1], None], "m")
+    assert vectors[1] is None
+    stats = embedding_store.embedding_cache_stats()
+    assert stats["lookups"] == 2 and stats["embedded"] == 1
@@ -0,0 +1,47 @@
+import httpx
+
+from src.engines import http_client, perplexity, serp
+
+
+def _install_mock_client(monkeypatch, handler):
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_client, "_CLIENT", client)
+    return client
+
+
+def test_engines_share_the_pooled_client(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.url.host == "serpapi.com":
+            return httpx.Response(200, json={"organic_results": [
+                {"title": "T", "link": "https://example.com/a", "snippet": "S"}]})
+        return httpx.Response(200, headers={"x-request-id": "req-1"}, json={
+            "choices": [{"message": {"content": " hola "}}], "usage": {"prompt_tokens": 3, "completion_tokens": 2}})
+
+    _install_mock_client(monkeypatch, handler)
+
+    text, meta = perplexity.fetch_perplexity_with_metadata("¿qué tal?")
+    summary, structured = serp.get_search_results_structured("escuelas de cine", top_k=1)
+
+    assert text == "hola" and meta["engine_request_id"] == "req-1" and meta["output_tokens"] == 2
+    assert structured[0]["domain"] == "example.com"
+    assert seen[1].url.params["engine"] == "google" and seen[1].url.params["q"] == "escuelas de cine"
+
+
+def test_perplexity_retries_429_and_reports_api_error(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429, headers={"retry-after": "0"})
+
+    _install_mock_client(monkeypatch, handler)
+    monkeypatch.setattr("src.engines.rate_limit.RATE_LIMIT_MAX_RETRIES", 2)
+    monkeypatch.setattr("src.engines.rate_limit.RATE_LIMIT_BACKOFF_BASE", 0.0)
+
+    text, meta = perplexity.fetch_perplexity_with_metadata("hola")
+
+    assert text == "" and meta["error_category"] == "api_error" and meta["api_status_code"] == 429
+    assert len(calls) == 3
@@ -0,0 +1,75 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import app as api
+
+
+def _client(cur):
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    return conn
+
+
+@patch("app.get_db_connection")
+def test_mentions_keyset_page_and_next_cursor(mock_conn):
+    cur = MagicMock()
+    ts = datetime(2025, 3, 1, 12, 0)
+    cur.fetchall.return_value = [(ts, 9, 9, "gpt-4"), (ts, 8, 8, "gpt-4"), (ts, 7, 7, "gpt-4")]
+    mock_conn.return_value = _client(cur)
+
+    client = api.app.test_client()
+    body = client.get("/api/mentions?range=7d&limit=2&fields=id,engine").get_json()
+
+    assert body["mentions"] == [{"id": 9, "engine": "gpt-4"}, {"id": 8, "engine": "gpt-4"}]
+    assert body["pagination"]["has_next"] and body["pagination"]["total"] is None
+    sql, params = cur.execute.call_args[0]
+    assert "OFFSET" in sql and "insights" not in sql and params["limit"] == 3
+
+    # La página siguiente filtra por (created_at, id) < cursor en vez de saltar filas
+    cur.fetchall.return_value = [(ts, 7, 7)]
+    nxt = client.get(f"/api/mentions?range=7d&limit=2&fields=id&cursor={body['pagination']['next_cursor']}").get_json()
+    sql, params = cur.execute.call_args[0]
+    assert "(m.created_at, m.id) < (%(cursor_ts)s, %(cursor_id)s)" in sql
+    assert (params["cursor_ts"], params["cursor_id"], params["offset"]) == (ts, 8, 0)
+    assert nxt["mentions"] == [{"id": 7}] and nxt["pagination"]["next_cursor"] is None
+
+
+@patch("app.get_db_connection")
+def test_mentions_snippet_estimate_and_validation(mock_conn):
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+    cur.fetchone.return_value = ([{"Plan": {"Plan Rows": 1234}}],)
+    mock_conn.return_value = _client(cur)
+    client = api.app.test_client()
+
+    body = client.get("/api/mentions?fields=response&count=estimate").get_json()
+    page_sql = cur.execute.call_args_list[0][0][0]
+    assert "LEFT(m.response, %(snippet)s)" in page_sql
+    assert body["pagination"]["total"] == 1234 and body["pagination"]["total_is_estimate"]
+
+    assert client.get("/api/mentions?fields=payload").status_code == 400
+    assert client.get("/api/mentions?cursor=???").status_code == 400
+
+
+@patch("app.get_pooled_connection")
+def test_export_streams_from_named_cursor(mock_pool_conn):
+    cur = MagicMock()
+    ts = datetime(2025, 3, 1, 12, 0)
+    cur.fetchmany.side_effect = [[(1, ts, ["ecam"])], [(2, ts, [])], []] * 2
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    mock_pool_conn.return_value = conn
+    client = api.app.test_client()
+
+    resp = client.get("/api/mentions/export?range=30d&fields=id,created_at,key_topics")
+    lines = resp.get_data(as_text=True).splitlines()
+    assert resp.mimetype == "application/x-ndjson"
+    assert lines == ['{"id": 1, "created_at": "2025-03-01T12:00:00", "key_topics": ["ecam"]}',
+                     '{"id": 2, "created_at": "2025-03-01T12:00:00", "key_topics": []}']
+    assert conn.cursor.call_args.kwargs["name"].startswith("mentions_export_")
+    assert conn.close.called
+
+    csv_body = client.get("/api/mentions/export?format=csv&fields=id,created_at,key_topics").get_data(as_text=True)
+    assert csv_body.splitlines() == ["id,created_at,key_topics", '1,2025-03-01T12:00:00,"[""ecam""]"',
+                                     "2,2025-03-01T12:00:00,[]"]
+    assert client.get("/api/mentions/export?format=xml").status_code == 400
@@ -1,23 +1,43 @@
+import json
 import pytest
 from unittest.mock import patch, MagicMock
 from src.scheduler import poll
 
 @patch("src.scheduler.poll.psycopg2.connect")
+@patch("src.engines.embedding_store.execute_values")
+@patch("src.scheduler.task_queue.execute_values")
+@patch("src.scheduler.writer.execute_values")
+@patch("src.scheduler.batch_analysis.openai_client")
+@patch("src.scheduler.batch_analysis.fetch_response")
+@patch("src.engines.adapters.get_search_results_structured")
+@patch("src.engines.adapters.fetch_perplexity_with_metadata")
+@patch("src.engines.adapters.fetch_response_with_metadata")
 @patch("src.scheduler.poll.fetch_response")
-@patch("src.scheduler.poll.fetch_perplexity_response")
-@patch("src.scheduler.poll.fetch_serp_response")
 @patch("src.scheduler.poll.analyze_sentiment")
 @patch("src.scheduler.poll.extract_insights")
 @patch("src.scheduler.poll.send_slack_alert")
 def test_poll_main_loop(
-    mock_slack, mock_extract, mock_analyze, mock_serp, mock_pplx, mock_gpt, mock_connect
+    mock_slack, mock_extract, mock_analyze, mock_gpt, mock_gpt_meta, mock_pplx_meta, mock_serp_structured,
+    mock_batch, mock_openai, mock_execute_values, mock_queue_values, mock_cache_values, mock_connect
 ):
     # Simular respuesta de los motores
-    mock_gpt.return_value = "Texto generado por GPT"
-    mock_pplx.return_value = "Texto generado por Perplexity"
-    mock_serp.return_value = [
-        {"title": "Título", "snippet": "Snippet", "url": "http://example.com", "source": "example.com"}
-    ]
+    mock_gpt.return_value = '{"summary": "Resumen de prueba", "key_topics": ["Moët"]}'
+    mock_gpt_meta.return_value = ("Texto generado por GPT", {"model_name": "gpt-4o-mini"})
+    mock_pplx_meta.return_value = ("Texto generado por Perplexity", {"model_name": "sonar"})
+    mock_serp_structured.return_value = (
+        "Título - Snippet",
+        [{"rank": 1, "title": "Título", "url": "http://example.com", "domain": "example.com", "snippet": "Snippet"}],
+    )
+    # El lote solo analiza 2 de los 3 documentos: el tercero va por el análisis individual
+    mock_batch.return_value = json.dumps({"results": [
+        {"id": 1, "summary": "Resumen GPT", "key_topics": ["Moët"], "sentiment": 0.4, "emotion": "alegría", "confidence": 0.8},
+        {"id": 2, "summary": "Resumen PPLX", "key_topics": ["Moët"], "sentiment": -0.5, "emotion": "enojo", "confidence": 0.7},
+    ]})
+    mock_openai.embeddings.create.return_value = MagicMock(
+        data=[MagicMock(index=i, embedding=[0.1, 0.2]) for i in range(3)]
+    )
+    # execute_values(fetch=True) devuelve los ids en orden
+    mock_execute_values.side_effect = lambda cur, sql, rows, **kw: [(i,) for i in range(1, len(rows) + 1)]
     mock_analyze.return_value = (0.5, "alegría", 0.9)
     mock_extract.return_value = {"brands": [], "competitors": [], "opportunities": [],
                                  "risks": [], "pain_points": [], "trends": [],
@@ -27,18 +47,82 @@ def test_poll_main_loop(
 
     # Simular cursor y conexión DB
     mock_cursor = MagicMock()
-    mock_cursor.fetchall.return_value = [(1, "What do people think about Moët & Chandon?")]
+    query_row = (1, "What do people think about Moët & Chandon?", "Marca", "Marca", 1, 1)
+    mock_cursor.fetchall.side_effect = [
+        [(1,)],                                            # queries habilitadas
+        [(10, "gpt-4") + query_row, (11, "pplx-7b-chat") + query_row, (12, "serpapi") + query_row],  # tareas reclamadas
+        [],                                                # embedding_cache sin aciertos
+        [(1, 1), (2, 1), (3, 1)],                          # proyecto de las menciones guardadas
+        [],                                                # el proyecto aún no tiene clusters
+        [],                                                # cola vacía
+        [("done", 3)],                                     # progreso
+        [],                                                # ningún proyecto necesita reajuste
+        [],                                                # ni hay menciones sin el cluster vigente
+    ]
     mock_conn = MagicMock()
     mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-    mock_connect.return_value.__enter__.return_value = mock_conn
+    mock_connect.return_value = mock_conn
 
     # Ejecutar solo una vez
-    poll.main(loop_once=True)
+    poll.main(loop_once=True, max_workers=1)
+
+    # Una sola llamada por motor y query
+    assert mock_gpt_meta.call_count == 1
+    assert mock_pplx_meta.call_count == 1
+    assert mock_serp_structured.call_count == 1
+    # Un prompt por lote y una petición de embeddings multi-entrada
+    assert mock_batch.call_count == 1
+    assert mock_openai.embeddings.create.call_count == 1
+    assert len(mock_openai.embeddings.create.call_args.kwargs["input"]) == 3
+    assert mock_gpt.call_count == 1
+    assert mock_analyze.call_count == 1
+    assert mock_extract.call_count == 3
+    # Los 3 embeddings nuevos se guardan en embedding_cache
+    assert len(mock_cache_values.call_args.args[2]) == 3
+    # Insights y menciones en un INSERT multi-fila cada uno
+    assert mock_execute_values.call_count == 2
+    # Se encolan las 3 tareas y se marcan como hechas con su mención
+    enqueued = mock_queue_values.call_args_list[0].args[2]
+    assert enqueued == [(enqueued[0][0], 1, "gpt-4"), (enqueued[0][0], 1, "pplx-7b-chat"), (enqueued[0][0], 1, "serpapi")]
+    assert dict(mock_queue_values.call_args_list[1].args[2]) == {10: 1, 11: 2, 12: 3}
+    # Commit tras encolar, tras reclamar y tras guardar el lote
+    assert mock_conn.commit.call_count >= 3
+    # La mención de Perplexity queda por debajo del umbral y dispara alerta
+    assert mock_slack.call_count == 1
+
+@patch("src.scheduler.poll.persist_results")
+@patch("src.scheduler.poll.analyze_raw_results")
+@patch("src.scheduler.poll.fetch_engine_result")
+def test_run_cycle_concurrent_keeps_query_engine_order(mock_fetch, mock_analyze_raw, mock_persist):
+    # Cada resultado identifica su (query, motor); las escrituras deben seguir ese orden
+    mock_fetch.side_effect = lambda adapter, query_row, poll_id: {"engine": adapter.name, "query_id": query_row[0]}
+    mock_analyze_raw.side_effect = lambda raw, cur=None: [{"mention": r} for r in raw]
+    mock_persist.side_effect = lambda cur, results: len(results)
+    queries = [(i, f"query {i}", "t", "c", 1, 1) for i in range(1, 6)]
+
+    saved = poll.run_cycle(MagicMock(), queries, "poll_test", max_workers=4)
+
+    assert saved == 15
+    persisted = [(r["mention"]["query_id"], r["mention"]["engine"]) for r in mock_persist.call_args.args[1]]
+    assert persisted == [(q[0], name) for q in queries for name in ("gpt-4", "pplx-7b-chat", "serpapi")]
+
+
+def test_claim_backs_off_failed_tasks_and_expires_exhausted_leases():
+    from src.scheduler import task_queue
+
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+    task_queue.claim_tasks(cur, "poll_x", "w1", 10)
 
-    # Afirmar que todo se llamó
-    assert mock_gpt.called
-    assert mock_pplx.called
-    assert mock_serp.called
-    assert mock_analyze.called
-    assert mock_extract.called
+    (expire_sql, expire_params), (claim_sql, claim_params) = [c.args for c in cur.execute.call_args_list]
+    assert "SET status = 'failed'" in expire_sql and "attempts >= %s" in expire_sql
+    assert expire_params == ("poll_x", task_queue.TASK_MAX_ATTEMPTS, task_queue.TASK_LEASE_SECONDS)
+    assert "finished_at < NOW() - make_interval(secs => attempts * %s)" in claim_sql
+    assert claim_params[:4] == ("poll_x", task_queue.TASK_MAX_ATTEMPTS, task_queue.TASK_RETRY_SECONDS,
+                                task_queue.TASK_LEASE_SECONDS)
 
+    cur.reset_mock()
+    cur.fetchone.return_value = None
+    assert task_queue.latest_unfinished_poll(cur) is None
+    sql = cur.execute.call_args.args[0]
+    assert "status = 'running' AND (attempts < %s OR claimed_at >=" in sql
@@ -0,0 +1,61 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.engines import rate_limit
+from src.engines.rate_limit import TokenBucket, ProviderLimiter, RetryableResponse, call_with_retry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_waits_when_empty():
+    clock = FakeClock()
+    bucket = TokenBucket(per_minute=60, clock=clock, sleep=clock.sleep)  # 1 token/s, capacidad 60
+
+    for _ in range(60):
+        assert bucket.acquire() == 0.0
+    waited = bucket.acquire()
+    assert waited == pytest.approx(1.0)
+
+
+def test_provider_limiter_honours_cooldown():
+    clock = FakeClock()
+    limiter = ProviderLimiter("x", rpm=1000, clock=clock, sleep=clock.sleep)
+    limiter.penalize(5)
+    limiter.acquire()
+    assert clock.now == pytest.approx(5)
+
+
+def test_call_with_retry_retries_429_using_retry_after(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setitem(rate_limit._LIMITERS, "fake", ProviderLimiter("fake", clock=clock, sleep=clock.sleep))
+    response = MagicMock(status_code=429, headers={"retry-after": "7"})
+    fn = MagicMock(side_effect=[RetryableResponse(response), "ok"])
+    sleeps = []
+
+    assert call_with_retry("fake", fn, sleep=sleeps.append) == "ok"
+    assert fn.call_count == 2
+    assert sleeps[0] >= 7
+    # El 429 pausa también al resto de llamantes del proveedor
+    assert rate_limit._LIMITERS["fake"]._cooldown_until >= 7
+
+
+def test_call_with_retry_does_not_retry_client_errors(monkeypatch):
+    monkeypatch.setitem(rate_limit._LIMITERS, "fake", ProviderLimiter("fake"))
+    error = RetryableResponse(MagicMock(status_code=401, headers={}))
+    fn = MagicMock(side_effect=error)
+
+    with pytest.raises(RetryableResponse):
+        call_with_retry("fake", fn, sleep=lambda s: None)
+    assert fn.call_count == 1
@@ -0,0 +1,68 @@
+import threading
+import time
+from unittest.mock import patch
+
+from src.reports.agents import ReportAgentExecutor
+
+
+def test_independent_tasks_run_concurrently_and_dependents_wait():
+    executor = ReportAgentExecutor(max_workers=4)
+    for i in range(3):
+        executor.add(f"cluster:{i}", (lambda i=i: time.sleep(0.2) or f"c{i}"))
+    executor.add("synthesis", lambda *parts: "+".join(parts), deps=["cluster:0", "cluster:1", "cluster:2"])
+
+    t0 = time.monotonic()
+    results = executor.run()
+    assert results["synthesis"] == "c0+c1+c2"
+    assert time.monotonic() - t0 < 0.5  # 3 × 0.2 s en secuencia serían 0.6 s
+
+
+def test_concurrency_cap_timeouts_and_failures_use_defaults():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def tracked():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "ok"
+
+    def boom():
+        raise RuntimeError("fallo del proveedor")
+
+    executor = ReportAgentExecutor(max_workers=2, timeout=0.2)
+    for i in range(4):
+        executor.add(f"t{i}", tracked)
+    executor.add("slow", lambda: release.wait(2) and "tarde", default="")
+    executor.add("broken", boom, default={})
+    executor.add("after_slow", lambda v: f"<{v}>", deps=["slow"])
+    try:
+        results = executor.run()
+    finally:
+        release.set()
+
+    assert peak[0] <= 2
+    assert [results[f"t{i}"] for i in range(4)] == ["ok"] * 4
+    assert results["slow"] == "" and results["after_slow"] == "<>" and results["broken"] == {}
+
+
+@patch("src.reports.generator.fetch_response")
+def test_part2_texts_fall_back_to_insights_summary(mock_fetch):
+    from src.reports import generator
+
+    def fake_fetch(prompt, model, **kw):
+        if "Análisis Competitivo" in prompt:
+            return "competencia"
+        raise RuntimeError("timeout")
+
+    mock_fetch.side_effect = fake_fetch
+    with patch.object(generator.s_prompts, "get_executive_summary_prompt", side_effect=ValueError):
+        out = generator._generate_full_part2_texts({"executive_summary": "Resumen del JSON"}, {"kpis": {}})
+
+    assert out["executive_summary"] == "Resumen del JSON"
+    assert out["action_plan"] == "" and out["correlations"] == ""
+    assert set(out) == set(generator.PART2_SECTIONS)
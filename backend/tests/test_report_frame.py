@@ -0,0 +1,58 @@
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import app as api
+from src.reports.mention_frame import build_mention_frame, explode_topics, histogram
+
+D1, D2 = date(2025, 3, 1), date(2025, 3, 2)
+
+# id, engine, topic, key_topics, sentiment, day, brands, text_brands, resp, title, payload
+ROWS = [
+    (1, "gpt-4", "Marca", ["Becas", "becas"], 0.5, D1, ["The Core School"], ["The Core School"], None, None, None),
+    (2, "gpt-4", "Marca", ["precio"], -0.6, D1, ["ECAM", "The Core School"], ["ECAM"], None, None, None),
+    (3, "pplx", None, [], None, D2, None, None, "estudiar en la ecam o en u-tad", "", {"brands": ["CEV"]}),
+    (4, "pplx", "Grados", "no-es-lista", -0.4, D2, [], [], None, None, None),
+]
+
+
+def test_frame_resolves_pending_brands_and_drops_text():
+    df = build_mention_frame(ROWS, D1)
+    assert set(df.loc[2, "brands"]) == {"U-TAD", "ECAM", "CEV"}
+    assert set(df.loc[2, "text_brands"]) == {"U-TAD", "ECAM"}  # sin payload.brands
+    assert "resp" not in df.columns and df.loc[3, "key_topics"] == []
+
+    topics = explode_topics(df)
+    assert topics["topic"].tolist() == ["becas", "becas", "precio"]
+    assert histogram([-1.0, -0.95, 0.0, 1.0, None], bins=4)[0] == {"bin": "-1.00..-0.50", "count": 2}
+
+
+@patch("app.get_db_connection")
+def test_report_aggregation_from_frame(mock_conn):
+    cur = MagicMock()
+    state = {}
+    cur.execute.side_effect = lambda sql, params=None: state.update(sql=sql)
+
+    def fetchall():
+        if "text_brands" in state["sql"]:
+            return list(ROWS)
+        return []
+
+    cur.fetchall.side_effect = fetchall
+    mock_conn.return_value.cursor.return_value = cur
+
+    data = api._aggregate_data_for_report_db({"start_date": datetime(2025, 3, 1), "end_date": datetime(2025, 3, 3)})
+    # Una sola conexión del pool para todo el informe, devuelta al terminar
+    mock_conn.assert_called_once()
+    mock_conn.return_value.close.assert_called_once()
+
+    assert data["kpis"]["total_mentions"] == 4
+    assert data["kpis"]["visibility_score"] == 50.0  # 2 de 4 menciones citan la marca propia
+    assert data["kpis"]["sentiment_avg"] == -0.05
+    assert data["time_series"] == {"dates": ["2025-03-01", "2025-03-02"], "visibility": [100.0, 0.0],
+                                   "sentiment": [-0.05, -0.4], "mentions": [2, 2]}
+    assert [r["name"] for r in data["competitor_ranking"]] == ["The Core School", "ECAM", "U-TAD", "CEV"]
+    assert data["competitor_series"] == {"name": "ECAM", "counts": [1, 1]}
+    assert data["topic_counts"] == {"becas": 2, "precio": 1}
+    assert data["sov_by_model"][:2] == [["gpt-4", "The Core School", "50.0%"], ["gpt-4", "ECAM", "50.0%"]]
+    assert data["content_competitive"][0]["competitor"] == "ECAM" and data["content_competitive"][0]["theme"] == "precio"
+    assert data["topic_sov_timeseries"][0] == {"topic": "becas", "dates": ["2025-03-01", "2025-03-02"], "values": [100.0, 0.0]}
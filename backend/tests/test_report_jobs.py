@@ -0,0 +1,93 @@
+import hashlib
+from unittest.mock import MagicMock, patch
+
+from src.reports import jobs
+from src.reports.jobs import DiskArtifactStore, ReportJobWorkers, enqueue_report_job
+
+
+def test_identical_active_request_is_merged():
+    cur = MagicMock()
+    # UPDATE de caducados, INSERT … DO NOTHING sin fila, SELECT del activo
+    cur.fetchone.side_effect = [None, (7,)]
+    job_id, merged = enqueue_report_job(cur, "executive", {"project_id": 1, "start_date": "2025-01-01"})
+
+    assert (job_id, merged) == (7, True)
+    insert_sql, insert_params = cur.execute.call_args_list[1][0]
+    assert "ON CONFLICT (request_hash) WHERE status IN ('queued', 'running') DO NOTHING" in insert_sql
+    assert insert_params[2] == jobs.request_hash("executive", {"start_date": "2025-01-01", "project_id": 1})
+
+
+@patch("src.reports.jobs.complete_report_job")
+@patch("src.reports.jobs.update_report_job")
+@patch("src.reports.jobs.claim_report_job")
+def test_worker_runs_job_reports_stages_and_stores_pdf(mock_claim, mock_update, mock_complete, tmp_path):
+    mock_claim.return_value = (3, "executive", {"project_id": 2})
+    conn = MagicMock()
+
+    def runner(kind, params, progress):
+        progress("agents", 30)
+        return b"%PDF-1.4 informe"
+
+    workers = ReportJobWorkers(lambda: conn, runner=runner, store=DiskArtifactStore(str(tmp_path)))
+    assert workers.run_once() is True
+
+    digest = hashlib.sha256(b"%PDF-1.4 informe").hexdigest()
+    assert mock_update.call_args[0][1:] == (3, "agents", 30)
+    assert mock_complete.call_args[0][1:] == (3, digest, 16)
+    assert DiskArtifactStore(str(tmp_path)).get(None, digest) == b"%PDF-1.4 informe"
+    conn.close.assert_called_once()
+
+    mock_claim.return_value = None
+    assert workers.run_once() is False
+
+
+@patch("app._report_workers")
+@patch("app.get_report_job")
+@patch("app.enqueue_report_job")
+@patch("app.get_db_connection")
+def test_generate_endpoint_enqueues_and_pdf_waits_for_completion(mock_conn, mock_enqueue, mock_get, mock_workers):
+    import app as api
+
+    api._REPORT_JOBS_READY = True
+    mock_enqueue.return_value = (5, False)
+    mock_get.return_value = {"id": 5, "kind": "v2", "params": {"project_id": 4}, "status": "running",
+                             "stage": "agents", "progress": 30, "artifact_hash": None}
+    client = api.app.test_client()
+
+    resp = client.post("/api/reports/generate/v2", json={"project_id": 4})
+    assert resp.status_code == 202 and resp.headers["Location"] == "/api/reports/jobs/5"
+    assert mock_enqueue.call_args[0][1:] == ("v2", {"project_id": 4, "start_date": None, "end_date": None})
+    mock_workers.return_value.notify.assert_called_once()
+
+    assert client.get("/api/reports/jobs/5/pdf").status_code == 409
+    body = client.get("/api/reports/jobs/5").get_json()
+    assert body["stage"] == "agents" and "download_url" not in body
+
+
+@patch("app._report_workers")
+@patch("app.sleep")
+@patch("app.get_report_job")
+@patch("app.get_db_connection")
+def test_long_poll_returns_connection_to_pool_while_waiting(mock_conn, mock_get, mock_sleep, mock_workers):
+    import app as api
+
+    api._REPORT_JOBS_READY = True
+    handed_out = []
+
+    def _checkout():
+        conn = MagicMock()
+        handed_out.append(conn)
+        return conn
+
+    mock_conn.side_effect = _checkout
+    job = {"id": 5, "kind": "v2", "params": {}, "status": "running", "stage": "agents", "progress": 30,
+           "artifact_hash": None}
+    mock_get.side_effect = [job, dict(job, stage="charts", progress=75)]
+    # Mientras se duerme, ninguna conexión sigue fuera del pool
+    mock_sleep.side_effect = lambda s: [c.close.assert_called_once() for c in handed_out]
+
+    body = api.app.test_client().get("/api/reports/jobs/5?wait=20").get_json()
+
+    assert body["stage"] == "charts"
+    assert mock_sleep.call_count == 1 and len(handed_out) == 2
+    handed_out[-1].close.assert_called_once()
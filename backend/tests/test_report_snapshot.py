@@ -0,0 +1,60 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+from src.reports import aggregator, snapshot
+from src.reports.snapshot import ReportSnapshot, clear_report_snapshots, get_report_snapshot
+
+
+@patch.object(aggregator, "get_session")
+@patch.object(aggregator, "aggregate_clusters_for_report")
+def test_blocks_are_computed_once_even_with_concurrent_readers(mock_clusters, mock_session):
+    mock_clusters.return_value = [{"cluster_id": 0, "count": 3}]
+    snap = ReportSnapshot(1, "2025-01-01", "2025-01-31")
+
+    threads = [threading.Thread(target=snap.clusters) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert snap.clusters() == [{"cluster_id": 0, "count": 3}]
+    mock_clusters.assert_called_once()
+    assert mock_clusters.call_args.kwargs == {"max_rows": 5000, "start_date": "2025-01-01", "end_date": "2025-01-31"}
+    # Otro max_rows es otro bloque (p.ej. /api/insights con limit)
+    snap.clusters(max_rows=1000)
+    assert mock_clusters.call_count == 2
+    assert mock_session.return_value.close.call_count == 2
+
+
+def test_snapshot_is_shared_per_range_and_data_generation():
+    clear_report_snapshots()
+    with patch.object(snapshot, "_data_generation", return_value="poll_1"):
+        first = get_report_snapshot(1, "2025-01-01", "2025-01-31")
+        assert get_report_snapshot(1, "2025-01-01", "2025-01-31") is first
+        assert get_report_snapshot(1, "2025-01-01", "2025-02-28") is not first
+    with patch.object(snapshot, "_data_generation", return_value="poll_2"):
+        assert get_report_snapshot(1, "2025-01-01", "2025-01-31") is not first
+    clear_report_snapshots()
+
+
+def test_full_report_data_reuses_snapshot_blocks():
+    clear_report_snapshots()
+    names = ["get_kpi_summary", "get_sentiment_evolution", "get_visibility_series", "get_sentiment_by_category",
+             "get_share_of_voice_and_trends", "aggregate_clusters_for_report", "get_competitive_opportunities"]
+    mocks = {n: patch.object(aggregator, n, return_value=MagicMock()) for n in names}
+    started = {n: p.start() for n, p in mocks.items()}
+    try:
+        with patch.object(aggregator, "get_session"), \
+                patch.object(aggregator, "get_topics_by_sentiment", return_value=([], [])), \
+                patch.object(snapshot, "_data_generation", return_value="g"), \
+                patch.object(ReportSnapshot, "main_brand", return_value="ECAM"):
+            data = aggregator.get_full_report_data(3, start_date="2025-01-01", end_date="2025-01-31")
+            snap = get_report_snapshot(3, "2025-01-01", "2025-01-31")
+            assert snap.clusters() is data["clusters"]
+            assert snap.visibility_series() is data["visibility_timeseries"]
+        for n in names:
+            started[n].assert_called_once()
+    finally:
+        for p in mocks.values():
+            p.stop()
+        clear_report_snapshots()
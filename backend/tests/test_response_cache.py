@@ -0,0 +1,65 @@
+from unittest.mock import patch, MagicMock
+
+from src.engines import openai_engine
+from src.engines.response_cache import ResponseCache, MemoryTier, DiskTier, set_response_cache
+
+
+def _completion(text):
+    return MagicMock(choices=[MagicMock(message=MagicMock(content=text))])
+
+
+@patch("src.engines.openai_engine.client")
+def test_fetch_response_cached_on_repeat(mock_client, tmp_path):
+    set_response_cache(ResponseCache([MemoryTier(), DiskTier(directory=str(tmp_path))]))
+    try:
+        mock_client.chat.completions.create.return_value = _completion("Categoría A")
+
+        first = openai_engine.fetch_response("clasifica esto", temperature=0.0)
+        second = openai_engine.fetch_response("clasifica esto", temperature=0.0)
+        assert first == second == "Categoría A"
+        assert mock_client.chat.completions.create.call_count == 1
+
+        # Otros parámetros → otra clave; use_cache=False fuerza la llamada
+        openai_engine.fetch_response("clasifica esto", temperature=0.0, max_tokens=10)
+        openai_engine.fetch_response("clasifica esto", temperature=0.0, use_cache=False)
+        assert mock_client.chat.completions.create.call_count == 3
+    finally:
+        set_response_cache(None)
+
+
+@patch("src.engines.openai_engine.client")
+def test_sampled_output_is_cached_only_on_explicit_opt_in(mock_client, tmp_path):
+    set_response_cache(ResponseCache([MemoryTier(), DiskTier(directory=str(tmp_path))]))
+    try:
+        mock_client.chat.completions.create.return_value = _completion("{no es json")
+
+        # temperature > 0 sin opt-in: cada llamada va al modelo (p.ej. JSON que el llamante no pudo parsear)
+        openai_engine.fetch_response("extrae insights", temperature=0.2)
+        openai_engine.fetch_response("extrae insights", temperature=0.2)
+        assert mock_client.chat.completions.create.call_count == 2
+
+        # Prosa del informe: el llamante opta por reutilizarla
+        openai_engine.fetch_response("resumen ejecutivo", temperature=0.3, use_cache=True)
+        openai_engine.fetch_response("resumen ejecutivo", temperature=0.3, use_cache=True)
+        assert mock_client.chat.completions.create.call_count == 3
+    finally:
+        set_response_cache(None)
+
+
+def test_disk_tier_survives_memory_loss_and_expires(tmp_path):
+    disk = DiskTier(directory=str(tmp_path), ttl_seconds=60)
+    ResponseCache([MemoryTier(), disk]).set("k" * 64, "valor")
+
+    # Una caché nueva (otro proceso) lee del disco y rellena memoria
+    fresh = ResponseCache([MemoryTier(), disk])
+    assert fresh.get("k" * 64) == "valor"
+    assert fresh.hits == 1
+
+    with patch("src.engines.response_cache.time.time", return_value=10**12):
+        assert disk.get("k" * 64) is None
+
+
+def test_empty_answers_are_not_cached(tmp_path):
+    cache = ResponseCache([MemoryTier(), DiskTier(directory=str(tmp_path))])
+    cache.set("vacia", "")
+    assert cache.get("vacia") is None
@@ -0,0 +1,71 @@
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+from src.reports import rollups
+from src.scheduler import writer
+
+
+def test_split_range_separates_full_days_from_partial_edges():
+    full, edges = rollups.split_range(datetime(2025, 1, 1, 10), datetime(2025, 1, 4, 6))
+    assert full == (date(2025, 1, 2), date(2025, 1, 4))
+    assert edges == [(datetime(2025, 1, 1, 10), datetime(2025, 1, 2)), (datetime(2025, 1, 4), datetime(2025, 1, 4, 6))]
+
+    # Rango alineado a medianoche: solo rollup
+    assert rollups.split_range(datetime(2025, 1, 1), datetime(2025, 1, 3)) == ((date(2025, 1, 1), date(2025, 1, 3)), [])
+    # Rango dentro de un mismo día: solo agregación en vivo
+    assert rollups.split_range(datetime(2025, 1, 1, 8), datetime(2025, 1, 1, 9)) == (
+        None, [(datetime(2025, 1, 1, 8), datetime(2025, 1, 1, 9))]
+    )
+
+
+def test_query_rollup_builds_filters_and_hybrid_union():
+    cur = MagicMock()
+    cur.fetchall.return_value = [("ECAM", 3, 1.5, 2, 1, 0)]
+    filters = {"model": "gpt-4", "source": "all", "topic": "Marca", "client_id": 7, "brand_id": None}
+    rows = rollups.query_rollup(cur, datetime(2025, 1, 1, 12), datetime(2025, 1, 3), filters, ["brand"],
+                                topic_column="topic", query_brand="")
+
+    assert rows == [("ECAM", 3, 1.5, 2, 1, 0)]
+    sql, params = cur.execute.call_args[0]
+    assert "FROM mention_daily_rollup WHERE day >= %s AND day < %s" in sql
+    assert "UNION ALL" in sql and "GROUP BY brand" in sql
+    # Rollup (2 días), tramo parcial del primer día y después los filtros
+    assert params == (date(2025, 1, 2), date(2025, 1, 3), datetime(2025, 1, 1, 12), datetime(2025, 1, 2),
+                      "gpt-4", "Marca", "", 7, rollups.ALL_BRANDS)
+    assert "topic = %s" in sql and "brand <> %s" in sql
+
+
+@patch("src.scheduler.writer.apply_rollup_deltas")
+@patch("src.scheduler.writer.index_mentions")
+@patch("src.scheduler.writer.execute_values")
+def test_writer_applies_rollup_deltas_after_indexing(mock_execute_values, mock_index, mock_deltas):
+    mock_execute_values.side_effect = lambda cur, sql, rows, **kw: [(200 + i,) for i in range(len(rows))]
+    w = writer.MentionWriter(MagicMock(), batch_size=10)
+    for _ in range(2):
+        w.add({"mention": {"query_id": 1, "engine": "gpt-4", "client_id": 1, "brand_id": 1, "category": "Marca",
+                           "query_topic": "Marca", "key_topics": [], "response": "texto", "source_title": None},
+               "insights": None})
+    w.flush()
+
+    assert mock_index.called
+    assert list(mock_deltas.call_args[0][1]) == [200, 201]
+
+
+def test_moving_query_rollups_retracts_old_dimensions_and_adds_new_ones():
+    cur = MagicMock()
+    with patch.object(rollups, "rollups_ready", return_value=True):
+        with rollups.moving_query_rollups(cur, [4]):
+            cur.execute("UPDATE queries SET topic = %s WHERE id = %s", ("Becas", 4))
+
+    retract, update, add, cleanup = [c.args for c in cur.execute.call_args_list]
+    # Se resta con las dimensiones de antes del UPDATE y se suma con las de después
+    assert "-mentions" in retract[0] and "m.query_id = ANY(%s)" in retract[0] and retract[1] == ([4],)
+    assert update[0].startswith("UPDATE queries")
+    assert "-mentions" not in add[0] and add[1] == ([4],)
+    assert "DELETE FROM mention_daily_rollup" in cleanup[0] and "mentions <= 0" in cleanup[0]
+
+    cur.reset_mock()
+    with patch.object(rollups, "rollups_ready", return_value=False):
+        with rollups.moving_query_rollups(cur, [4]):
+            pass
+    cur.execute.assert_not_called()
@@ -0,0 +1,54 @@
+import struct
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from src.db.vectors import PGCOPY_SIGNATURE, fetch_vector_matrix, parse_vector_copy
+
+
+def _copy_bytes(rows, id_fmt=">i"):
+    """Copia binaria de Postgres de ``(id, vector)``; ``vec=None`` es NULL."""
+    out = bytearray(PGCOPY_SIGNATURE + struct.pack(">ii", 0, 0))
+    for rid, vec in rows:
+        id_bytes = struct.pack(id_fmt, rid)
+        out += struct.pack(">hi", 2, len(id_bytes)) + id_bytes
+        if vec is None:
+            out += struct.pack(">i", -1)
+        else:
+            payload = struct.pack(">hh", len(vec), 0) + struct.pack(f">{len(vec)}f", *vec)
+            out += struct.pack(">i", len(payload)) + payload
+    return bytes(out + struct.pack(">h", -1))
+
+
+def test_uniform_copy_is_parsed_into_float32_matrix():
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((50, 16)).astype(np.float32)
+    ids, matrix = parse_vector_copy(_copy_bytes([(i + 100, v.tolist()) for i, v in enumerate(vecs)], id_fmt=">q"))
+
+    assert matrix.dtype == np.float32 and matrix.shape == (50, 16)
+    assert ids.tolist() == list(range(100, 150))
+    np.testing.assert_array_equal(matrix, vecs)
+
+
+def test_nulls_and_mismatched_dimensions_are_skipped():
+    data = _copy_bytes([(1, [1.0, 2.0]), (2, None), (3, [1.0, 2.0, 3.0]), (4, [0.5, -0.5])])
+    ids, matrix = parse_vector_copy(data)
+
+    assert ids.tolist() == [1, 4]
+    np.testing.assert_array_equal(matrix, np.array([[1.0, 2.0], [0.5, -0.5]], dtype=np.float32))
+
+
+def test_fetch_uses_binary_copy_and_falls_back_to_text():
+    cur = MagicMock()
+    cur.mogrify.return_value = b"SELECT m.id, m.embedding FROM mentions m WHERE m.id = ANY(ARRAY[7])"
+    cur.copy_expert.side_effect = lambda sql, buf: buf.write(_copy_bytes([(7, [0.25, 0.75])]))
+
+    ids, matrix = fetch_vector_matrix(cur, "SELECT m.id, m.embedding FROM mentions m WHERE m.id = ANY(%s)", ([7],))
+    assert "TO STDOUT (FORMAT binary)" in cur.copy_expert.call_args[0][0]
+    assert ids.tolist() == [7] and matrix.tolist() == [[0.25, 0.75]]
+
+    cur.copy_expert.side_effect = RuntimeError("sin COPY")
+    cur.fetchall.return_value = [(7, "[0.25,0.75]"), (8, "[1,2,3]")]
+    ids, matrix = fetch_vector_matrix(cur, "SELECT m.id, m.embedding FROM mentions m WHERE m.id = ANY(%s)", ([7],))
+    assert ids.tolist() == [7] and matrix.tolist() == [[0.25, 0.75]]
+    assert "ROLLBACK TO SAVEPOINT vector_copy" in [c[0][0] for c in cur.execute.call_args_list]
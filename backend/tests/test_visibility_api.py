@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock, patch
+
+import app as api
+
+
+def _conn(cur):
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    return conn
+
+
+@patch("app.rollups_ready", return_value=False)
+@patch("app.get_db_connection")
+def test_day_series_comes_from_a_single_query(mock_conn, _ready):
+    cur = MagicMock()
+    cur.fetchall.return_value = [
+        ("2025-03-01T01:00:00+01:00", 1740787200000, 10, 4, 40.0),
+        ("2025-03-02T01:00:00+01:00", 1740873600000, 0, 0, 0.0),
+    ]
+    mock_conn.return_value = _conn(cur)
+
+    body = api.app.test_client().get(
+        "/api/visibility?start_date=2025-03-01&end_date=2025-03-01&brand=ECAM&nocache=1").get_json()
+
+    assert cur.execute.call_count == 1
+    sql, params = cur.execute.call_args[0]
+    assert "generate_series" in sql and "COUNT(*) FILTER (WHERE ((m.brands_detected_at IS NOT NULL AND EXISTS" in sql
+    # Las menciones sin indexar caen al predicado legacy, que necesita el JOIN a insights
+    assert "LEFT JOIN insights i" in sql
+    assert str(params[-2]) == "2025-03-01" and str(params[-1]) == "2025-03-02"
+    assert body["series"][0] == {"date": "2025-03-01T01:00:00+01:00", "ts": 1740787200000, "value": 40.0}
+    assert body["visibility_score"] == 40.0
+
+
+@patch("app.rollups_ready", return_value=False)
+@patch("app.get_db_connection")
+def test_hour_series_shares_the_engine(mock_conn, _ready):
+    cur = MagicMock()
+    cur.fetchall.return_value = [("2025-03-01T10:00:00+01:00", 1740819600000, 5, 1, 20.0)]
+    mock_conn.return_value = _conn(cur)
+
+    body = api.app.test_client().get(
+        "/api/visibility?range=7d&granularity=hour&brand=Otra Escuela&nocache=1").get_json()
+
+    sql, _ = cur.execute.call_args[0]
+    assert "GROUP BY m.poll_id" in sql and "generate_series" not in sql
+    assert "LEFT JOIN insights" in sql  # marca fuera del diccionario: predicado LIKE sobre el payload
+    assert body["series"][0]["value"] == 20.0 and body["visibility_score"] == 20.0
@@ -0,0 +1,44 @@
+from unittest.mock import patch, MagicMock
+
+from src.scheduler import writer
+
+
+def _result(query_id, with_insights=True):
+    mention = {"query_id": query_id, "engine": "gpt-4", "client_id": 1, "brand_id": 1,
+               "category": "Marca", "query_topic": "Marca", "key_topics": ["a"], "insight_id": None}
+    return {"mention": mention, "insights": {"brands": []} if with_insights else None}
+
+
+@patch("src.scheduler.writer.execute_values")
+def test_writer_flushes_in_batches(mock_execute_values):
+    mock_execute_values.side_effect = lambda cur, sql, rows, **kw: [(100 + i,) for i in range(len(rows))]
+    cur = MagicMock()
+    w = writer.MentionWriter(cur, batch_size=2)
+
+    assert w.add(_result(1)) == []
+    saved = w.add(_result(2, with_insights=False))
+    saved += w.add(_result(3))
+    saved += w.flush()
+
+    assert [m["query_id"] for m, _ in saved] == [1, 2, 3]
+    assert w.written == 3
+    # 2 lotes: insights + menciones en el primero, insights + menciones en el segundo
+    assert mock_execute_values.call_count == 4
+    # El insight insertado en bloque queda enlazado a su mención
+    assert saved[0][0]["insight_id"] == 100
+    assert saved[1][0]["insight_id"] is None
+
+
+@patch("src.scheduler.writer.execute_values")
+def test_writer_falls_back_to_rows_when_batch_fails(mock_execute_values):
+    mock_execute_values.side_effect = Exception("boom")
+    cur = MagicMock()
+    cur.fetchone.return_value = (7,)
+    w = writer.MentionWriter(cur)
+
+    w.add(_result(1))
+    saved = w.flush()
+
+    assert [mention_id for _, mention_id in saved] == [7]
+    executed = [c.args[0] for c in cur.execute.call_args_list]
+    assert "ROLLBACK TO SAVEPOINT mention_writer" in executed
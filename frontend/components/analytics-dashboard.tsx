@@ -1202,7 +1202,19 @@ export function AnalyticsDashboard() {
                           const errorData = await response.json().catch(() => ({ error: 'Error desconocido al generar el informe' }))
                           throw new Error(errorData.error || 'Error en el servidor al generar el informe')
                         }
-                        const blob = await response.blob()
+                        // El backend encola el informe (202): long-poll del trabajo hasta que termine
+                        let job = await response.json()
+                        while (job.status === 'queued' || job.status === 'running') {
+                          const statusRes = await fetch(`${API_BASE}${job.status_url}?wait=25&stage=${encodeURIComponent(job.stage)}`)
+                          if (!statusRes.ok) throw new Error('No se pudo consultar el estado del informe')
+                          job = await statusRes.json()
+                        }
+                        if (job.status !== 'done') {
+                          throw new Error(job.error || 'Error en el servidor al generar el informe')
+                        }
+                        const pdfRes = await fetch(`${API_BASE}${job.download_url}`)
+                        if (!pdfRes.ok) throw new Error('No se pudo descargar el informe')
+                        const blob = await pdfRes.blob()
                         const url = window.URL.createObjectURL(blob)
                         const a = document.createElement('a')
                         a.href = url